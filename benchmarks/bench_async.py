@@ -0,0 +1,88 @@
+"""
+异步流水线基准：同一批发票分别用分阶段批处理与异步流水线（--async-pipeline）
+提取 -> 追加到总台账 -> 重命名，比较耗时、峰值内存、端到端延迟并核对台账字段
+（重命名会改动文件，两种方式各用一份语料副本）
+
+用法:
+    python benchmarks/bench_async.py [--count 2000] [--workers 1] [--batch-size 200]
+        [--queue-size 16] [--read-workers 4] [--output-excel]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+from bench_pipeline import check_output  # noqa: E402
+from bench_triage import count_rows  # noqa: E402
+from corpus import generate  # noqa: E402
+
+# 在子进程中运行命令行并在退出前输出本进程的峰值内存
+RUNNER = (
+    "import sys; sys.path.insert(0, {bench!r});"
+    "from common import peak_rss_mb; from invoice_extraction.cli import main;"
+    "code = main(sys.argv[1:]); print(f'RSS {{peak_rss_mb() or 0}}', file=sys.stderr); sys.exit(code)"
+)
+
+
+def run_cli(corpus, workdir, label, args, extra):
+    inputs = os.path.join(workdir, label)
+    shutil.copytree(corpus, inputs, ignore=shutil.ignore_patterns('*.json', '*.xlsx'))
+    output = os.path.join(workdir, f"{label}.xlsx")
+    cmd = [sys.executable, '-c', RUNNER.format(bench=BENCH_DIR), inputs,
+           '-t', os.path.join(corpus, 'template.xlsx'), '--no-cache', '-q',
+           '-j', str(args.workers), '--rename-journal', os.path.join(workdir, f"{label}.jsonl")]
+    cmd += ['-o', output] if args.output_excel else ['--ledger', output]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd + extra, cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - t0
+    if proc.returncode not in (0, 3):  # 3为部分失败（扫描件跳过属预期）
+        raise SystemExit(f"批处理失败（退出码{proc.returncode}）:\n{proc.stderr}")
+    rss = next((float(line.split()[1]) for line in proc.stderr.splitlines()
+                if line.startswith('RSS ')), 0.0)
+    latency = [line for line in proc.stdout.splitlines()
+               if line.startswith(('端到端延迟', '批次', '队列'))]
+    return output, elapsed, rss, latency
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='异步流水线基准')
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--scanned', type=float, default=0.02, help='扫描件比例')
+    parser.add_argument('-j', '--workers', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--queue-size', type=int, default=16)
+    parser.add_argument('--read-workers', type=int, default=4)
+    parser.add_argument('--output-excel', action='store_true',
+                        help='写出新Excel（-o）而不是追加到总台账')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='bench_async_')
+    try:
+        corpus = os.path.join(workdir, 'corpus')
+        manifest = generate(corpus, args.count, scanned=args.scanned)
+        async_flags = ['--async-pipeline', '--batch-size', str(args.batch_size),
+                       '--queue-size', str(args.queue_size),
+                       '--read-workers', str(args.read_workers)]
+        print(f"文件数: {args.count}  进程数: {args.workers}  每批: {args.batch_size}"
+              f"  队列: {args.queue_size}  读取并发: {args.read_workers}")
+        for label, extra in (('分阶段', []), ('异步流水线', async_flags)):
+            output, elapsed, rss, latency = run_cli(corpus, workdir, label, args, extra)
+            mismatches = check_output(output, manifest)
+            bad = {k: v for k, v in mismatches.items() if v}
+            print(f"{label:<6} {elapsed:8.2f}s  {args.count / elapsed:8.1f} 文件/秒"
+                  f"  峰值内存 {rss:.0f}MB  写入 {count_rows(output)} 行  字段不一致: {bad or '无'}")
+            for line in latency:
+                print(f"    {line}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+PDF文本后端基准：在同一批PDF上比较各后端的吞吐量（文件/秒）与峰值内存，
+并校验提取出的字段与PyPDF2一致
+
+每个后端在独立子进程中运行，峰值内存互不干扰
+
+用法:
+    python benchmarks/bench_backends.py PDF目录 [--backends pypdf2 pypdf pdfminer]
+"""
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from invoice_extraction.backends import BACKENDS  # noqa: E402
+from common import peak_rss_mb  # noqa: E402
+
+REFERENCE_BACKEND = 'pypdf2'
+
+
+def run_child(backend, pdf_files):
+    """子进程：用指定后端提取全部文件，输出JSON结果"""
+    from invoice_extraction.backends import get_backend
+    from invoice_extraction.fields import parse_invoice_text
+
+    get_backend(backend)  # 导入开销不计入
+    fields = {}
+    errors = 0
+    t0 = time.perf_counter()
+    for path in pdf_files:
+        try:
+            with open(path, 'rb') as f:
+                text = get_backend(backend).first_page_text(f)
+            fields[path] = parse_invoice_text(text) if text else None
+        except Exception:
+            errors += 1
+            fields[path] = None
+    elapsed = time.perf_counter() - t0
+    json.dump({
+        'backend': backend,
+        'elapsed': elapsed,
+        'errors': errors,
+        'peak_rss_mb': peak_rss_mb(),
+        'fields': fields,
+    }, sys.stdout, ensure_ascii=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='PDF文本后端基准')
+    parser.add_argument('corpus', help='PDF目录')
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    pdf_files = sorted(glob.glob(os.path.join(args.corpus, '*.pdf')))
+    if not pdf_files:
+        print('目录中没有PDF文件', file=sys.stderr)
+        return 1
+
+    if args.child:
+        run_child(args.child, pdf_files)
+        return 0
+
+    results = {}
+    for backend in args.backends:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), args.corpus, '--child', backend],
+            capture_output=True, text=True, encoding='utf-8'
+        )
+        if proc.returncode != 0:
+            print(f"{backend}: 运行失败\n{proc.stderr.strip()}", file=sys.stderr)
+            continue
+        results[backend] = json.loads(proc.stdout)
+
+    reference = results.get(REFERENCE_BACKEND)
+    print(f"文件数: {len(pdf_files)}")
+    print(f"{'后端':<10}{'文件/秒':>10}{'峰值内存MB':>12}{'错误':>6}{'字段不一致':>10}")
+    for backend, r in results.items():
+        rate = len(pdf_files) / r['elapsed'] if r['elapsed'] else 0.0
+        rss = f"{r['peak_rss_mb']:.1f}" if r['peak_rss_mb'] is not None else '-'
+        if reference is None:
+            mismatch = '-'
+        else:
+            mismatch = sum(1 for p in pdf_files if r['fields'][p] != reference['fields'][p])
+        print(f"{backend:<10}{rate:>10.1f}{rss:>12}{r['errors']:>6}{mismatch:>10}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+合并PDF基准：同样N张发票，分别作为N个单独文件和一个合并PDF交给命令行处理
+（提取 -> 拆分 -> 写入Excel -> 重命名），比较吞吐量并核对台账字段
+
+用法:
+    python benchmarks/bench_bundle.py [--count 1000] [--workers 1] [--multi-page 0.0]
+"""
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline import check_output  # noqa: E402
+from common import SELLERS, make_template, synthetic_invoice  # noqa: E402
+from corpus import bundle_pdf_bytes, continuation_page, text_pdf_bytes  # noqa: E402
+
+
+def make_inputs(workdir, count, multi_page, seed=0):
+    """生成同一批发票的单独文件目录与合并PDF目录，返回 (单独文件目录, 合并PDF目录, 真实字段)"""
+    rng = random.Random(seed)
+    files_dir = os.path.join(workdir, 'files')
+    bundle_dir = os.path.join(workdir, 'bundle')
+    os.makedirs(files_dir)
+    os.makedirs(bundle_dir)
+    pages = []
+    manifest = {}
+    for i in range(count):
+        lines, expected = synthetic_invoice(rng, SELLERS[:1])
+        invoice_pages = [lines]
+        if rng.random() < multi_page:
+            invoice_pages = [lines + ['共2页 第1页'], continuation_page(2, 2)]
+        with open(os.path.join(files_dir, f"inv_{i:06d}.pdf"), 'wb') as f:
+            f.write(bundle_pdf_bytes(invoice_pages) if len(invoice_pages) > 1
+                    else text_pdf_bytes(lines))
+        pages += invoice_pages
+        manifest[expected['invoice_no']] = expected
+    with open(os.path.join(bundle_dir, 'bundle.pdf'), 'wb') as f:
+        f.write(bundle_pdf_bytes(pages))
+    make_template(os.path.join(workdir, 'template.xlsx'))
+    return files_dir, bundle_dir, manifest
+
+
+def run_cli(inputs, workdir, workers):
+    output = os.path.join(workdir, f"out_{os.path.basename(inputs)}.xlsx")
+    cmd = [sys.executable, '-m', 'invoice_extraction', inputs,
+           '-t', os.path.join(workdir, 'template.xlsx'), '-o', output, '--no-cache', '-q',
+           '-j', str(workers), '--rename-journal', os.path.join(workdir, 'journal.jsonl')]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise SystemExit(f"批处理失败（退出码{proc.returncode}）:\n{proc.stderr}")
+    return output, elapsed
+
+
+def count_pdfs(directory):
+    return sum(1 for _, _, names in os.walk(directory) for n in names if n.endswith('.pdf'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='合并PDF基准')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('-j', '--workers', type=int, default=1)
+    parser.add_argument('--multi-page', type=float, default=0.0, help='带续页的发票比例')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='bench_bundle_')
+    try:
+        files_dir, bundle_dir, manifest = make_inputs(workdir, args.count, args.multi_page)
+        print(f"发票数: {args.count}  进程数: {args.workers}  续页比例: {args.multi_page}")
+        for label, inputs in (('单独文件', files_dir), ('合并PDF', bundle_dir)):
+            output, elapsed = run_cli(inputs, workdir, args.workers)
+            mismatches = check_output(output, manifest)
+            bad = {k: v for k, v in mismatches.items() if v}
+            # 合并PDF本身保留，其余为每张发票一个（已重命名的）文件
+            pdfs = count_pdfs(inputs) - (1 if inputs == bundle_dir else 0)
+            print(f"{label:<8} {elapsed:8.2f}s  {args.count / elapsed:8.1f} 张/秒"
+                  f"  输出PDF {pdfs}  字段不一致: {bad or '无'}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+数电发票XML/OFD基准：同一批合成发票分别
+  1) 解析PDF（--pdf-only的路径）
+  2) 读取同名XML（PDF旁有XML时的默认路径）
+  3) 读取OFD中内嵌的XML
+比较吞吐量并与真实字段逐项核对（扫描件没有XML，两条路径都应失败）
+
+用法:
+    python benchmarks/bench_einvoice.py [--count 1000] [--workers 1]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from invoice_extraction.parallel import iter_extract  # noqa: E402
+from corpus import generate  # noqa: E402
+
+BUYER = ('91430100MA4TCG0Q2E', '湖南新飞创不良资产处置有限公司')
+CHECKED = ('invoice_no', 'date', 'seller_name', 'seller_tax_no', 'amount', 'tax', 'total',
+           'drawer', 'remark')
+
+
+def einvoice_xml(e):
+    """按电子发票服务平台导出格式（节选）生成一张发票的XML"""
+    def el(tag, value):
+        return f"<{tag}>{escape(value)}</{tag}>"
+
+    return ('<?xml version="1.0" encoding="UTF-8"?><EInvoice>'
+            '<Header><EIid>' + e['invoice_no'] + '</EIid></Header><EInvoiceData>'
+            '<SellerInformation>' + el('SellerIdNum', e['seller_tax_no'])
+            + el('SellerName', e['seller_name']) + '</SellerInformation>'
+            '<BuyerInformation>' + el('BuyerIdNum', BUYER[0]) + el('BuyerName', BUYER[1])
+            + '</BuyerInformation><BasicInformation>'
+            + el('TotalAmWithoutTax', e['amount']) + el('TotalTaxAm', e['tax'])
+            + el('TotalTax-includedAmount', e['total']) + el('Drawer', e['drawer'])
+            + el('RequestTime', e['date'] + ' 10:00:00') + '</BasicInformation>'
+            '<IssuItemInformation>' + el('ItemName', '*信息系统服务*技术服务费')
+            + '</IssuItemInformation><AdditionalInformation>' + el('Remark', e['remark'])
+            + '</AdditionalInformation></EInvoiceData><TaxSupervisionInfo>'
+            + el('InvoiceNumber', e['invoice_no']) + el('IssueTime', e['date'])
+            + '</TaxSupervisionInfo></EInvoice>').encode('utf-8')
+
+
+def write_structured(corpus, manifest):
+    """为每张（非扫描件）发票写同名XML，另在ofd子目录写只含版式骨架与内嵌XML的OFD"""
+    ofd_dir = os.path.join(corpus, 'ofd')
+    os.makedirs(ofd_dir)
+    xml_files, ofd_files = [], []
+    for name, e in manifest.items():
+        if not e:
+            continue
+        stem = os.path.splitext(name)[0]
+        xml = einvoice_xml(e)
+        xml_files.append(os.path.join(corpus, stem + '.xml'))
+        with open(xml_files[-1], 'wb') as f:
+            f.write(xml)
+        ofd_files.append(os.path.join(ofd_dir, stem + '.ofd'))
+        with zipfile.ZipFile(ofd_files[-1], 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('OFD.xml', '<ofd:OFD xmlns:ofd="http://www.ofdspec.org/2016"/>')
+            zf.writestr('Doc_0/Document.xml', '<ofd:Document xmlns:ofd="http://www.ofdspec.org/2016"/>')
+            zf.writestr(f"Doc_0/Attachs/{stem}.xml", xml)
+    return xml_files, ofd_files
+
+
+def run(label, paths, manifest, count, **options):
+    t0 = time.perf_counter()
+    records = list(iter_extract(paths, **options))
+    elapsed = time.perf_counter() - t0
+    bad = dict.fromkeys(CHECKED, 0)
+    ok = failed = 0
+    for record in records:
+        stem = os.path.splitext(os.path.basename(record['pdf_path']))[0]
+        expected = manifest[stem + '.pdf']
+        if not record['data']:
+            failed += 1
+            continue
+        ok += 1
+        for field in CHECKED:
+            bad[field] += record['data'].get(field) != expected[field]
+    bad = {k: v for k, v in bad.items() if v}
+    print(f"{label:<10}{elapsed:8.3f}s {count / elapsed:9.1f} 文件/秒  成功 {ok}  失败 {failed}"
+          f"  由XML读取 {sum(1 for r in records if r['structured'])}  字段不一致: {bad or '无'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='数电发票XML/OFD基准')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--scanned', type=float, default=0.02, help='扫描件比例')
+    parser.add_argument('--workers', type=int, default=1, help='解析PDF的进程数')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='bench_einvoice_')
+    try:
+        corpus = os.path.join(workdir, 'corpus')
+        manifest = generate(corpus, args.count, scanned=args.scanned)
+        pdf_files = sorted(os.path.join(corpus, name) for name in manifest)
+        xml_files, ofd_files = write_structured(corpus, manifest)
+        print(f"文件数: {args.count}  有XML/OFD: {len(xml_files)}  解析进程: {args.workers}")
+        options = {'workers': args.workers, 'triage': True}
+        run('解析PDF', pdf_files, manifest, args.count, structured=False, **options)
+        run('同名XML', pdf_files, manifest, args.count, structured=True, **options)
+        run('单独XML', xml_files, manifest, len(xml_files), **options)
+        run('单独OFD', ofd_files, manifest, len(ofd_files), **options)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Excel写入基准：比较原有write_to_excel（load_workbook + insert_rows）与流式写入
+在1k/10k/100k行时的耗时与峰值内存
+
+每个组合在独立子进程中运行，峰值内存互不干扰
+
+用法:
+    python benchmarks/bench_excel.py [--rows 1000 10000 100000] [--writers inplace stream]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from common import make_template, peak_rss_mb, synthetic_text  # noqa: E402
+
+WRITERS = ('inplace', 'stream')
+
+
+def run_child(writer, rows, workdir):
+    """子进程：生成rows条发票数据并写入，输出JSON结果"""
+    from invoice_extraction.core import write_to_excel
+    from invoice_extraction.excel_stream import write_to_excel_streaming
+    from invoice_extraction.fields import parse_invoice_text
+
+    rng = random.Random(0)
+    sample = [parse_invoice_text(synthetic_text(rng)) for _ in range(100)]
+    data_list = [sample[i % len(sample)] for i in range(rows)]
+
+    template = make_template(os.path.join(workdir, 'template.xlsx'))
+    output = os.path.join(workdir, f'{writer}_{rows}.xlsx')
+    func = write_to_excel if writer == 'inplace' else write_to_excel_streaming
+
+    baseline_rss = peak_rss_mb()
+    t0 = time.perf_counter()
+    func(template, data_list, output_path=output)
+    elapsed = time.perf_counter() - t0
+    json.dump({
+        'writer': writer,
+        'rows': rows,
+        'elapsed': elapsed,
+        'peak_rss_mb': peak_rss_mb(),
+        'baseline_rss_mb': baseline_rss,
+        'size_kb': os.path.getsize(output) / 1024,
+    }, sys.stdout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Excel写入基准')
+    parser.add_argument('--rows', nargs='+', type=int, default=[1000, 10000, 100000])
+    parser.add_argument('--writers', nargs='+', default=list(WRITERS), choices=WRITERS)
+    parser.add_argument('--child', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        writer, rows, workdir = args.child
+        run_child(writer, int(rows), workdir)
+        return 0
+
+    print(f"{'写入方式':<10}{'行数':>8}{'耗时s':>10}{'行/秒':>10}{'峰值内存MB':>12}{'增量MB':>10}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in args.rows:
+            for writer in args.writers:
+                proc = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--child', writer, str(rows), workdir],
+                    capture_output=True, text=True
+                )
+                if proc.returncode != 0:
+                    print(f"{writer} {rows}: 运行失败\n{proc.stderr.strip()}", file=sys.stderr)
+                    continue
+                r = json.loads(proc.stdout)
+                rate = rows / r['elapsed'] if r['elapsed'] else 0.0
+                if r['peak_rss_mb'] is None:
+                    rss = delta = '-'
+                else:
+                    rss = f"{r['peak_rss_mb']:.1f}"
+                    delta = f"{r['peak_rss_mb'] - r['baseline_rss_mb']:.1f}"
+                print(f"{writer:<10}{rows:>8}{r['elapsed']:>10.2f}{rate:>10.0f}{rss:>12}{delta:>10}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+字段提取微基准：对比旧版逐条正则扫描与单次扫描引擎的每张发票耗时，
+并校验两者提取结果一致（旧版排除含"2026年"的备注行，此类备注/月份差异单独列出）
+
+用法:
+    python benchmarks/bench_fields.py                  # 使用合成页面文本
+    python benchmarks/bench_fields.py --corpus 文本目录  # 使用已提取的页面文本(*.txt)
+"""
+import argparse
+import glob
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice_extraction.fields import parse_invoice_text  # noqa: E402
+from common import synthetic_text  # noqa: E402
+
+
+# ---- 旧版实现（逐字段re.search/re.findall，行切分两次），仅作对照 ----
+
+def legacy_is_valid_name(text):
+    if not text:
+        return False
+    if any(x in text for x in ['¥', '公司', '电子', '发票', '号码', '2026', '9144']):
+        return False
+    return bool(re.match(r'^[\u4e00-\u9fa5]{2,4}$', text))
+
+
+def legacy_extract_drawer(text):
+    lines = text.split('\n')
+    for i, line in enumerate(lines):
+        if '开票人' in line:
+            current = line.replace('开票人', '').replace(':', '').replace('：', '').strip()
+            if current and legacy_is_valid_name(current):
+                return current
+            if i + 1 < len(lines):
+                next_line = lines[i + 1].strip()
+                if legacy_is_valid_name(next_line):
+                    return next_line
+    return '高健铭'
+
+
+def legacy_parse_invoice_text(text):
+    data = {}
+    match = re.search(r'\b(\d{20})\b', text)
+    data['invoice_no'] = match.group(1) if match else ''
+    match = re.search(r'(\d{4})年(\d{1,2})月(\d{1,2})日', text)
+    if match:
+        year, month, day = match.groups()
+        data['date'] = f"{year}-{int(month):02d}-{int(day):02d}"
+    else:
+        data['date'] = ''
+    seller_match = re.search(r'91430100MA4TCG0Q2E\s*([\s\S]*?)\s*(91440300MA5H2BG470)', text)
+    if seller_match:
+        data['seller_name'] = seller_match.group(1).replace('\n', '').strip()
+    else:
+        data['seller_name'] = '鼎越数科（深圳）信息技术有限公司'
+    data['seller_tax_no'] = '91440300MA5H2BG470'
+    data['buyer_name'] = '湖南新飞创不良资产处置有限公司'
+    data['buyer_tax_no'] = '91430100MA4TCG0Q2E'
+    amounts = re.findall(r'[¥￥]\s*([\d,]+\.\d{2})', text)
+    if len(amounts) >= 3:
+        nums = [(float(a.replace(',', '')), a) for a in amounts]
+        nums.sort(key=lambda x: x[0], reverse=True)
+        data['total'] = nums[0][1].replace(',', '')
+        data['amount'] = nums[1][1].replace(',', '')
+        data['tax'] = nums[2][1].replace(',', '')
+    else:
+        data['amount'] = ''
+        data['tax'] = ''
+        data['total'] = ''
+    data['drawer'] = legacy_extract_drawer(text)
+    item_match = re.search(r'(\*信息系统服务\*技术服务费?)', text)
+    data['item_name'] = item_match.group(1) if item_match else '*信息系统服务*技术服务费'
+    lines = [l.strip() for l in text.split('\n') if l.strip()]
+    data['remark'] = ''
+    for line in reversed(lines):
+        if any(x in line for x in ['开票人', data['drawer'], '鼎越', '新飞创', '9144', '2026年']):
+            continue
+        if '¥' in line or '电子发票' in line or '增值税专用发票' in line:
+            continue
+        if '月' in line and ('费' in line or '服务' in line or '项目' in line):
+            data['remark'] = line
+            break
+    if data['remark']:
+        month_match = re.search(r'(\d{4}年\d{1,2}[-~]\d{1,2}月|\d{4}年\d{1,2}月)', data['remark'])
+        if month_match:
+            data['month'] = month_match.group(1).replace('月', '月份')
+        else:
+            month_match = re.search(r'(\d{1,2}[-~]\d{1,2}月|\d{1,2}月)', data['remark'])
+            if month_match:
+                month_part = month_match.group(1).replace('月', '月份')
+                if data['date']:
+                    data['month'] = f"{data['date'][:4]}年{month_part}"
+                else:
+                    data['month'] = month_part
+            else:
+                data['month'] = ''
+    else:
+        data['month'] = ''
+    return data
+
+
+def diff_fields(text):
+    """返回 (不一致字段列表, 已知差异字段列表)"""
+    old = legacy_parse_invoice_text(text)
+    new = parse_invoice_text(text)
+    fields = [k for k in new if old.get(k) != new[k]]
+    # 旧版跳过所有含"2026年"的行，这类备注现在能正确取到
+    if '2026年' in new['remark']:
+        known = [k for k in fields if k in ('remark', 'month')]
+        return [k for k in fields if k not in known], known
+    return fields, []
+
+
+def load_corpus(corpus_dir, count, seed):
+    if corpus_dir:
+        texts = []
+        for path in sorted(glob.glob(os.path.join(corpus_dir, '*.txt'))):
+            with open(path, encoding='utf-8') as f:
+                texts.append(f.read())
+        return texts
+    rng = random.Random(seed)
+    return [synthetic_text(rng) for _ in range(count)]
+
+
+def time_per_invoice(func, texts, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for text in texts:
+            func(text)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(texts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='字段提取微基准')
+    parser.add_argument('--corpus', help='页面文本目录（*.txt），不指定则合成')
+    parser.add_argument('-n', '--count', type=int, default=2000, help='合成文本数量')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数（取最快一次）')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    texts = load_corpus(args.corpus, args.count, args.seed)
+    if not texts:
+        print('语料为空', file=sys.stderr)
+        return 1
+
+    mismatches = {}
+    known = {}
+    for text in texts:
+        fields, known_fields = diff_fields(text)
+        for k in fields:
+            mismatches[k] = mismatches.get(k, 0) + 1
+        for k in known_fields:
+            known[k] = known.get(k, 0) + 1
+
+    before = time_per_invoice(legacy_parse_invoice_text, texts, args.repeat)
+    after = time_per_invoice(parse_invoice_text, texts, args.repeat)
+
+    print(f"语料: {len(texts)} 张  结果不一致: {mismatches or '无'}"
+          f"  已知差异（含2026年的备注）: {known or '无'}")
+    print(f"旧版逐条正则: {before * 1e6:8.1f} µs/张")
+    print(f"单次扫描引擎: {after * 1e6:8.1f} µs/张  ({before / after:.2f}x)")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+作业队列基准：同一批发票分别
+  1) 普通批处理一次完成
+  2) 作业模式（--jobs）一次完成
+  3) 作业模式在提取到一半时被杀（kill -9），再运行同一命令续跑
+  4) 作业模式同时启动多个进程
+比较总耗时、重复提取的文件数并核对台账字段（重命名会改动文件，每种方式各用一份语料副本）
+
+用法:
+    python benchmarks/bench_jobs.py [--count 2000] [--kill-after 0.5] [--processes 2]
+"""
+import argparse
+import os
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+from bench_pipeline import check_output  # noqa: E402
+from bench_triage import count_rows  # noqa: E402
+from corpus import generate  # noqa: E402
+
+
+def prepare(corpus, workdir, label):
+    inputs = os.path.join(workdir, label)
+    shutil.copytree(corpus, inputs, ignore=shutil.ignore_patterns('*.json', '*.xlsx'))
+    output = os.path.join(workdir, f"{label}.xlsx")
+    cmd = [sys.executable, '-m', 'invoice_extraction', inputs, '--ledger', output,
+           '-t', os.path.join(corpus, 'template.xlsx'), '--no-cache', '-q',
+           '--rename-journal', os.path.join(workdir, f"{label}.jsonl")]
+    return cmd, output
+
+
+def check(proc):
+    if proc.returncode not in (0, 3):  # 3为部分失败（扫描件跳过属预期）
+        raise SystemExit(f"批处理失败（退出码{proc.returncode}）:\n{proc.stderr}")
+
+
+def run_once(cmd):
+    t0 = time.perf_counter()
+    check(subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True))
+    return time.perf_counter() - t0
+
+
+def run_killed(cmd, store, kill_after):
+    """运行到约kill_after比例的文件已提交时杀掉进程，再续跑；返回 (总耗时, 被杀时已提交数)"""
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    committed = 0
+    while proc.poll() is None:
+        time.sleep(0.05)
+        if not os.path.exists(store):
+            continue
+        try:
+            with sqlite3.connect(store, timeout=1) as conn:
+                total, done = conn.execute(
+                    "SELECT COUNT(*), SUM(state NOT IN ('pending', 'leased')) FROM jobs").fetchone()
+        except sqlite3.Error:
+            continue
+        if total and (done or 0) >= total * kill_after:
+            proc.send_signal(signal.SIGKILL)
+            committed = done
+            break
+    proc.wait()
+    check(subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True))
+    return time.perf_counter() - t0, committed
+
+
+def run_parallel(cmd, processes):
+    t0 = time.perf_counter()
+    procs = [subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                              text=True) for _ in range(processes)]
+    for proc in procs:
+        proc.communicate()
+        check(proc)
+    return time.perf_counter() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='作业队列基准')
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--scanned', type=float, default=0.02, help='扫描件比例')
+    parser.add_argument('--kill-after', type=float, default=0.5, help='已提交多少比例的文件时杀掉进程')
+    parser.add_argument('--processes', type=int, default=2, help='同时运行的进程数')
+    parser.add_argument('--claim-size', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='bench_jobs_')
+    try:
+        corpus = os.path.join(workdir, 'corpus')
+        manifest = generate(corpus, args.count, scanned=args.scanned)
+        print(f"文件数: {args.count}  杀掉时机: {args.kill_after:.0%}  进程数: {args.processes}")
+
+        def report(label, output, elapsed, note=''):
+            mismatches = check_output(output, manifest)
+            bad = {k: v for k, v in mismatches.items() if v}
+            print(f"{label:<10} {elapsed:8.2f}s  {args.count / elapsed:8.1f} 文件/秒"
+                  f"  写入 {count_rows(output)} 行  字段不一致: {bad or '无'}{note}")
+
+        cmd, output = prepare(corpus, workdir, 'plain')
+        report('普通', output, run_once(cmd))
+
+        def job_cmd(label):
+            cmd, output = prepare(corpus, workdir, label)
+            store = os.path.join(workdir, f"{label}.sqlite3")
+            return cmd + ['--jobs', store, '--claim-size', str(args.claim_size)], output, store
+
+        cmd, output, _ = job_cmd('jobs')
+        report('作业模式', output, run_once(cmd))
+        cmd, output, store = job_cmd('killed')
+        elapsed, committed = run_killed(cmd, store, args.kill_after)
+        report('中断后续跑', output, elapsed, f"  被杀时已提交 {committed} 个文件")
+        cmd, output, _ = job_cmd('parallel')
+        report(f"{args.processes}个进程", output, run_parallel(cmd, args.processes))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+模板布局基准：
+  1) 分析模板（只读打开、找表头与合计行）与按模板哈希取缓存（进程内 / 磁盘）的耗时
+  2) 用标准模板和一个变体模板（标题行、表头从B列起、列顺序打乱、删改列、表头换行与别名）
+     分别以write_to_excel、流式写入、两次追加台账写入，按表头核对各字段、序号与金额格式
+
+用法:
+    python benchmarks/bench_layout.py [-n 500] [--repeat 200]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from openpyxl import Workbook, load_workbook  # noqa: E402
+
+from invoice_extraction import layout as layout_mod  # noqa: E402
+from invoice_extraction.core import write_to_excel  # noqa: E402
+from invoice_extraction.excel_stream import write_to_excel_streaming  # noqa: E402
+from invoice_extraction.fields import parse_invoice_text  # noqa: E402
+from invoice_extraction.ledger import append_to_ledger  # noqa: E402
+from common import LEDGER_HEADERS, make_template, synthetic_text  # noqa: E402
+
+# 核对的列：表头 -> 发票数据的键
+CHECKED = {'数电发票号码': 'invoice_no', '销方名称': 'seller_name', '开票日期': 'date',
+           '价税合计': 'total', '开票人': 'drawer', '备注': 'remark'}
+
+
+def make_variant_template(path):
+    """非标准模板：标题行、表头从B列起、列顺序打乱、去掉两列、加一列，合计在B列"""
+    headers = [h for h in LEDGER_HEADERS if h not in ('发票代码', '发票号码')]
+    random.Random(1).shuffle(headers)
+    headers.remove('序号')
+    headers.insert(0, '序号')
+    headers = ['价税\n合计' if h == '价税合计' else '购方名称' if h == '购买方名称' else h
+               for h in headers] + ['审核人']
+    wb = Workbook()
+    ws = wb.active
+    ws['A1'] = '2026年度发票台账'
+    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(headers) + 1)
+    ws.append([])
+    ws.append([None] + headers)
+    ws.append([None, '合计'])
+    ws.append([None, '制表人：'])
+    wb.save(path)
+    return path
+
+
+def check(output, data_list):
+    """按表头核对输出，返回 (数据行数, 不一致数)"""
+    ws = load_workbook(output).active
+    layout = layout_mod.analyze_sheet(ws)
+    col = layout.columns
+    start = layout.data_row
+    bad = 0
+    for i, data in enumerate(data_list):
+        row = start + i
+        for header, key in CHECKED.items():
+            value = ws.cell(row=row, column=col[header]).value
+            if key == 'total':
+                ok = abs(float(value) - float(data[key])) < 0.005
+            else:
+                ok = (value or '') == data[key]
+            bad += not ok
+        bad += ws.cell(row=row, column=col['序号']).value != i + 1
+        bad += ws.cell(row=row, column=col['价税合计']).number_format != '#,##0.00'
+    # 合计行紧接在数据之后，其后的行保留
+    bad += not layout_mod.is_total_label(
+        ws.cell(row=start + len(data_list), column=layout.first_col).value)
+    return len(data_list), bad
+
+
+def time_layouts(template, repeat, cache_path):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        layout_mod.analyze_template(template)
+    analyze = (time.perf_counter() - t0) / repeat
+
+    layout_mod.get_layout(template, cache_path=cache_path)  # 写入磁盘缓存
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        layout_mod._LAYOUTS.clear()  # 模拟新进程：只有磁盘缓存
+        layout_mod.get_layout(template, cache_path=cache_path)
+    disk = (time.perf_counter() - t0) / repeat
+
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        layout_mod.get_layout(template, cache_path=cache_path)
+    memory = (time.perf_counter() - t0) / repeat
+    return analyze, disk, memory
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='模板布局基准')
+    parser.add_argument('-n', '--count', type=int, default=500, help='写入的发票数')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    data_list = [parse_invoice_text(synthetic_text(rng)) for _ in range(args.count)]
+    half = args.count // 2
+    with tempfile.TemporaryDirectory() as workdir:
+        cache_path = os.path.join(workdir, 'layouts.json')
+        # 追加台账时要计算PDF哈希，用占位文件代替
+        pdf_paths = []
+        for i in range(args.count):
+            pdf_paths.append(os.path.join(workdir, f"{i}.pdf"))
+            with open(pdf_paths[-1], 'wb') as f:
+                f.write(f"%PDF-1.4 {i}".encode())
+        templates = {
+            '标准': make_template(os.path.join(workdir, 'standard.xlsx')),
+            '变体': make_variant_template(os.path.join(workdir, 'variant.xlsx')),
+        }
+        print(f"{'模板':<4}{'分析ms':>9}{'磁盘缓存ms':>12}{'进程内ms':>10}"
+              f"{'write_to_excel':>16}{'流式写入':>10}{'追加台账':>10}")
+        for label, template in templates.items():
+            analyze, disk, memory = time_layouts(template, args.repeat, cache_path)
+            results = []
+            for name in ('full', 'stream', 'ledger'):
+                output = os.path.join(workdir, f"{label}_{name}.xlsx")
+                if name == 'full':
+                    write_to_excel(template, data_list, output_path=output)
+                elif name == 'stream':
+                    write_to_excel_streaming(template, data_list, output_path=output)
+                else:
+                    shutil.copyfile(template, output)
+                    items = list(zip(pdf_paths, data_list))
+                    append_to_ledger(output, items[:half])
+                    append_to_ledger(output, items)  # 前一半重复，应被跳过
+                rows, bad = check(output, data_list)
+                results.append(f"{rows}行/{bad}处不一致")
+            print(f"{label:<4}{analyze * 1000:>9.2f}{disk * 1000:>12.3f}{memory * 1000:>10.3f}"
+                  + ''.join(f"{r:>14}" for r in results))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+端到端基准：在合成语料上运行命令行批处理（提取 -> 写入Excel），
+报告文件/秒、各阶段延迟分布（p50/p95/p99）、峰值内存与字段准确率，
+结果保存为JSON；给定基线JSON时标记性能回退
+
+用法:
+    python benchmarks/bench_pipeline.py 语料目录 [--generate 1000] [--workers 1] [--stream-excel]
+        [--output 结果.json] [--baseline 基线.json] [--threshold 0.1]
+
+语料目录不存在或为空时用--generate指定的数量生成（见corpus.py）
+有回退时退出码为1，可直接用于CI
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from openpyxl import load_workbook  # noqa: E402
+
+from corpus import generate  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 与结果对比的台账列（列号 -> 字段）
+CHECKED_COLUMNS = {4: 'invoice_no', 6: 'seller_name', 9: 'date', 13: 'total', 19: 'drawer', 20: 'remark'}
+# 阶段耗时低于此值（秒）时不比较分位数，避免噪声误报
+MIN_STAGE_TOTAL = 0.05
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def ensure_corpus(corpus, count):
+    manifest_path = os.path.join(corpus, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        if not count:
+            raise SystemExit(f"语料不存在: {corpus}（用--generate N生成）")
+        print(f"生成语料 {count} 个文件...", file=sys.stderr)
+        generate(corpus, count)
+    with open(manifest_path, encoding='utf-8') as f:
+        return json.load(f)['files']
+
+
+def check_output(output, manifest):
+    """按数电发票号码把输出台账与真实字段对比，返回各字段不一致数"""
+    expected = {e['invoice_no']: e for e in manifest.values() if e}
+    mismatches = dict.fromkeys(CHECKED_COLUMNS.values(), 0)
+    found = 0
+    wb = load_workbook(output, read_only=True)
+    try:
+        for row in wb.active.iter_rows(min_row=2, values_only=True):
+            if len(row) < max(CHECKED_COLUMNS) or not row[3]:
+                continue
+            e = expected.get(str(row[3]))
+            if e is None:
+                continue
+            found += 1
+            for col, field in CHECKED_COLUMNS.items():
+                value = row[col - 1]
+                if field == 'total':
+                    ok = value is not None and abs(float(value) - float(e['total'])) < 0.005
+                else:
+                    ok = (value or '') == e[field]
+                if not ok:
+                    mismatches[field] += 1
+    finally:
+        wb.close()
+    mismatches['missing'] = len(expected) - found
+    return mismatches
+
+
+def run_pipeline(args, corpus, workdir):
+    output = os.path.join(workdir, 'out.xlsx')
+    metrics = os.path.join(workdir, 'metrics.json')
+    cmd = [sys.executable, '-m', 'invoice_extraction', corpus,
+           '-t', os.path.join(corpus, 'template.xlsx'), '-o', output,
+           '--no-rename', '--metrics', metrics, '-q', '-j', str(args.workers),
+           '--backend', args.backend, '--input', args.input]
+    if args.stream_excel:
+        cmd.append('--stream-excel')
+    if args.cache:
+        cmd += ['--cache-path', os.path.join(workdir, 'cache.sqlite3')]
+    else:
+        cmd.append('--no-cache')
+
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - t0
+    if proc.returncode not in (0, 3):  # 3为部分失败（扫描件无法提取属预期）
+        raise SystemExit(f"批处理失败（退出码{proc.returncode}）:\n{proc.stderr}")
+    # 子进程（含其进程池）中的最大峰值常驻内存
+    peak_rss_mb = None
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        peak_rss_mb = rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+    with open(metrics, encoding='utf-8') as f:
+        stages = json.load(f)['stages']
+    return output, elapsed, peak_rss_mb, stages
+
+
+def compare(result, baseline, threshold):
+    """与基线比较，返回回退说明列表"""
+    flags = []
+    base_rate, rate = baseline['files_per_s'], result['files_per_s']
+    if base_rate and rate < base_rate * (1 - threshold):
+        flags.append(f"吞吐量 {rate:.1f} < 基线 {base_rate:.1f} 文件/秒")
+    base_rss, rss = baseline.get('peak_rss_mb'), result.get('peak_rss_mb')
+    if base_rss and rss and rss > base_rss * (1 + threshold):
+        flags.append(f"峰值内存 {rss:.1f} > 基线 {base_rss:.1f} MB")
+    for stage, stats in result['stages'].items():
+        base = baseline.get('stages', {}).get(stage)
+        if not base or stats['total_s'] < MIN_STAGE_TOTAL:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            if base[key] and stats[key] > base[key] * (1 + threshold):
+                flags.append(f"{stage} {key} {stats[key]:.3f} > 基线 {base[key]:.3f}")
+    for field, count in result['mismatches'].items():
+        if count > baseline.get('mismatches', {}).get(field, 0):
+            flags.append(f"字段 {field} 不一致 {count} > 基线 {baseline['mismatches'].get(field, 0)}")
+    return flags
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='端到端基准')
+    parser.add_argument('corpus', help='语料目录')
+    parser.add_argument('--generate', type=int, default=0, help='语料不存在时生成的文件数')
+    parser.add_argument('-j', '--workers', type=int, default=1)
+    parser.add_argument('--backend', default='pypdf2')
+    parser.add_argument('--input', default='stream')
+    parser.add_argument('--stream-excel', action='store_true')
+    parser.add_argument('--cache', action='store_true', help='使用（新建的）提取缓存，默认不用')
+    parser.add_argument('--output', help='结果JSON路径')
+    parser.add_argument('--baseline', help='基线结果JSON，用于标记回退')
+    parser.add_argument('--threshold', type=float, default=0.1, help='回退阈值（比例）')
+    args = parser.parse_args(argv)
+
+    manifest = ensure_corpus(args.corpus, args.generate)
+    with tempfile.TemporaryDirectory() as workdir:
+        output, elapsed, peak_rss_mb, stages = run_pipeline(args, args.corpus, workdir)
+        mismatches = check_output(output, manifest)
+
+    files = len(manifest)
+    result = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_rev': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {'files': files, 'workers': args.workers, 'backend': args.backend,
+                   'input': args.input, 'stream_excel': args.stream_excel, 'cache': args.cache},
+        'files': files,
+        'elapsed_s': elapsed,
+        'files_per_s': files / elapsed if elapsed else 0.0,
+        'peak_rss_mb': peak_rss_mb,
+        'stages': stages,
+        'mismatches': mismatches,
+    }
+
+    rss = f"{peak_rss_mb:.1f}MB" if peak_rss_mb is not None else '-'
+    print(f"文件数: {files}  耗时: {elapsed:.2f}s  吞吐量: {result['files_per_s']:.1f} 文件/秒"
+          f"  峰值内存: {rss}")
+    print(f"{'阶段':<16}{'次数':>8}{'合计s':>10}{'p50ms':>10}{'p95ms':>10}{'p99ms':>10}")
+    for stage, s in stages.items():
+        print(f"{stage:<16}{s['count']:>8}{s['total_s']:>10.3f}{s['p50_ms']:>10.3f}"
+              f"{s['p95_ms']:>10.3f}{s['p99_ms']:>10.3f}")
+    print("字段不一致: " + '  '.join(f"{k} {v}" for k, v in mismatches.items()))
+
+    flags = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != result['config']:
+            print(f"注意: 基线配置不同 {baseline.get('config')}")
+        flags = compare(result, baseline, args.threshold)
+        result['baseline'] = args.baseline
+        result['regressions'] = flags
+        print("回退: " + ('无' if not flags else ''))
+        for flag in flags:
+            print(f"  ✗ {flag}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+    return 1 if flags else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+提取配置基准：往来单位登记表从0增长到数十万家时，每张发票的解析耗时与准确率
+对照：把所有登记的识别号拼成一个分支正则（每家单位一个分支）再扫描
+
+用法:
+    python benchmarks/bench_profiles.py [--sizes 0,1000,10000,100000] [-n 2000]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice_extraction.fields import parse_invoice_text  # noqa: E402
+from invoice_extraction.profiles import load_profile  # noqa: E402
+from common import SELLERS, synthetic_invoice  # noqa: E402
+
+USCC_CHARS = '0123456789ABCDEFGHJKLMNPQRTUWXY'
+
+
+def random_tax_no(rng):
+    return '91' + ''.join(rng.choice(USCC_CHARS) for _ in range(16))
+
+
+def write_profile(workdir, size, rng):
+    """写出登记size家随机单位（另加语料中的销方）的配置，返回配置路径"""
+    csv_path = os.path.join(workdir, f"parties_{size}.csv")
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['tax_no', 'name', 'role'])
+        for i in range(size):
+            writer.writerow([random_tax_no(rng), f"往来单位{i}有限公司", 'seller'])
+        if size:
+            for name_forms, tax_no in SELLERS:
+                writer.writerow([tax_no, ''.join(name_forms[-1]), 'seller'])
+    config = {
+        'name': f"登记{size}家",
+        'buyers': [{'name': '湖南新飞创不良资产处置有限公司', 'tax_no': '91430100MA4TCG0Q2E'}],
+        'sellers': [],
+        'parties_csv': os.path.basename(csv_path),
+        'item_patterns': [r'\*信息系统服务\*技术服务费?'],
+        'default_item_name': '*信息系统服务*技术服务费',
+    }
+    path = os.path.join(workdir, f"profile_{size}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False)
+    return path
+
+
+def time_per_invoice(func, texts, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for text in texts:
+            func(text)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(texts)
+
+
+def alternation_regex(profile):
+    """对照：每家单位一个分支的正则"""
+    return re.compile('|'.join(map(re.escape, profile.registry.parties)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='提取配置基准')
+    parser.add_argument('--sizes', default='0,1000,10000,100000', help='登记单位数，逗号分隔')
+    parser.add_argument('-n', '--count', type=int, default=2000, help='合成发票数量')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数（取最快一次）')
+    parser.add_argument('--no-regex', action='store_true', help='不测对照的分支正则（单位很多时很慢）')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    invoices = [synthetic_invoice(rng, SELLERS) for _ in range(args.count)]
+    texts = ['\n'.join(lines) for lines, _ in invoices]
+
+    print(f"发票数: {args.count}  销方数: {len(SELLERS)}")
+    print(f"{'登记单位':>10}{'加载s':>9}{'内存MB':>9}{'解析µs/张':>12}{'分支正则µs/张':>16}  字段不一致")
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in (int(s) for s in args.sizes.split(',')):
+            path = write_profile(workdir, size, rng)
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            profile = load_profile(path)
+            load_s = time.perf_counter() - t0
+            memory_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+            tracemalloc.stop()
+
+            parse = time_per_invoice(lambda t: parse_invoice_text(t, profile), texts, args.repeat)
+            regex_us = '-'
+            if size and not args.no_regex:
+                regex = alternation_regex(profile)
+                regex_us = f"{time_per_invoice(regex.findall, texts, args.repeat) * 1e6:.1f}"
+
+            mismatches = {}
+            for text, (_, expected) in zip(texts, invoices):
+                data = parse_invoice_text(text, profile)
+                for key, value in expected.items():
+                    if data.get(key) != value:
+                        mismatches[key] = mismatches.get(key, 0) + 1
+            print(f"{size:>10}{load_s:>9.2f}{memory_mb:>9.1f}{parse * 1e6:>12.1f}{regex_us:>16}"
+                  f"  {mismatches or '无'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+重命名基准：比较逐个rename_pdf（exists循环 + shutil.move）与batch_rename（单次列目录 + 日志 + 批量改名）
+可用--latency-ms给每次文件系统元数据调用（stat/rename/link/unlink/scandir）加上固定延迟，模拟SMB/NFS往返
+
+用法:
+    python benchmarks/bench_rename.py [--files 10000] [--latency-ms 0.5] [--workers 1 8]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from invoice_extraction.core import rename_pdf  # noqa: E402
+from invoice_extraction.fields import parse_invoice_text  # noqa: E402
+from invoice_extraction.rename import batch_rename  # noqa: E402
+from common import synthetic_text  # noqa: E402
+
+PATCHED = ('stat', 'lstat', 'rename', 'link', 'unlink', 'scandir')
+
+
+class FsCalls:
+    """替换os模块中的元数据函数：计数并加延迟"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.counts = dict.fromkeys(PATCHED, 0)
+        self.originals = {}
+
+    def __enter__(self):
+        for name in PATCHED:
+            original = self.originals[name] = getattr(os, name)
+            setattr(os, name, self._wrap(name, original))
+        return self
+
+    def _wrap(self, name, original):
+        def wrapper(*args, **kwargs):
+            self.counts[name] += 1
+            if self.latency:
+                time.sleep(self.latency)
+            return original(*args, **kwargs)
+        return wrapper
+
+    def __exit__(self, *exc):
+        for name, original in self.originals.items():
+            setattr(os, name, original)
+
+
+def make_folder(directory, items):
+    """生成待改名的空PDF文件，返回 [(路径, 发票数据)]"""
+    result = []
+    for i, data in enumerate(items):
+        path = os.path.join(directory, f'scan_{i:06d}.pdf')
+        open(path, 'wb').close()
+        result.append((path, data))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='重命名基准')
+    parser.add_argument('--files', type=int, default=10000)
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help='每次元数据调用附加的延迟（毫秒）')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8],
+                        help='batch_rename的线程数（可给多个）')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    # 只有少量不同的名字，制造大量同名冲突
+    sample = [parse_invoice_text(synthetic_text(rng)) for _ in range(max(args.files // 20, 1))]
+    data_list = [sample[i % len(sample)] for i in range(args.files)]
+    latency = args.latency_ms / 1000
+
+    modes = [('rename_pdf', None)] + [(f'batch x{w}', w) for w in args.workers]
+    print(f"文件数: {args.files}  每次调用延迟: {args.latency_ms}ms")
+    print(f"{'方式':<12}{'耗时s':>10}{'文件/秒':>10}{'stat':>8}{'rename':>8}{'link+unlink':>12}{'scandir':>8}{'失败':>6}")
+    for label, workers in modes:
+        with tempfile.TemporaryDirectory() as workdir:
+            items = make_folder(workdir, data_list)
+            journal = os.path.join(workdir, 'journal.jsonl')
+            failed = 0
+            with FsCalls(latency) as calls:
+                t0 = time.perf_counter()
+                if workers is None:
+                    for pdf_path, data in items:
+                        try:
+                            rename_pdf(pdf_path, data)
+                        except Exception:
+                            failed += 1
+                else:
+                    results = batch_rename(items, journal_path=journal, workers=workers)
+                    failed = sum(1 for _, error in results.values() if error)
+                elapsed = time.perf_counter() - t0
+            c = calls.counts
+            rate = args.files / elapsed if elapsed else 0.0
+            print(f"{label:<12}{elapsed:>10.2f}{rate:>10.0f}{c['stat'] + c['lstat']:>8}"
+                  f"{c['rename']:>8}{c['link'] + c['unlink']:>12}{c['scandir']:>8}{failed:>6}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+启动基准：统计冷启动延迟，防止重依赖（openpyxl、PDF解析库）又回到导入路径上
+- 导入耗时：用 python -X importtime 导入GUI（main）与命令行模块，列出累计耗时最多的模块
+- 命令行：python -m invoice_extraction --help 的总耗时
+- 图形界面：从启动进程到主窗口第一次绘制完成的耗时（无显示器时跳过）
+每项运行多次取最小值与中位数；启动时导入了应推迟的模块算回退，
+给定基线JSON时还按最小值比较各项耗时
+
+用法:
+    python benchmarks/bench_startup.py [--repeat 5] [--top 15]
+        [--output 结果.json] [--baseline 基线.json] [--threshold 0.2]
+
+有回退时退出码为1，可直接用于CI
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 启动时不应导入的模块（首次处理时才导入）
+DEFERRED_MODULES = ('openpyxl', 'PyPDF2', 'pypdf', 'pdfminer')
+# 耗时低于此值（毫秒）时不比较，避免噪声误报
+MIN_COMPARE_MS = 20
+
+IMPORT_TARGETS = {
+    'gui': 'import main',
+    'cli': 'import invoice_extraction.cli',
+}
+
+# 子进程中创建主窗口并绘制一次后立即退出；Tk不可用时退出码为2
+FIRST_WINDOW = """
+import sys
+import tkinter as tk
+try:
+    root = tk.Tk()
+except tk.TclError:
+    sys.exit(2)
+import main
+main.InvoiceProcessorApp(root)
+root.update()
+root.destroy()
+"""
+
+
+def _run(args):
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable] + args, cwd=ROOT, capture_output=True, text=True)
+    return proc, (time.perf_counter() - t0) * 1000
+
+
+def timed(args, repeat):
+    """多次运行，返回 {min_ms, median_ms}；失败返回 (None, 退出码)"""
+    samples = []
+    for _ in range(repeat):
+        proc, ms = _run(args)
+        if proc.returncode != 0:
+            return None, proc.returncode
+        samples.append(ms)
+    return {'min_ms': min(samples), 'median_ms': statistics.median(samples)}, 0
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 输出，返回 [(模块, 自身微秒, 累计微秒, 嵌套层级)]"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        level = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), level))
+    return entries
+
+
+def import_breakdown(code, top):
+    proc, _ = _run(['-X', 'importtime', '-c', code])
+    if proc.returncode != 0:
+        raise SystemExit(f"导入失败: {code}\n{proc.stderr}")
+    entries = parse_importtime(proc.stderr)
+    names = {name for name, _, _, _ in entries}
+    return {
+        # 顶层导入的累计耗时之和即总导入耗时
+        'total_ms': sum(cum for _, _, cum, level in entries if level == 0) / 1000,
+        'modules': len(entries),
+        'top': [{'module': name, 'self_ms': s / 1000, 'cumulative_ms': c / 1000}
+                for name, s, c, _ in sorted(entries, key=lambda e: -e[2])[:top]],
+        'deferred_loaded': sorted(m for m in DEFERRED_MODULES if m in names),
+    }
+
+
+def compare(result, baseline, threshold):
+    """与基线比较，返回回退说明列表"""
+    flags = []
+    for key, stats in result['timings'].items():
+        base = baseline.get('timings', {}).get(key)
+        if not stats or not base or stats['min_ms'] < MIN_COMPARE_MS:
+            continue
+        if stats['min_ms'] > base['min_ms'] * (1 + threshold):
+            flags.append(f"{key} {stats['min_ms']:.1f}ms > 基线 {base['min_ms']:.1f}ms")
+    return flags
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='启动基准')
+    parser.add_argument('--repeat', type=int, default=5, help='每项运行次数')
+    parser.add_argument('--top', type=int, default=15, help='列出累计导入耗时最多的模块数')
+    parser.add_argument('--output', help='结果JSON路径')
+    parser.add_argument('--baseline', help='基线结果JSON，用于标记回退')
+    parser.add_argument('--threshold', type=float, default=0.2, help='回退阈值（比例）')
+    args = parser.parse_args(argv)
+
+    imports = {target: import_breakdown(code, args.top) for target, code in IMPORT_TARGETS.items()}
+    timings = {}
+    timings['interpreter'], _ = timed(['-c', 'pass'], args.repeat)
+    timings['cli_help'], _ = timed(['-m', 'invoice_extraction', '--help'], args.repeat)
+    timings['gui_first_window'], code = timed(['-c', FIRST_WINDOW], args.repeat)
+    if code == 2:
+        print("注意: Tk无法创建窗口（无显示器？），跳过图形界面首窗耗时", file=sys.stderr)
+    elif code:
+        raise SystemExit(f"图形界面启动失败（退出码{code}）")
+
+    result = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'imports': imports,
+        'timings': timings,
+    }
+
+    for target, stats in imports.items():
+        print(f"[{target}] 导入 {stats['total_ms']:.1f}ms  模块数 {stats['modules']}"
+              f"  应推迟但已导入: {', '.join(stats['deferred_loaded']) or '无'}")
+        print(f"  {'模块':<40}{'自身ms':>10}{'累计ms':>10}")
+        for entry in stats['top']:
+            print(f"  {entry['module']:<40}{entry['self_ms']:>10.1f}{entry['cumulative_ms']:>10.1f}")
+    print(f"{'启动项':<20}{'最小ms':>10}{'中位ms':>10}")
+    for key, stats in timings.items():
+        if stats:
+            print(f"{key:<20}{stats['min_ms']:>10.1f}{stats['median_ms']:>10.1f}")
+        else:
+            print(f"{key:<20}{'-':>10}{'-':>10}")
+
+    # 启动时导入了应推迟的模块，无论有无基线都算回退
+    flags = [f"{target} 启动时导入了 {', '.join(stats['deferred_loaded'])}"
+             for target, stats in imports.items() if stats['deferred_loaded']]
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        flags += compare(result, baseline, args.threshold)
+        result['baseline'] = args.baseline
+    result['regressions'] = flags
+    print("回退: " + ('无' if not flags else ''))
+    for flag in flags:
+        print(f"  ✗ {flag}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+    return 1 if flags else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
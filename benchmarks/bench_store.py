@@ -0,0 +1,96 @@
+"""
+列式存储基准：比较字典列表与InvoiceStore的内存占用，并统计整批校验、小计与CSV导出耗时
+
+用法:
+    python benchmarks/bench_store.py [--count 200000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from invoice_extraction.fields import parse_invoice_text  # noqa: E402
+from invoice_extraction import store as store_mod  # noqa: E402
+from invoice_extraction.store import InvoiceStore  # noqa: E402
+from common import SELLERS, synthetic_text  # noqa: E402
+
+
+def make_records(count, rng):
+    """生成count条结果字典；号码与金额字符串每条各不相同，其余字段来自样本"""
+    sample = [parse_invoice_text(synthetic_text(rng)) for _ in range(200)]
+    records = []
+    for i in range(count):
+        data = dict(sample[i % len(sample)])
+        amount = rng.randint(100, 5_000_000)
+        tax = amount * 6 // 100
+        data['invoice_no'] = str(rng.randint(10 ** 19, 10 ** 20 - 1))
+        data['amount'] = f"{amount // 100}.{amount % 100:02d}"
+        data['tax'] = f"{tax // 100}.{tax % 100:02d}"
+        data['total'] = f"{(amount + tax) // 100}.{(amount + tax) % 100:02d}"
+        data['seller_name'] = ''.join(rng.choice(rng.choice(SELLERS)[0]))
+        records.append(data)
+    return records
+
+
+def traced(func):
+    """返回 (结果, 新增分配MB, 耗时秒)"""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - t0
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current / 1024 / 1024, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='列式存储基准')
+    parser.add_argument('--count', type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    records, dict_mb, _ = traced(lambda: make_records(args.count, rng))
+    store, store_mb, build_s = traced(lambda: InvoiceStore(records))
+
+    print(f"条数: {args.count}")
+    print(f"字典列表:   {dict_mb:8.1f} MB  ({dict_mb * 1024 * 1024 / args.count:.0f} 字节/条)")
+    print(f"列式存储:   {store_mb:8.1f} MB  ({store_mb * 1024 * 1024 / args.count:.0f} 字节/条)"
+          f"  构建 {build_s:.2f}s")
+
+    t0 = time.perf_counter()
+    issues = store.validate(start='2026-01-01', end='2026-12-31')
+    label = '整批校验:  ' if store_mod._numpy() else '整批校验*: '
+    print(f"{label} {time.perf_counter() - t0:8.3f} s  "
+          + '  '.join(f"{k} {len(v)}" for k, v in issues.items()))
+    if store_mod._numpy():
+        # 对照：未安装numpy时的逐行校验
+        numpy_module, store_mod._numpy = store_mod._numpy, lambda: None
+        t0 = time.perf_counter()
+        fallback = store.validate(start='2026-01-01', end='2026-12-31')
+        print(f"逐行校验:   {time.perf_counter() - t0:8.3f} s  结果一致: {fallback == issues}")
+        store_mod._numpy = numpy_module
+    else:
+        print('  *未安装numpy，为逐行校验')
+
+    t0 = time.perf_counter()
+    sellers = store.subtotal_by_seller()
+    months = store.subtotal_by_month()
+    print(f"小计:       {time.perf_counter() - t0:8.3f} s  销方 {len(sellers)}  月份 {len(months)}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'invoices.csv')
+        t0 = time.perf_counter()
+        store.to_csv(path)
+        elapsed = time.perf_counter() - t0
+        print(f"CSV导出:    {elapsed:8.3f} s  {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+行样式基准：比较逐格赋值样式（apply_cell_style）与预计算样式数组（RowStyles）
+分别统计写入行数/秒与wb.save耗时，并校验两者输出的样式表与工作表XML完全一致
+
+用法:
+    python benchmarks/bench_styles.py [--rows 10000]
+"""
+import argparse
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from openpyxl import load_workbook  # noqa: E402
+
+from invoice_extraction.core import (  # noqa: E402
+    AMOUNT_COLUMNS, NUMBER_COLUMNS, RowStyles, apply_cell_style, build_row_values,
+    find_total_row, write_row_data,
+)
+from invoice_extraction.fields import parse_invoice_text  # noqa: E402
+from common import make_template, synthetic_text  # noqa: E402
+
+
+def legacy_write_row_data(ws, row, seq_no, data):
+    """原实现：每个单元格单独赋值border/alignment/number_format"""
+    for col, value in enumerate(build_row_values(seq_no, data), 1):
+        cell = ws.cell(row=row, column=col, value=value)
+        apply_cell_style(cell, is_number=(col in NUMBER_COLUMNS), is_amount=(col in AMOUNT_COLUMNS))
+
+
+def run(mode, template, data_list, output):
+    wb = load_workbook(template)
+    ws = wb.active
+    total_row = find_total_row(ws)
+    ws.insert_rows(total_row, len(data_list))
+
+    t0 = time.perf_counter()
+    if mode == 'per-cell':
+        for idx, data in enumerate(data_list):
+            legacy_write_row_data(ws, total_row + idx, idx + 1, data)
+    else:
+        styles = RowStyles(ws)
+        for idx, data in enumerate(data_list):
+            write_row_data(ws, total_row + idx, idx + 1, data, styles)
+    write_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    wb.save(output)
+    save_time = time.perf_counter() - t0
+    return write_time, save_time
+
+
+def xml_digest(path):
+    """样式表与工作表XML的摘要，用于确认渲染格式不变"""
+    h = hashlib.md5()
+    with zipfile.ZipFile(path) as z:
+        for name in ('xl/styles.xml', 'xl/worksheets/sheet1.xml'):
+            h.update(z.read(name))
+    return h.hexdigest()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='行样式基准')
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    sample = [parse_invoice_text(synthetic_text(rng)) for _ in range(100)]
+    data_list = [sample[i % len(sample)] for i in range(args.rows)]
+
+    print(f"行数: {args.rows}")
+    print(f"{'方式':<10}{'写入s':>10}{'行/秒':>10}{'保存s':>10}")
+    digests = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        template = make_template(os.path.join(workdir, 'template.xlsx'))
+        for mode in ('per-cell', 'registry'):
+            output = os.path.join(workdir, f'{mode}.xlsx')
+            write_time, save_time = run(mode, template, data_list, output)
+            rate = args.rows / write_time if write_time else 0.0
+            print(f"{mode:<10}{write_time:>10.2f}{rate:>10.0f}{save_time:>10.2f}")
+            digests[mode] = xml_digest(output)
+
+    same = len(set(digests.values())) == 1
+    print(f"输出XML一致: {'是' if same else '否'}")
+    return 0 if same else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+基准脚本共用的工具：合成发票文本、Excel模板与峰值内存测量
+"""
+import sys
+
+from openpyxl import Workbook
+
+LEDGER_HEADERS = [
+    '序号', '发票代码', '发票号码', '数电发票号码', '销方识别号', '销方名称', '购方识别号',
+    '购买方名称', '开票日期', '货物或应税劳务名称', '金额', '税额', '价税合计', '发票来源',
+    '发票票种', '发票状态', '是否正数发票', '发票风险等级', '开票人', '备注', '对应月份', '项目名称',
+]
+
+
+def peak_rss_mb():
+    """当前进程峰值常驻内存（MB），不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+# 销方：(名称的换行形式列表, 纳税人识别号)
+SELLERS = [
+    ([['鼎越数科（深圳）', '信息技术有限公司'], ['鼎越数科（深圳）信息技术有限公司']], '91440300MA5H2BG470'),
+    ([['星河云链（广州）', '科技有限公司'], ['星河云链（广州）科技有限公司']], '91440101MA9W3KX21Q'),
+    ([['长沙麓谷智算', '数据服务有限公司']], '91430104MA4R8LTC6B'),
+]
+DRAWERS = ['张三', '李晓明', '欧阳娜娜', '高健铭']
+REMARKS = ['{m}月技术服务费', '{m}-{n}月项目服务费', '2025年{m}月信息系统服务费', '{m}~{n}月运维服务',
+           '2026年{m}-{n}月信息系统运维服务费']
+
+
+def synthetic_invoice(rng, sellers=SELLERS[:1]):
+    """
+    生成一张数电发票的页面文本行（类似PyPDF2提取结果）及其真实字段
+    金额带千分位，开票人一半换到下一行，备注可跨多个月
+    """
+    amount = rng.randint(100, 5_000_000) / 100
+    tax = round(amount * 0.06, 2)
+    total = amount + tax
+    month = rng.randint(1, 12)
+    day = rng.randint(1, 28)
+    invoice_no = str(rng.randint(10 ** 19, 10 ** 20 - 1))
+    name_forms, seller_tax_no = rng.choice(sellers)
+    seller_lines = rng.choice(name_forms)
+    remark = rng.choice(REMARKS).format(m=month, n=min(month + 2, 12))
+    drawer = rng.choice(DRAWERS)
+
+    lines = [
+        '电子发票（增值税专用发票）',
+        f"发票号码：{invoice_no}",
+        f"开票日期：2026年{month:02d}月{day:02d}日",
+        '购买方信息 名称：湖南新飞创不良资产处置有限公司',
+        '统一社会信用代码/纳税人识别号：',
+        '91430100MA4TCG0Q2E',
+    ]
+    lines += seller_lines
+    lines += [
+        seller_tax_no,
+        '项目名称 规格型号 单位 数量 单价 金额 税率/征收率 税额',
+        '*信息系统服务*技术服务费 1 6%',
+        f"¥{amount:,.2f}",
+        f"¥{tax:,.2f}",
+        '价税合计（大写） （小写）',
+        f"¥{total:,.2f}",
+        '备注',
+        remark,
+    ]
+    if rng.random() < 0.5:
+        lines += ['开票人：', drawer]
+    else:
+        lines.append(f"开票人：{drawer}")
+
+    expected = {
+        'invoice_no': invoice_no,
+        'date': f"2026-{month:02d}-{day:02d}",
+        'seller_name': ''.join(seller_lines),
+        'seller_tax_no': seller_tax_no,
+        'amount': f"{amount:.2f}",
+        'tax': f"{tax:.2f}",
+        'total': f"{total:.2f}",
+        'drawer': drawer,
+        'remark': remark,
+    }
+    return lines, expected
+
+
+def synthetic_text(rng):
+    """生成一张类似PyPDF2提取结果的数电发票页面文本"""
+    return '\n'.join(synthetic_invoice(rng)[0])
+
+
+def make_template(path):
+    """生成带表头和合计行的台账模板"""
+    wb = Workbook()
+    ws = wb.active
+    ws.append(LEDGER_HEADERS)
+    ws.append(['合计'])
+    wb.save(path)
+    return path
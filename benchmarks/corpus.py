@@ -0,0 +1,231 @@
+"""
+离线生成合成数电发票语料：文本型PDF（不同销方、千分位金额、开票人换行、跨月备注）
+加少量只有图片的扫描件（应提取失败），可选加密PDF与非发票文本PDF，以及带合计行的Excel模板
+
+输出目录结构:
+    inv_000001.pdf ...      发票PDF
+    manifest.json           {文件名: 真实字段，扫描件/加密/非发票为null}
+    template.xlsx           台账模板
+
+--bundle时改为生成一个合并了全部发票的bundle.pdf（部分发票带续页），
+manifest.json中为 {发票号码: 真实字段}
+
+用法:
+    python benchmarks/corpus.py 输出目录 [--count 1000] [--seed 0] [--scanned 0.02]
+        [--encrypted 0.0] [--non-invoice 0.0]
+    python benchmarks/corpus.py 输出目录 --bundle [--count 1000] [--multi-page 0.1]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import zlib
+
+from common import SELLERS, make_template, synthetic_invoice
+
+TO_UNICODE_CMAP = b"""/CIDInit /ProcSet findresource begin
+12 dict begin
+begincmap
+/CMapName /Adobe-Identity-UCS def
+/CMapType 2 def
+1 begincodespacerange
+<0000> <FFFF>
+endcodespacerange
+%d beginbfchar
+%s
+endbfchar
+endcmap
+CMapName currentdict /CMap defineresource pop
+end
+end"""
+
+# 非发票文本PDF（合同、对账单等）的内容
+NON_INVOICE_LINES = [
+    ['技术服务合同', '甲方：湖南新飞创不良资产处置有限公司', '乙方：鼎越数科（深圳）信息技术有限公司',
+     '第一条 服务内容', '乙方为甲方提供信息系统运维服务，服务期限十二个月。', '甲方（盖章） 乙方（盖章）'],
+    ['往来对账单', '对账期间：2026年1月至2026年3月', '期初余额 0.00', '本期发生额 125,000.00',
+     '期末余额 125,000.00', '请核对后签字盖章寄回'],
+    ['付款申请单', '申请部门：财务部', '付款事由：支付信息系统服务费', '付款金额：人民币叁万元整',
+     '审批人：', '李晓明'],
+]
+
+
+def _assemble(objects, trailer=b''):
+    """按顺序拼装PDF对象并生成交叉引用表（1号对象为Catalog），trailer为尾部字典的附加项"""
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for num, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % num + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R %s>>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, trailer, xref)
+    return bytes(out)
+
+
+def _stream(data, extra=b''):
+    return b"<< /Length %d %s>>\nstream\n" % (len(data), extra) + data + b"\nendstream"
+
+
+def text_pdf_bytes(lines):
+    """单页文本型PDF，解析器按行提取出与lines相同的文本"""
+    return bundle_pdf_bytes([lines])
+
+
+def bundle_pdf_bytes(pages, trailer=b''):
+    """
+    多页文本型PDF（pages为每页的文本行列表）：各页共用一个Type0字体
+    （Identity-H编码，码位即Unicode），ToUnicode只列出用到的字
+    """
+    chars = sorted(set(''.join(''.join(lines) for lines in pages)))
+    bfchar = b"\n".join(b"<%04X> <%04X>" % (ord(c), ord(c)) for c in chars)
+    cmap = TO_UNICODE_CMAP % (len(chars), bfchar)
+    # 1 Catalog，2 Pages，3-5 字体，之后每页一个Page对象和一个内容流
+    kids = b" ".join(b"%d 0 R" % (6 + 2 * i) for i in range(len(pages)))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(pages)),
+        b"<< /Type /Font /Subtype /Type0 /BaseFont /STSong-Light /Encoding /Identity-H"
+        b" /DescendantFonts [4 0 R] /ToUnicode 5 0 R >>",
+        b"<< /Type /Font /Subtype /CIDFontType0 /BaseFont /STSong-Light"
+        b" /CIDSystemInfo << /Registry (Adobe) /Ordering (GB1) /Supplement 4 >> >>",
+        _stream(cmap),
+    ]
+    for i, lines in enumerate(pages):
+        ops = [b"BT", b"/F1 10 Tf", b"14 TL", b"40 800 Td"]
+        for line in lines:
+            ops.append(b"<%s> Tj T*" % line.encode('utf-16-be').hex().upper().encode())
+        ops.append(b"ET")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842]"
+                       b" /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (7 + 2 * i))
+        objects.append(_stream(b"\n".join(ops)))
+    return _assemble(objects, trailer)
+
+
+def encrypted_pdf_bytes(rng, lines):
+    """尾部字典带标准安全处理器的加密PDF（口令未知，内容流实际未加密，只用于测试分拣）"""
+    o, u, file_id = (bytes(rng.getrandbits(8) for _ in range(n)).hex().encode() for n in (32, 32, 16))
+    trailer = (b"/Encrypt << /Filter /Standard /V 1 /R 2 /O <%s> /U <%s> /P -44 >>"
+               b" /ID [<%s> <%s>] " % (o, u, file_id, file_id))
+    return bundle_pdf_bytes([lines], trailer)
+
+
+def non_invoice_pdf_bytes(rng):
+    """文本型但不是发票的PDF"""
+    return text_pdf_bytes(rng.choice(NON_INVOICE_LINES))
+
+
+def continuation_page(index, total):
+    """发票续页（清单页）：不含发票号码、金额与人名"""
+    return ['销售货物或者提供应税劳务清单', f'共{total}页 第{index}页', '*信息系统服务*技术服务费 明细']
+
+
+def scanned_pdf_bytes(rng, width=200, height=280):
+    """只有一张灰度图片、没有文字的单页PDF（模拟扫描件）"""
+    pixels = bytes(rng.getrandbits(8) | 0xC0 for _ in range(width * height))
+    image = zlib.compress(pixels)
+    content = b"q 595 0 0 842 0 0 cm /Im1 Do Q"
+    return _assemble([
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842]"
+        b" /Resources << /XObject << /Im1 4 0 R >> >> /Contents 5 0 R >>",
+        _stream(image, b"/Type /XObject /Subtype /Image /Width %d /Height %d"
+                       b" /ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode "
+                       % (width, height)),
+        _stream(content),
+    ])
+
+
+def generate_bundle(out_dir, count, seed=0, multi_page=0.1, sellers=SELLERS, name='bundle.pdf'):
+    """
+    生成一个合并了count张发票的PDF（约multi_page比例的发票带一页续页），
+    以及manifest.json（{发票号码: 真实字段}）与template.xlsx，返回manifest
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    pages = []
+    manifest = {}
+    for _ in range(count):
+        lines, expected = synthetic_invoice(rng, sellers)
+        if rng.random() < multi_page:
+            pages += [lines + ['共2页 第1页'], continuation_page(2, 2)]
+        else:
+            pages.append(lines)
+        manifest[expected['invoice_no']] = expected
+    with open(os.path.join(out_dir, name), 'wb') as f:
+        f.write(bundle_pdf_bytes(pages))
+
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'seed': seed, 'count': count, 'pages': len(pages), 'files': manifest},
+                  f, ensure_ascii=False)
+    make_template(os.path.join(out_dir, 'template.xlsx'))
+    return manifest
+
+
+def generate(out_dir, count, seed=0, scanned=0.02, sellers=SELLERS, encrypted=0.0,
+             non_invoice=0.0, scan_size=(200, 280)):
+    """
+    生成count个PDF、manifest.json与template.xlsx，返回manifest
+    scanned/encrypted/non_invoice为扫描件、加密PDF、非发票PDF的比例，scan_size为扫描图片像素
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    manifest = {}
+    width = max(6, len(str(count)))
+    for i in range(1, count + 1):
+        name = f"inv_{i:0{width}d}.pdf"
+        roll = rng.random()
+        if roll < scanned:
+            data, expected = scanned_pdf_bytes(rng, *scan_size), None
+        elif roll < scanned + encrypted:
+            data, expected = encrypted_pdf_bytes(rng, synthetic_invoice(rng, sellers)[0]), None
+        elif roll < scanned + encrypted + non_invoice:
+            data, expected = non_invoice_pdf_bytes(rng), None
+        else:
+            lines, expected = synthetic_invoice(rng, sellers)
+            data = text_pdf_bytes(lines)
+        with open(os.path.join(out_dir, name), 'wb') as f:
+            f.write(data)
+        manifest[name] = expected
+
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'seed': seed, 'count': count, 'files': manifest}, f, ensure_ascii=False)
+    make_template(os.path.join(out_dir, 'template.xlsx'))
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成合成数电发票语料')
+    parser.add_argument('out_dir')
+    parser.add_argument('--count', type=int, default=1000, help='PDF数量（10~100000）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scanned', type=float, default=0.02, help='扫描件（无文字）比例')
+    parser.add_argument('--encrypted', type=float, default=0.0, help='加密PDF比例')
+    parser.add_argument('--non-invoice', type=float, default=0.0, help='非发票文本PDF比例')
+    parser.add_argument('--single-seller', action='store_true',
+                        help='只使用默认销方（内置提取配置中的销方）')
+    parser.add_argument('--bundle', action='store_true',
+                        help='生成一个合并了全部发票的PDF（bundle.pdf），而不是每张一个文件')
+    parser.add_argument('--multi-page', type=float, default=0.1,
+                        help='合并PDF中带续页的发票比例（仅--bundle）')
+    args = parser.parse_args(argv)
+
+    sellers = SELLERS[:1] if args.single_seller else SELLERS
+    if args.bundle:
+        manifest = generate_bundle(args.out_dir, args.count, args.seed, args.multi_page, sellers)
+        print(f"已生成合并PDF（{len(manifest)} 张发票）: {os.path.join(args.out_dir, 'bundle.pdf')}")
+        return 0
+    manifest = generate(args.out_dir, args.count, args.seed, args.scanned, sellers,
+                        args.encrypted, args.non_invoice)
+    rejected = sum(1 for v in manifest.values() if v is None)
+    print(f"已生成 {len(manifest)} 个PDF（扫描件/加密/非发票 {rejected}）: {args.out_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
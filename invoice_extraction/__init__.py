@@ -0,0 +1,14 @@
+"""
+数电发票信息提取工具核心包
+"""
+from .core import (
+    extract_invoice_data,
+    write_to_excel,
+    rename_pdf,
+)
+
+__all__ = [
+    'extract_invoice_data',
+    'write_to_excel',
+    'rename_pdf',
+]
@@ -0,0 +1,162 @@
+"""
+PDF文本后端
+统一接口：从二进制流中读取第一页文本与总页数，或读取指定页范围的文本（拆分合并PDF时使用）；
+具体实现按配置选择，依赖库在首次使用时导入
+- pypdf2:   PyPDF2（默认，与原有行为一致）
+- pypdf:    新版pypdf（PyPDF2的后继）
+- pdfminer: pdfminer.six，跳过版面分析，只按文本行输出
+"""
+import os
+from itertools import islice
+
+# 未指定后端时使用的默认值，可通过环境变量覆盖
+DEFAULT_BACKEND = os.environ.get('INVOICE_PDF_BACKEND', 'pypdf2')
+
+
+class PdfTextBackend:
+    """PDF文本后端基类"""
+
+    name = None
+
+    def first_page(self, stream):
+        """从二进制流中提取第一页文本，返回 (文本, 总页数)"""
+        raise NotImplementedError
+
+    def first_page_text(self, stream):
+        """从二进制流中提取第一页文本"""
+        return self.first_page(stream)[0]
+
+    def page_texts(self, stream, start, stop):
+        """提取第start到stop-1页（从0开始）的文本列表"""
+        raise NotImplementedError
+
+
+class PyPDF2Backend(PdfTextBackend):
+    """
+    PyPDF2后端
+    PdfReader只读取交叉引用表，对象按需解析，因此只有第一页的内容流会被解析
+    """
+
+    name = 'pypdf2'
+
+    def __init__(self):
+        import PyPDF2
+        self.module = PyPDF2
+
+    def first_page(self, stream):
+        reader = self.module.PdfReader(stream)
+        return reader.pages[0].extract_text(), len(reader.pages)
+
+    def page_texts(self, stream, start, stop):
+        reader = self.module.PdfReader(stream)
+        return [reader.pages[i].extract_text() for i in range(start, min(stop, len(reader.pages)))]
+
+
+class PypdfBackend(PyPDF2Backend):
+    """新版pypdf后端（PyPDF2的后继，接口相同）"""
+
+    name = 'pypdf'
+
+    def __init__(self):
+        import pypdf
+        self.module = pypdf
+
+
+class PdfminerBackend(PdfTextBackend):
+    """
+    pdfminer.six后端
+    不构建LTChar/版面对象，直接按文本矩阵的纵坐标变化断行，
+    只解释第一页的内容流
+    """
+
+    name = 'pdfminer'
+
+    def __init__(self):
+        import logging
+        from pdfminer.pdfdevice import PDFTextDevice
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdffont import PDFUnicodeNotDefined
+        from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+        from pdfminer.pdfpage import PDFPage
+        from pdfminer.pdfparser import PDFParser
+        from pdfminer.pdftypes import resolve1
+
+        class LineTextDevice(PDFTextDevice):
+            """只收集文字，纵坐标变化时换行"""
+
+            def __init__(self, rsrcmgr):
+                super().__init__(rsrcmgr)
+                self.parts = []
+                self.last_y = None
+
+            def render_string(self, textstate, seq, ncs, graphicstate):
+                font = textstate.font
+                if font is None:
+                    return
+                y = textstate.matrix[5]
+                if self.last_y is not None and y != self.last_y:
+                    self.parts.append('\n')
+                self.last_y = y
+                for obj in seq:
+                    if not isinstance(obj, bytes):
+                        continue
+                    for cid in font.decode(obj):
+                        try:
+                            self.parts.append(font.to_unichr(cid))
+                        except PDFUnicodeNotDefined:
+                            pass
+
+            def get_text(self):
+                return ''.join(self.parts)
+
+        # pdfminer对缺少FontBBox等常见情况逐文件输出警告，批量处理时只保留错误
+        logging.getLogger('pdfminer').setLevel(logging.ERROR)
+
+        self.device_class = LineTextDevice
+        self.resource_manager_class = PDFResourceManager
+        self.interpreter_class = PDFPageInterpreter
+        self.page_class = PDFPage
+        self.document_class = PDFDocument
+        self.parser_class = PDFParser
+        self.resolve = resolve1
+
+    def _page_text(self, rsrcmgr, page):
+        device = self.device_class(rsrcmgr)
+        self.interpreter_class(rsrcmgr, device).process_page(page)
+        return device.get_text()
+
+    def first_page(self, stream):
+        doc = self.document_class(self.parser_class(stream))
+        rsrcmgr = self.resource_manager_class(caching=True)
+        text = ''
+        for page in self.page_class.create_pages(doc):
+            text = self._page_text(rsrcmgr, page)
+            break
+        count = self.resolve(self.resolve(doc.catalog['Pages']).get('Count', 1))
+        return text, count
+
+    def page_texts(self, stream, start, stop):
+        doc = self.document_class(self.parser_class(stream))
+        rsrcmgr = self.resource_manager_class(caching=True)
+        pages = islice(self.page_class.create_pages(doc), start, stop)
+        return [self._page_text(rsrcmgr, page) for page in pages]
+
+
+BACKENDS = {
+    PyPDF2Backend.name: PyPDF2Backend,
+    PypdfBackend.name: PypdfBackend,
+    PdfminerBackend.name: PdfminerBackend,
+}
+
+_instances = {}
+
+
+def get_backend(name=None):
+    """按名称返回后端实例（每个进程只创建一次）"""
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"未知的PDF后端: {name}（可选: {', '.join(BACKENDS)}）")
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
+
@@ -0,0 +1,182 @@
+"""
+合并PDF拆分
+财务常收到一个PDF里合并了几百张发票（每页一张，或一张发票跨多页）：
+- 读取全部页文本，按数电发票号码把连续页分组，每组为一张发票
+- 页范围分块交给进程池并行提取；各进程自行内存映射同一文件，文档不按页复制
+- 每张发票另存为单独的PDF，之后的入账、重命名与普通文件相同
+"""
+import io
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .backends import get_backend
+from .core import _no_log
+from .fields import find_invoice_no
+from .metrics import METRICS
+
+# 拆分出的发票默认保存在合并PDF旁的"<文件名>_拆分"目录中
+SPLIT_DIR_SUFFIX = '_拆分'
+
+
+def read_page_texts(pdf_path, start, stop, backend=None):
+    """读取第start到stop-1页（从0开始）的文本；内存映射打开，同一文件的各进程共享页缓存"""
+    with METRICS.timer('open'):
+        with open(pdf_path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        with METRICS.timer('parse'):
+            return get_backend(backend).page_texts(data, start, stop)
+    finally:
+        data.close()
+
+
+def _read_pages_task(task):
+    """进程池任务：(pdf路径, 起始页, 结束页, 后端, 是否计时) -> (文本列表, 计时样本)"""
+    pdf_path, start, stop, backend, collect = task
+    if collect:
+        METRICS.enable()
+    texts = read_page_texts(pdf_path, start, stop, backend)
+    return texts, METRICS.drain() if collect else None
+
+
+def read_all_pages(pdf_path, page_count, backend=None, workers=1, chunksize=None):
+    """
+    按页序返回全部页文本
+    workers > 1时每chunksize页一个任务并行读取，每个任务只解析一次交叉引用表
+    """
+    if workers == 1 or not chunksize:
+        chunksize = page_count
+    ranges = [(start, min(start + chunksize, page_count)) for start in range(0, page_count, chunksize)]
+    if workers == 1 or len(ranges) == 1:
+        texts = []
+        for start, stop in ranges:
+            texts.extend(read_page_texts(pdf_path, start, stop, backend))
+        return texts
+
+    collect = METRICS.enabled
+    tasks = [(pdf_path, start, stop, backend, collect) for start, stop in ranges]
+    texts = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+        for page_texts, metrics in executor.map(_read_pages_task, tasks):
+            if metrics:
+                METRICS.merge(metrics)
+            texts.extend(page_texts)
+    return texts
+
+
+def group_pages(texts):
+    """
+    按数电发票号码把连续页分组，返回 [(起始页, 结束页)]（结束页不含）
+    号码与当前组不同的页开始新的一组；没有号码或号码相同的页（续页）并入当前组
+    """
+    groups = []
+    current = ''
+    for i, text in enumerate(texts):
+        invoice_no = find_invoice_no(text)
+        if not groups or (invoice_no and current and invoice_no != current):
+            groups.append([i, i + 1])
+            current = invoice_no
+        else:
+            groups[-1][1] = i + 1
+            current = current or invoice_no
+    return [tuple(g) for g in groups]
+
+
+def split_output_dir(pdf_path):
+    return os.path.splitext(pdf_path)[0] + SPLIT_DIR_SUFFIX
+
+
+def page_label(start, stop):
+    """(0, 1) -> '第1页'，(2, 4) -> '第3-4页'"""
+    if stop - start == 1:
+        return f"第{start + 1}页"
+    return f"第{start + 1}-{stop}页"
+
+
+def _write_new(path, data):
+    """
+    把data写入path，不覆盖已有文件：已有同名文件内容相同时直接使用（重复运行），
+    不同时改用"<文件名>_2.pdf"等未占用的名称；返回实际路径
+    """
+    stem, ext = os.path.splitext(path)
+    n = 1
+    while True:
+        try:
+            with open(path, 'xb') as f:
+                f.write(data)
+            return path
+        except FileExistsError:
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    return path
+        n += 1
+        path = f"{stem}_{n}{ext}"
+
+
+def split_pdf(pdf_path, ranges, out_dir=None):
+    """把每个页范围另存为一个PDF（默认保存到split_output_dir），返回新文件路径列表"""
+    from PyPDF2 import PdfReader, PdfWriter
+
+    out_dir = out_dir or split_output_dir(pdf_path)
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    reader = PdfReader(pdf_path)
+    paths = []
+    for start, stop in ranges:
+        writer = PdfWriter()
+        for i in range(start, stop):
+            writer.add_page(reader.pages[i])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        paths.append(_write_new(os.path.join(out_dir, f"{stem}_{page_label(start, stop)}.pdf"),
+                                buffer.getvalue()))
+    return paths
+
+
+def _split_task(task):
+    pdf_path, ranges, out_dir = task
+    return split_pdf(pdf_path, ranges, out_dir)
+
+
+def _split_bundle(pdf_path, ranges, out_dir, workers):
+    """拆分一个合并PDF；workers > 1时页范围分块由进程池并行写出"""
+    if workers == 1 or len(ranges) < 2:
+        return split_pdf(pdf_path, ranges, out_dir)
+    size = max(1, len(ranges) // (workers * 4))
+    tasks = [(pdf_path, ranges[i:i + size], out_dir) for i in range(0, len(ranges), size)]
+    paths = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+        for chunk in executor.map(_split_task, tasks):
+            paths.extend(chunk)
+    return paths
+
+
+def split_records(records, out_dir=None, log=_no_log, workers=1):
+    """
+    把拆分出的发票（提取结果中带page_range且提取成功的）另存为单独的PDF：
+    结果的pdf_path改为新文件，source记录原合并PDF；拆分失败的结果标记为失败
+    返回新文件数
+    """
+    bundles = {}
+    for record in records:
+        if record.get('page_range') and record['data']:
+            bundles.setdefault(record['pdf_path'], []).append(record)
+
+    written = 0
+    for pdf_path, items in bundles.items():
+        with METRICS.timer('split'):
+            try:
+                paths = _split_bundle(pdf_path, [r['page_range'] for r in items], out_dir, workers)
+            except Exception as e:
+                for record in items:
+                    record['data'] = None
+                    record['error'] = f"{page_label(*record['page_range'])}: 拆分失败 {e}"
+                    record['error_type'] = type(e).__name__
+                continue
+        for record, path in zip(items, paths):
+            record['source'] = pdf_path
+            record['pdf_path'] = path
+        written += len(paths)
+        log(f"  已拆分 {os.path.basename(pdf_path)}: {len(paths)} 张发票 -> {os.path.dirname(paths[0])}")
+    return written
@@ -0,0 +1,206 @@
+"""
+提取结果缓存
+以PDF内容哈希（加提取器版本号与提取配置指纹）为键，把提取结果保存在SQLite中，
+重复运行时跳过已解析过的文件；重命名不影响命中
+多个进程可共用同一缓存：每次写入都是一个短事务，数据库被占用时按未命中/不写入处理，不会中断提取
+"""
+import hashlib
+import json
+import os
+import platform
+import sqlite3
+import time
+
+from .backends import DEFAULT_BACKEND
+from .core import EXTRACTOR_VERSION
+from .profiles import get_profile
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+# 等待其他进程释放写锁的秒数，超时即放弃本次读写
+BUSY_TIMEOUT = 0.5
+# 命中后的last_used更新累积多少条随下一次写入（或关闭时）一并提交
+TOUCH_BATCH = 200
+
+
+def default_cache_dir():
+    """按平台习惯返回用户缓存目录"""
+    system = platform.system()
+    if system == 'Windows':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+    elif system == 'Darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'invoice_extraction')
+
+
+def file_digest(pdf_path):
+    """计算文件内容的SHA-256"""
+    h = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """
+    基于SQLite的提取结果缓存，总大小超过max_bytes时按最近最少使用淘汰
+    同一实例只能在创建它的线程中使用
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        if path is None:
+            path = os.path.join(default_cache_dir(), 'extract_cache.sqlite3')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+        # 命中的条目 {键: 时间}，批量更新last_used
+        self.touched = {}
+
+        # isolation_level=None：不隐式开启事务，写入处显式BEGIN/COMMIT，不长时间持有写锁
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.total_bytes = 0
+        try:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                ' key TEXT PRIMARY KEY,'
+                ' data TEXT NOT NULL,'
+                ' size INTEGER NOT NULL,'
+                ' last_used REAL NOT NULL)'
+            )
+            # (last_used, size)同时覆盖淘汰顺序与总大小的统计，SUM(size)只扫描索引
+            self.conn.execute('DROP INDEX IF EXISTS idx_last_used')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_lru ON entries(last_used, size)')
+            self.total_bytes = self._total()
+        except sqlite3.OperationalError:
+            # 其他进程（如同时启动的作业进程）正占用缓存：照常提取，读写失败按未命中处理
+            self.errors += 1
+
+    def _total(self):
+        return self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def _key(self, digest, backend):
+        profile = get_profile().fingerprint
+        return f"v{EXTRACTOR_VERSION}:{backend or DEFAULT_BACKEND}:{profile}:{digest}"
+
+    def key_for(self, pdf_path, backend=None):
+        """生成缓存键：提取器版本 + 文本后端 + 提取配置指纹 + 内容哈希"""
+        return self._key(file_digest(pdf_path), backend)
+
+    def key_for_digest(self, digest, backend=None):
+        """由file_digest的结果生成缓存键（与key_for结果相同）"""
+        return self._key(digest, backend)
+
+    def key_for_bytes(self, data, backend=None):
+        """由已载入内存的PDF内容生成缓存键（与key_for结果相同）"""
+        return self._key(hashlib.sha256(data).hexdigest(), backend)
+
+    def get(self, key):
+        """查询缓存，命中返回字段字典，否则（含数据库被占用）返回None"""
+        try:
+            row = self.conn.execute('SELECT data FROM entries WHERE key = ?', (key,)).fetchone()
+        except sqlite3.OperationalError:
+            self.errors += 1
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.touched[key] = time.time()
+        if len(self.touched) >= TOUCH_BATCH:
+            self._write(lambda: None)
+        return json.loads(row[0])
+
+    def _write(self, action):
+        """
+        在一个短事务中提交累积的last_used更新并执行action()；数据库被占用时放弃，返回是否成功
+        action()抛出其他异常时同样回滚，再向上抛出，连接上不会残留未结束的事务
+        """
+        try:
+            self.conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError:
+            self.errors += 1
+            return False
+        try:
+            if self.touched:
+                self.conn.executemany('UPDATE entries SET last_used = ? WHERE key = ?',
+                                      [(t, key) for key, t in self.touched.items()])
+            action()
+            self.conn.execute('COMMIT')
+        except Exception as e:
+            self.conn.execute('ROLLBACK')
+            if not isinstance(e, sqlite3.OperationalError):
+                raise
+            self.errors += 1
+            return False
+        self.touched.clear()
+        return True
+
+    def put(self, key, data):
+        """写入缓存，必要时淘汰最久未使用的条目；数据库被其他进程占用时跳过本次写入"""
+        payload = json.dumps(data, ensure_ascii=False)
+        size = len(payload.encode('utf-8')) + len(key)
+        total = self.total_bytes
+
+        def insert():
+            nonlocal total
+            self.conn.execute(
+                'INSERT OR REPLACE INTO entries (key, data, size, last_used) VALUES (?, ?, ?, ?)',
+                (key, payload, size, time.time())
+            )
+            # 在事务内重新统计：其他进程的写入与淘汰也计算在内
+            total = self._total()
+            if total > self.max_bytes:
+                total = self.evict(total)
+
+        if self._write(insert):
+            self.total_bytes = total
+
+    def evict(self, total):
+        """按last_used从旧到新删除，直到总大小降到上限的90%，返回删除后的总大小（在put的事务中调用）"""
+        target = self.max_bytes * 0.9
+        # 逐行读取最旧的条目，够数即停，不把全部键载入内存
+        cursor = self.conn.execute('SELECT key, size FROM entries ORDER BY last_used')
+        doomed = []
+        for key, size in cursor:
+            if total <= target:
+                break
+            doomed.append((key,))
+            total -= size
+        cursor.close()
+        self.conn.executemany('DELETE FROM entries WHERE key = ?', doomed)
+        self.evictions += len(doomed)
+        return total
+
+    def stats(self):
+        """返回命中/未命中/淘汰计数及当前大小"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'bytes': self.total_bytes,
+            'errors': self.errors,
+        }
+
+    def close(self):
+        if self.touched:
+            self._write(lambda: None)
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
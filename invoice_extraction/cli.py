@@ -0,0 +1,656 @@
+"""
+命令行批处理入口（无需图形界面，适合服务器/cron使用）
+
+用法:
+    python -m invoice_extraction 发票目录/ "2026-*/*.pdf" -t 模板.xlsx -o 输出.xlsx
+    python -m invoice_extraction 发票目录/ --ledger 总台账.xlsx [-t 模板.xlsx]   # 追加到总台账
+    python -m invoice_extraction 投递目录/ --watch --ledger 总台账.xlsx         # 持续监视并入账
+    python -m invoice_extraction 发票目录/ --ledger 总台账.xlsx --jobs 作业库.sqlite3  # 可续跑、可多进程/多机
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from .backends import BACKENDS, DEFAULT_BACKEND
+from .bundle import SPLIT_DIR_SUFFIX, split_records
+from .cache import ExtractionCache, DEFAULT_MAX_BYTES
+from .einvoice import is_structured
+from .jobs import (
+    DEFAULT_CLAIM_SIZE, DEFAULT_LEASE, EXTRACTED, FAILED, LEASED, PENDING, RENAMED, WRITTEN,
+    JobStore, extract_jobs, merge_results, print_status, rename_written, resume_pending_renames,
+    worker_id,
+)
+from .ledger import append_to_ledger
+from .rename import batch_rename
+from .store import InvoiceStore, from_cents
+from .watch import WatchDaemon, DEFAULT_BATCH_SIZE, DEFAULT_BATCH_WAIT, DEFAULT_SETTLE
+from .parallel import iter_extract, resolve_workers
+from .pipeline import Pipeline, DEFAULT_QUEUE_SIZE, DEFAULT_READ_WORKERS
+from .pipeline import DEFAULT_BATCH_SIZE as PIPELINE_BATCH_SIZE
+from .metrics import METRICS, profiling
+from .profiles import use_profile
+from .prefetch import INPUT_MODES, IOStats
+from .triage import KIND_LABELS, TEXT, TriageStats
+
+# 退出码
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_PARTIAL = 3
+
+
+def _has_pdf(path, matches):
+    """XML/OFD旁是否有同名PDF（有时由PDF带出，不单独作为输入）"""
+    stem = os.path.splitext(path)[0]
+    return any(stem + ext in matches or os.path.isfile(stem + ext) for ext in ('.pdf', '.PDF'))
+
+
+def _in_split_dir(path):
+    """是否位于合并PDF的拆分目录（"<文件名>_拆分"）中"""
+    return any(part.endswith(SPLIT_DIR_SUFFIX) for part in os.path.dirname(path).split(os.sep))
+
+
+def iter_pdf_files(inputs, recursive=False, structured=True):
+    """
+    将目录、通配符和文件路径逐项展开为PDF文件（去重并保持顺序），边扫描边产出
+    structured为True时没有同名PDF的数电发票XML/OFD也作为输入
+    展开目录和通配符时跳过拆分目录：其中的发票在拆分时已提取，重新运行不再重复入账
+    """
+    seen = set()
+
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, '**', '*') if recursive else os.path.join(item, '*')
+            matches = [path for path in glob.glob(pattern, recursive=recursive)
+                       if not _in_split_dir(os.path.relpath(path, item))]
+        elif glob.has_magic(item):
+            matches = glob.glob(item, recursive=True)
+            if SPLIT_DIR_SUFFIX not in item:  # 明确指定拆分目录的通配符照常展开
+                matches = [path for path in matches if not _in_split_dir(path)]
+        else:
+            matches = [item]
+
+        names = set(matches)
+        for path in sorted(matches):
+            if path.lower().endswith('.pdf'):
+                pass
+            elif not (structured and is_structured(path)) or _has_pdf(path, names):
+                continue
+            if os.path.isfile(path):
+                key = os.path.abspath(path)
+                if key not in seen:
+                    seen.add(key)
+                    yield path
+
+
+def collect_pdf_files(inputs, recursive=False, structured=True):
+    """
+    将目录、通配符和文件路径展开为PDF文件列表（去重并保持顺序）
+    """
+    return list(iter_pdf_files(inputs, recursive, structured))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='invoice_extraction',
+        description='数电发票信息提取：提取PDF发票字段，写入Excel模板并重命名PDF'
+    )
+    parser.add_argument('inputs', nargs='+', help='PDF文件、目录或通配符')
+    parser.add_argument('-t', '--template', help='Excel模板路径（含合计行）')
+    parser.add_argument('-o', '--output', help='输出Excel路径（默认：模板名_已填写.xlsx）')
+    # 追加总台账只改写工作表XML（不能改写时才完整写出，且总是流式写入），--stream-excel对台账无意义
+    destination = parser.add_mutually_exclusive_group()
+    destination.add_argument('--ledger',
+                             help='追加到总台账（按数电发票号码去重，序号接续；台账不存在时由模板创建）')
+    parser.add_argument('-r', '--recursive', action='store_true', help='递归扫描子目录')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='并行提取进程数（默认1为串行，0为全部CPU核心）')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='每次分发给子进程的文件数（默认自动）')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help=f'PDF文本后端（默认{DEFAULT_BACKEND}，可用环境变量INVOICE_PDF_BACKEND设置）')
+    parser.add_argument('--input', choices=INPUT_MODES, default='stream',
+                        help='PDF读取方式：stream直接打开 / read整文件读入内存 / mmap内存映射')
+    parser.add_argument('--prefetch', type=int, default=4,
+                        help='串行提取时后台预读的文件数（仅read/mmap方式）')
+    parser.add_argument('--io-stats', action='store_true',
+                        help='统计读取字节数、系统调用与I/O等待/CPU时间')
+    parser.add_argument('--extract-profile',
+                        help='提取配置JSON（购方/销方、往来单位登记表、货物名称规则；'
+                             '默认取环境变量INVOICE_PROFILE，否则用内置配置）')
+    parser.add_argument('--no-cache', action='store_true', help='不使用提取结果缓存')
+    parser.add_argument('--cache-path', help='缓存数据库路径（默认在用户缓存目录）')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help='缓存上限（MB），超出后淘汰最久未使用的条目')
+    parser.add_argument('--no-split', action='store_true',
+                        help='不拆分多页PDF（默认合并了多张发票的PDF按发票拆分，每张一行、一个文件）')
+    parser.add_argument('--split-dir',
+                        help='拆分出的发票PDF保存目录（默认在合并PDF旁的"<文件名>_拆分"目录）')
+    parser.add_argument('--no-triage', action='store_true',
+                        help='不做解析前分拣（默认扫描件、加密文件、非发票不进入解析）')
+    parser.add_argument('--triage-report',
+                        help='把分拣时跳过的文件（路径、类别、原因）写入CSV')
+    parser.add_argument('--pdf-only', action='store_true',
+                        help='始终解析PDF，不使用同名的数电发票XML/OFD，也不处理单独的XML/OFD')
+    destination.add_argument('--stream-excel', action='store_true',
+                             help='流式写入Excel（不调用insert_rows，内存占用不随行数增长；'
+                                  '不能与--ledger同用，追加台账本就不逐行读入已有内容）')
+    parser.add_argument('--async-pipeline', action='store_true',
+                        help='异步分阶段流水线：读取、解析、写入台账与重命名同时进行，'
+                             '阶段之间用有界队列反压，内存不随文件数增长')
+    parser.add_argument('--read-workers', type=int, default=DEFAULT_READ_WORKERS,
+                        help=f'流水线同时读取的文件数（默认{DEFAULT_READ_WORKERS}）')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f'流水线各阶段之间的队列长度（默认{DEFAULT_QUEUE_SIZE}）')
+    parser.add_argument('--jobs',
+                        help='作业库路径（SQLite）：记录每个文件的状态，中断后重新运行同一命令从中断处继续；'
+                             '多个进程或共享目录上的多台机器可同时运行，最后完成的一个写入台账并重命名')
+    parser.add_argument('--lease', type=float, default=DEFAULT_LEASE,
+                        help=f'作业模式领取文件的租约秒数，进程崩溃后到期由其他进程重新领取（默认{DEFAULT_LEASE:.0f}）')
+    parser.add_argument('--claim-size', type=int, default=DEFAULT_CLAIM_SIZE,
+                        help=f'作业模式每次领取的文件数（默认{DEFAULT_CLAIM_SIZE}）')
+    parser.add_argument('--no-rename', action='store_true', help='不重命名PDF文件')
+    parser.add_argument('--rename-workers', type=int, default=1,
+                        help='并行改名线程数（网络共享上可调大）')
+    parser.add_argument('--rename-journal',
+                        help='重命名日志路径（默认在用户缓存目录），可用于回滚/继续')
+    parser.add_argument('--csv', help='同时把提取结果导出为CSV')
+    parser.add_argument('--check', action='store_true',
+                        help='整批校验（金额+税额=价税合计、税率、重复号码）并按销方/月份小计')
+    parser.add_argument('--watch', action='store_true',
+                        help='持续监视目录，新PDF写完后按小批次追加到--ledger指定的总台账')
+    parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE,
+                        help=f'文件大小/修改时间保持不变多少秒视为写完（默认{DEFAULT_SETTLE}）')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help=f'每批最多入账的文件数（监视模式默认{DEFAULT_BATCH_SIZE}，'
+                             f'流水线默认{PIPELINE_BATCH_SIZE}）')
+    parser.add_argument('--batch-wait', type=float, default=DEFAULT_BATCH_WAIT,
+                        help=f'监视模式不满一批时最多等待的秒数（默认{DEFAULT_BATCH_WAIT}）')
+    parser.add_argument('--poll', action='store_true', help='监视模式强制使用定时扫描（不用inotify）')
+    parser.add_argument('--stats-interval', type=float, default=60.0,
+                        help='监视模式输出队列深度/延迟/吞吐量统计的间隔秒数')
+    parser.add_argument('--metrics',
+                        help='记录各阶段耗时分布（p50/p95/p99）、次数与字节数并导出；'
+                             '.prom/.txt为Prometheus文本格式，其余为JSON')
+    parser.add_argument('--profile', help='用cProfile剖析本次运行，保存pstats文件')
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help='用tracemalloc记录峰值内存与分配最多的代码行（写入--metrics的JSON）')
+    parser.add_argument('-q', '--quiet', action='store_true', help='只输出汇总信息')
+    return parser
+
+
+def print_summary(stats, stage_times, total_elapsed, cache=None, io_stats=None,
+                  triage_stats=None, out=sys.stdout):
+    """输出吞吐量汇总"""
+    total = stats['files']
+    rate = total / total_elapsed if total_elapsed > 0 else 0.0
+    print("=" * 50, file=out)
+    print(f"文件数: {total}  成功: {stats['extracted']}  失败: {stats['failed']}"
+          f"  重命名失败: {stats['rename_failed']}", file=out)
+    if stats.get('structured'):
+        print(f"由XML/OFD读取（未解析PDF）: {stats['structured']}", file=out)
+    if stats.get('rejected'):
+        print(f"分拣跳过（未解析或不是发票）: {stats['rejected']}", file=out)
+    if stats.get('split'):
+        invoice_rate = stats['extracted'] / total_elapsed if total_elapsed > 0 else 0.0
+        print(f"合并PDF拆分出的发票: {stats['split']}  （{invoice_rate:.1f} 张/秒）", file=out)
+    if stats.get('duplicates'):
+        print(f"重复发票（已在台账中，未写入）: {stats['duplicates']}", file=out)
+    print(f"总耗时: {total_elapsed:.3f}s  吞吐量: {rate:.1f} 文件/秒", file=out)
+    for stage, elapsed in stage_times.items():
+        per_file = elapsed / total * 1000 if total else 0.0
+        print(f"  {stage:<8} {elapsed:8.3f}s  ({per_file:.2f} ms/文件)", file=out)
+    if cache is not None:
+        cs = cache.stats()
+        print(f"缓存: 命中 {cs['hits']}  未命中 {cs['misses']}  淘汰 {cs['evictions']}"
+              f"  大小 {cs['bytes'] / 1024:.0f}KB", file=out)
+        if cs['errors']:
+            print(f"  缓存被其他进程占用，跳过读写 {cs['errors']} 次", file=out)
+    if io_stats is not None and io_stats.files:
+        io = io_stats.summary()
+        print(f"读取: {io['bytes_read'] / 1024 / 1024:.1f}MB  read调用 {io['read_syscalls']}"
+              f"  解析器读请求 {io['parser_reads']}  节省 {io['syscalls_saved']}", file=out)
+        print(f"  I/O等待 {io['io_wait_ms_per_file']:.2f} ms/文件"
+              f"  解析CPU {io['cpu_ms_per_file']:.2f} ms/文件", file=out)
+    if triage_stats is not None:
+        ts = triage_stats.summary()
+        counts = '  '.join(f"{KIND_LABELS[kind]} {n}" for kind, n in ts['counts'].items()
+                           if n and kind != TEXT)
+        print(f"分拣: {counts or '全部为文本型'}  分拣 {ts['triage_ms_per_file']:.3f} ms/文件"
+              f"  解析 {ts['parse_ms_per_file']:.2f} ms/文件", file=out)
+        if ts['skipped_parse']:
+            print(f"  免解析 {ts['skipped_parse']}（抽样 {ts['probed']}，"
+                  f"{ts['skipped_parse_ms_per_file']:.2f} ms/文件）  约节省 {ts['saved_s']:.3f}s",
+                  file=out)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    def log(message):
+        if not args.quiet:
+            print(message, file=sys.stderr)
+
+    if args.template is None and args.ledger is None:
+        print("错误: 需要指定Excel模板（-t）或总台账（--ledger）", file=sys.stderr)
+        return EXIT_FAILED
+    if args.template is not None and not os.path.isfile(args.template):
+        print(f"错误: 找不到Excel模板 {args.template}", file=sys.stderr)
+        return EXIT_FAILED
+    if args.ledger is not None and args.template is None and not os.path.isfile(args.ledger):
+        print(f"错误: 总台账不存在，需用-t指定模板创建 {args.ledger}", file=sys.stderr)
+        return EXIT_FAILED
+
+    if args.watch and (args.ledger is None or len(args.inputs) != 1
+                       or not os.path.isdir(args.inputs[0])):
+        print("错误: 监视模式需要一个目录和--ledger", file=sys.stderr)
+        return EXIT_FAILED
+
+    if args.extract_profile:
+        try:
+            profile = use_profile(args.extract_profile)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"错误: 无法加载提取配置 {args.extract_profile}: {e}", file=sys.stderr)
+            return EXIT_FAILED
+        log(f"提取配置: {profile.name or args.extract_profile}（登记往来单位 {len(profile.registry)} 家）")
+
+    cache = None
+    if not args.no_cache:
+        cache = ExtractionCache(args.cache_path, max_bytes=args.cache_size * 1024 * 1024)
+    if args.metrics:
+        METRICS.enable()
+    try:
+        with profiling(args.profile, args.tracemalloc) as report:
+            if args.watch:
+                code = run_watch(args, log, cache)
+            elif args.jobs:
+                code = run_jobs(args, log, cache)
+            elif args.async_pipeline:
+                code = run_async(args, log, cache)
+            else:
+                code = run(args, log, cache)
+        if args.tracemalloc:
+            tm = report['tracemalloc']
+            print(f"内存: 当前 {tm['current_mb']:.1f}MB  峰值 {tm['peak_mb']:.1f}MB", file=sys.stderr)
+        if args.metrics:
+            METRICS.export(args.metrics, extra=report)
+            log(f"阶段统计已导出: {args.metrics}")
+        if args.profile:
+            log(f"剖析结果已保存: {args.profile}（python -m pstats {args.profile}）")
+        return code
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def print_check(store, out=sys.stdout):
+    """输出整批校验结果与按销方/月份小计"""
+    issues = store.validate()
+    print(f"校验: 合计不符 {len(issues['totals'])}  税率不符 {len(issues['tax_rates'])}"
+          f"  重复号码 {len(issues['duplicates'])}  缺少日期 {len(issues['dates'])}"
+          f"  号码无效 {len(issues['invoice_nos'])}", file=out)
+    for invoice_no, rows in issues['duplicates'].items():
+        print(f"  重复 {invoice_no}: {len(rows)}张", file=out)
+    for row in issues['invoice_nos']:
+        print(f"  号码无效 第{row + 1}张: {store.invoice_no_at(row)}", file=out)
+    for title, groups in (('销方', store.subtotal_by_seller()), ('月份', store.subtotal_by_month())):
+        print(f"按{title}小计:", file=out)
+        for key, (count, amount, tax, total) in groups.items():
+            print(f"  {key or '-'}  {count}张  金额 {from_cents(amount)}  税额 {from_cents(tax)}"
+                  f"  价税合计 {from_cents(total)}", file=out)
+
+
+def print_watch_stats(summary, out=sys.stderr):
+    print(f"[统计] 待入账 {summary['queue_depth']}  未写完 {summary['waiting']}"
+          f"  已入账 {summary['ingested']}  重复 {summary['duplicates']}  失败 {summary['failed']}"
+          f"  延迟 平均{summary['lag_avg_s']:.1f}s/最大{summary['lag_max_s']:.1f}s"
+          f"  吞吐 {summary['throughput_per_min']:.1f} 张/分钟", file=out)
+
+
+def run_watch(args, log, cache):
+    """监视模式：持续运行直到Ctrl+C"""
+    daemon = WatchDaemon(
+        args.inputs[0], args.ledger, template=args.template, cache=cache,
+        rename=not args.no_rename, settle=args.settle,
+        batch_size=args.batch_size or DEFAULT_BATCH_SIZE,
+        batch_wait=args.batch_wait, polling=args.poll, log=log
+    )
+    mode = '定时扫描' if daemon.watcher.polling else 'inotify'
+    print(f"正在监视 {args.inputs[0]}（{mode}），按Ctrl+C退出", file=sys.stderr)
+    try:
+        daemon.run(stats_interval=args.stats_interval, stats_callback=print_watch_stats)
+    finally:
+        daemon.close()
+    # 退出时台账仍不可写，有文件未入账
+    return EXIT_PARTIAL if daemon.queue else EXIT_OK
+
+
+def write_results(args, extracted, log):
+    """把 [(pdf路径, 发票数据)] 追加到台账或写出新Excel，返回 (输出路径, 重复条数)"""
+    if args.ledger:
+        result = append_to_ledger(args.ledger, extracted, template=args.template, log=log)
+        return result['output'], len(result['duplicates'])
+    # Excel写入模块依赖openpyxl（导入较慢），用到时才导入
+    if args.stream_excel:
+        from .excel_stream import write_to_excel_streaming as writer
+    else:
+        from .core import write_to_excel as writer
+    output_excel = writer(
+        args.template,
+        [data for _, data in extracted],
+        output_path=args.output,
+        log=log
+    )
+    return output_excel, 0
+
+
+class BatchRun:
+    """一次批处理的计数、分阶段计时与汇总输出（run、run_async、run_jobs共用）"""
+
+    def __init__(self, args, log, cache):
+        self.args = args
+        self.log = log
+        self.cache = cache
+        self.start = time.perf_counter()
+        self.stage_times = {}
+        self.stats = {'files': 0, 'extracted': 0, 'failed': 0, 'rename_failed': 0,
+                      'duplicates': 0, 'split': 0, 'rejected': 0, 'structured': 0}
+        self.io_stats = IOStats() if args.io_stats else None
+        self.triage_stats = None if args.no_triage else TriageStats()
+
+    @contextmanager
+    def stage(self, name):
+        """记录一个阶段的耗时"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_times[name] = time.perf_counter() - t0
+
+    def add(self, record):
+        """统计一条提取结果（拆分出的发票按source计数），返回是否提取到数据"""
+        stats = self.stats
+        if self.io_stats is not None and record['io']:
+            self.io_stats.add(record['io'])
+        if self.triage_stats is not None:
+            self.triage_stats.add(record)
+        if record['data']:
+            stats['extracted'] += 1
+            if record.get('structured'):
+                stats['structured'] += 1
+            if record.get('source'):
+                stats['split'] += 1
+            return True
+        if record['error_type'] == 'Rejected':
+            stats['rejected'] += 1
+            self.log(f"  - 跳过 {record['pdf_path']}: {record['error']}")
+        else:
+            stats['failed'] += 1
+            self.log(f"  ✗ 提取失败 {record['pdf_path']}: {record['error']}")
+        return False
+
+    def on_file(self, extracted=None):
+        """返回按文件统计提取结果的回调 on_file(pdf路径, 结果列表)；extracted不为None时收集发票数据"""
+
+        def on_file(pdf_path, records):
+            for record in records:
+                if self.add(record) and extracted is not None:
+                    extracted.append(record['data'])
+
+        return on_file
+
+    def renamed(self, pdf_path, new_path, error):
+        if error:
+            self.stats['rename_failed'] += 1  # 具体错误已由batch_rename记录
+        else:
+            self.log(f"  ✓ {os.path.basename(new_path)}")
+
+    def write_triage_report(self):
+        if self.args.triage_report and self.triage_stats is not None:
+            self.triage_stats.write_report(self.args.triage_report)
+            self.log(f"分拣报告已保存: {self.args.triage_report}")
+
+    def export(self, records):
+        """按--csv/--check导出并校验发票数据"""
+        if not (self.args.csv or self.args.check):
+            return
+        store = InvoiceStore(records)
+        if self.args.csv:
+            store.to_csv(self.args.csv)
+            self.log(f"CSV已保存: {self.args.csv}")
+        if self.args.check:
+            print_check(store)
+
+    def summary(self, stage_times=None):
+        print_summary(self.stats, self.stage_times if stage_times is None else stage_times,
+                      time.perf_counter() - self.start, self.cache, self.io_stats,
+                      self.triage_stats)
+
+    def exit_code(self):
+        # 跳过的文件没有入账，同样需要人工处理
+        stats = self.stats
+        if stats['failed'] or stats['rejected'] or stats['rename_failed']:
+            return EXIT_PARTIAL
+        return EXIT_OK
+
+
+def run(args, log, cache):
+    """执行一次批处理，返回退出码"""
+    batch = BatchRun(args, log, cache)
+    stats = batch.stats
+
+    with batch.stage('扫描'):
+        pdf_files = collect_pdf_files(args.inputs, recursive=args.recursive,
+                                      structured=not args.pdf_only)
+    stats['files'] = len(pdf_files)
+
+    if not pdf_files:
+        print("错误: 没有找到PDF文件", file=sys.stderr)
+        return EXIT_FAILED
+
+    # 提取：每条结果都与其源文件绑定，避免失败项导致错位
+    with batch.stage('提取'):
+        records = list(iter_extract(
+            pdf_files, workers=args.workers, chunksize=args.chunksize, cache=cache,
+            backend=args.backend, input_mode=args.input, prefetch=args.prefetch,
+            count_reads=args.io_stats, split_pages=not args.no_split, triage=not args.no_triage,
+            structured=not args.pdf_only))
+
+    # 合并PDF中的每张发票另存为单独文件，之后与普通文件一样入账、重命名
+    if any(record['page_range'] for record in records):
+        with batch.stage('拆分'):
+            split_records(records, out_dir=args.split_dir, log=log,
+                          workers=resolve_workers(args.workers))
+
+    extracted = [(record['pdf_path'], record['data']) for record in records if batch.add(record)]
+    batch.write_triage_report()
+
+    if not extracted:
+        print("错误: 未能从PDF中提取到有效数据", file=sys.stderr)
+        batch.summary()
+        return EXIT_FAILED
+
+    batch.export(data for _, data in extracted)
+
+    try:
+        with batch.stage('写入'):
+            output_excel, stats['duplicates'] = write_results(args, extracted, log)
+    except Exception as e:
+        print(f"错误: {e}", file=sys.stderr)
+        batch.summary()
+        return EXIT_FAILED
+    log(f"Excel已保存: {output_excel}")
+
+    if not args.no_rename:
+        with batch.stage('重命名'):
+            try:
+                results = batch_rename(extracted, journal_path=args.rename_journal,
+                                       workers=args.rename_workers, log=log)
+            except Exception as e:
+                print(f"错误: 重命名失败: {e}", file=sys.stderr)
+                stats['rename_failed'] = len(extracted)
+                results = {}
+            for pdf_path, (new_path, error) in results.items():
+                batch.renamed(pdf_path, new_path, error)
+
+    batch.summary()
+    return batch.exit_code()
+
+
+def print_pipeline_stats(summary, out=sys.stdout):
+    """输出流水线的端到端延迟、批次与队列统计"""
+    print(f"端到端延迟: p50 {summary['latency_p50_s']:.3f}s  p95 {summary['latency_p95_s']:.3f}s"
+          f"  最大 {summary['latency_max_s']:.3f}s  （{summary['invoices']}张）", file=out)
+    print(f"批次: {summary['batches']}  平均 {summary['batch_size_avg']:.0f}张/批"
+          f"  批次延迟 p50 {summary['batch_latency_p50_s']:.3f}s"
+          f"/最大 {summary['batch_latency_max_s']:.3f}s"
+          f"  写入 {summary['sink_s_per_batch']:.3f}s/批  重命名 {summary['rename_s_per_batch']:.3f}s/批",
+          file=out)
+    peaks = '  '.join(f"{name} {depth}" for name, depth in summary['queue_peak'].items())
+    print(f"队列最大深度: {peaks or '-'}", file=out)
+
+
+def run_async(args, log, cache):
+    """用异步分阶段流水线执行一次批处理，返回退出码（与run相同）"""
+    batch = BatchRun(args, log, cache)
+    stats = batch.stats
+    extracted = [] if args.csv or args.check else None
+
+    pipeline = Pipeline(
+        template=args.template, output=args.output, ledger=args.ledger, cache=cache,
+        backend=args.backend, input_mode=args.input, read_workers=args.read_workers,
+        parse_workers=args.workers, queue_size=args.queue_size,
+        batch_size=args.batch_size or PIPELINE_BATCH_SIZE, count_reads=args.io_stats,
+        split_pages=not args.no_split, split_dir=args.split_dir, triage=not args.no_triage,
+        structured=not args.pdf_only, stream_excel=args.stream_excel, rename=not args.no_rename,
+        rename_workers=args.rename_workers, rename_journal=args.rename_journal,
+        on_file=batch.on_file(extracted), on_renamed=batch.renamed, log=log
+    )
+
+    def summary():
+        stats['files'] = pipeline.files
+        stats['duplicates'] = pipeline.duplicates
+        batch.summary(pipeline.stats.busy)
+        print_pipeline_stats(pipeline.stats.summary())
+
+    try:
+        output_excel = pipeline.run(iter_pdf_files(args.inputs, recursive=args.recursive,
+                                                   structured=not args.pdf_only))
+    except Exception as e:
+        print(f"错误: {e}", file=sys.stderr)
+        summary()
+        return EXIT_FAILED
+
+    if not pipeline.files:
+        print("错误: 没有找到PDF文件", file=sys.stderr)
+        return EXIT_FAILED
+    batch.write_triage_report()
+    if not stats['extracted']:
+        print("错误: 未能从PDF中提取到有效数据", file=sys.stderr)
+        summary()
+        return EXIT_FAILED
+    log(f"Excel已保存: {output_excel}")
+
+    if extracted is not None:
+        batch.export(extracted)
+
+    summary()
+    return batch.exit_code()
+
+
+def run_jobs(args, log, cache):
+    """
+    作业模式：领取并提取（每个文件提取完即记入作业库） -> 全部文件完成后写入台账 -> 重命名
+    中断或出错后重新运行同一命令从中断处继续；返回退出码（与run相同）
+    """
+    batch = BatchRun(args, log, cache)
+    stats = batch.stats
+    owner = worker_id()
+
+    def summary(store):
+        batch.summary()
+        print("作业库: ", end='')
+        return print_status(store)
+
+    with JobStore(args.jobs) as store:
+        with batch.stage('扫描'):
+            added = store.add(collect_pdf_files(args.inputs, recursive=args.recursive,
+                                                structured=not args.pdf_only))
+        log(f"作业库 {args.jobs}: 新加入 {added} 个文件")
+
+        try:
+            # 各进程共用同一个提取缓存：缓存被其他进程占用时按未命中处理，进程之间不互相等待
+            with batch.stage('提取'):
+                stats['files'] = extract_jobs(
+                    store, owner, args.claim_size, args.lease, split_dir=args.split_dir,
+                    on_file=batch.on_file(), log=log, workers=args.workers,
+                    chunksize=args.chunksize, cache=cache, backend=args.backend,
+                    input_mode=args.input, prefetch=args.prefetch, count_reads=args.io_stats,
+                    split_pages=not args.no_split, triage=not args.no_triage,
+                    structured=not args.pdf_only
+                )
+        except BaseException:
+            store.release(owner)  # 未完成的文件交还，其他进程可立即领取
+            raise
+
+        counts = store.counts()
+        if not sum(counts.values()):
+            print("错误: 没有找到PDF文件", file=sys.stderr)
+            return EXIT_FAILED
+        remaining = counts[PENDING] + counts[LEASED]
+        if remaining:
+            print(f"其他进程仍在提取 {remaining} 个文件，由最后完成的进程写入台账并重命名",
+                  file=sys.stderr)
+            summary(store)
+            return EXIT_OK
+        if not store.claim_merge(owner, args.lease):
+            print("其他进程正在写入台账，本进程退出", file=sys.stderr)
+            summary(store)
+            return EXIT_OK
+
+        renamed = {}
+        try:
+            if not args.no_rename:
+                renamed.update(resume_pending_renames(store, args.rename_workers, log))
+
+            def write(items):
+                output, stats['duplicates'] = write_results(args, items, log)
+                return output
+
+            with batch.stage('写入'):
+                output_excel = merge_results(store, write, append=bool(args.ledger), log=log)
+            if not args.no_rename:
+                with batch.stage('重命名'):
+                    renamed.update(rename_written(store, args.rename_journal, args.rename_workers,
+                                                  log))
+        except Exception as e:
+            print(f"错误: {e}", file=sys.stderr)
+            print("提取结果已保存在作业库中，排除问题后重新运行同一命令即可继续", file=sys.stderr)
+            summary(store)
+            return EXIT_FAILED
+        finally:
+            store.release_merge(owner)
+
+        for pdf_path, (new_path, error) in renamed.items():
+            batch.renamed(pdf_path, new_path, error)
+        if output_excel:
+            log(f"Excel已保存: {output_excel}")
+
+        done = store.results(EXTRACTED, WRITTEN, RENAMED)
+        if not done:
+            print("错误: 未能从PDF中提取到有效数据", file=sys.stderr)
+            summary(store)
+            return EXIT_FAILED
+        batch.export(r['data'] for _, records in done for r in records if r['data'])
+
+        counts = summary(store)
+    # 失败的文件与未改名成功的文件需要人工处理（修复后可用 jobs retry 重新提取）
+    if counts[FAILED] or (not args.no_rename and counts[WRITTEN]):
+        return EXIT_PARTIAL
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,386 @@
+"""
+发票处理核心逻辑（不依赖Tk）
+提取、写入Excel、重命名均在此实现，GUI与命令行共用
+"""
+import os
+import shutil
+from copy import copy
+
+from .backends import get_backend
+from .einvoice import companion_source, find_sources, read_einvoice
+from .fields import parse_invoice_text, extract_drawer, is_valid_name  # noqa: F401
+from .layout import default_layout, get_layout, restore_style
+from .metrics import METRICS
+
+# 提取规则版本号，修改字段解析逻辑后需递增，使旧缓存失效
+# 2: 多页PDF按发票拆分，不再缓存只含第一页的结果
+# 3: 购方/销方按纳税人识别号定位（提取配置），备注不再排除含"2026年"的行
+EXTRACTOR_VERSION = 3
+
+# 预定义样式（openpyxl导入约需0.2秒，首次写入Excel时才创建，见_styles）
+_STYLES = {}
+_STYLE_NAMES = ('THIN_BORDER', 'CENTER_ALIGNMENT', 'LEFT_ALIGNMENT', 'BLANK_STYLE')
+
+
+def _styles():
+    """首次调用时导入openpyxl并创建预定义样式"""
+    if not _STYLES:
+        from openpyxl.styles import Border, Side, Alignment
+        from openpyxl.styles.cell_style import StyleArray
+        _STYLES.update(
+            THIN_BORDER=Border(
+                left=Side(style='thin'),
+                right=Side(style='thin'),
+                top=Side(style='thin'),
+                bottom=Side(style='thin')
+            ),
+            CENTER_ALIGNMENT=Alignment(horizontal='center', vertical='center'),
+            LEFT_ALIGNMENT=Alignment(horizontal='left', vertical='center'),
+            BLANK_STYLE=StyleArray(),  # 未设置任何样式的单元格
+        )
+    return _STYLES
+
+
+def __getattr__(name):
+    # 兼容 from .core import THIN_BORDER 等写法，访问时才创建
+    if name in _STYLE_NAMES:
+        return _styles()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _no_log(message):
+    pass
+
+
+def read_first_page(pdf_path, backend=None):
+    """用指定后端（默认DEFAULT_BACKEND）读取PDF第一页文本，返回 (文本, 总页数)"""
+    with METRICS.timer('open'):
+        f = open(pdf_path, 'rb')
+    with f:
+        with METRICS.timer('parse') as t:
+            if METRICS.enabled:
+                t.add_bytes(os.fstat(f.fileno()).st_size)
+            return get_backend(backend).first_page(f)
+
+
+def read_pdf_text(pdf_path, backend=None):
+    """用指定后端（默认DEFAULT_BACKEND）读取PDF第一页文本"""
+    return read_first_page(pdf_path, backend)[0]
+
+
+def extract_invoice_data(pdf_path, log=_no_log, cache=None, backend=None, listings=None):
+    """
+    从PDF提取发票数据，失败时记录日志并返回None
+    有同名的数电发票XML/OFD时直接读取其字段，读取失败再解析PDF
+    传入cache（ExtractionCache）时先按内容哈希查缓存
+    逐个提取同一目录的大量文件时传入同一个listings字典（见find_sources），每个目录只列一次
+    """
+    if listings is None:
+        source = companion_source(pdf_path)
+    else:
+        source = find_sources([pdf_path], listings=listings).get(pdf_path)
+    if source:
+        try:
+            return read_einvoice(source)
+        except Exception as e:
+            if source == pdf_path:
+                log(f"提取失败 {os.path.basename(pdf_path)}: {str(e)}")
+                return None
+            log(f"  警告: {os.path.basename(source)} 读取失败（{e}），改为解析PDF")
+    try:
+        key = None
+        if cache is not None:
+            key = cache.key_for(pdf_path, backend)
+            data = cache.get(key)
+            if data is not None:
+                return data
+
+        text, pages = read_first_page(pdf_path, backend)
+
+        if not text:
+            log(f"  警告: {os.path.basename(pdf_path)} 无法提取文本（可能是扫描件）")
+            return None
+
+        with METRICS.timer('fields'):
+            data = parse_invoice_text(text)
+        # 多页PDF可能是合并的多张发票，只含第一页的结果不缓存（见bundle）
+        if key is not None and pages <= 1:
+            cache.put(key, data)
+        return data
+
+    except Exception as e:
+        log(f"提取失败 {os.path.basename(pdf_path)}: {str(e)}")
+        return None
+
+
+def find_total_row(ws):
+    """
+    查找合计行的位置（包含"合计"字样的行）
+    返回行号（从1开始）
+    """
+    for row in range(1, ws.max_row + 1):
+        cell_value = ws.cell(row=row, column=1).value  # 检查第一列
+        if cell_value and '合计' in str(cell_value):
+            return row
+    return None
+
+
+def apply_cell_style(cell, is_number=False, is_amount=False):
+    """
+    应用单元格样式
+    - is_amount: 是否为金额列（应用千分位格式）
+    - is_number: 是否为数字列（居中对齐）
+    """
+    styles = _styles()
+    # 应用边框
+    cell.border = styles['THIN_BORDER']
+
+    # 应用对齐
+    if is_number or is_amount:
+        cell.alignment = styles['CENTER_ALIGNMENT']
+    else:
+        cell.alignment = styles['LEFT_ALIGNMENT']
+
+    # 应用数字格式（千分位）
+    if is_amount and cell.value:
+        cell.number_format = '#,##0.00'
+
+
+# 金额列（第11、12、13列）及居中对齐的数字列
+AMOUNT_COLUMNS = {11, 12, 13}
+NUMBER_COLUMNS = {1, 11, 12, 13}
+
+
+def column_style_kind(col, value):
+    """单元格样式类别：text左对齐 / center居中 / amount居中+千分位"""
+    if col in AMOUNT_COLUMNS and value:
+        return 'amount'
+    if col in NUMBER_COLUMNS:
+        return 'center'
+    return 'text'
+
+
+class RowStyles:
+    """
+    预计算的行样式（每个工作簿一份）
+    逐个赋值border/alignment/number_format时，openpyxl每次都要对样式对象求哈希去重，
+    这里每种（原样式, 类别）组合只计算一次样式数组，之后直接复制给单元格
+    各列的样式类别由模板布局决定（默认为22列的标准台账）；
+    模板数据行中设置了样式的列沿用模板的样式，不再叠加边框/对齐/格式
+    """
+
+    def __init__(self, ws, layout=None):
+        self.ws = ws
+        self.layout = layout or default_layout()
+        self._cache = {}
+        self._captured = {}
+
+    def style_for(self, base, kind):
+        """在base样式数组上叠加kind类别的边框/对齐/格式，返回缓存的样式数组"""
+        if base is None:
+            base = _styles()['BLANK_STYLE']
+        key = (kind, tuple(base))
+        style = self._cache.get(key)
+        if style is None:
+            from openpyxl.cell import Cell
+            # 用一个临时单元格走一遍apply_cell_style，保证与逐格赋值的结果完全一致
+            cell = Cell(self.ws, value=1 if kind == 'amount' else None)
+            cell._style = copy(base)
+            apply_cell_style(cell, is_number=(kind != 'text'), is_amount=(kind == 'amount'))
+            style = self._cache[key] = cell._style
+        return style
+
+    def captured(self, col, total=False):
+        """模板数据行（total为True时为合计行）中该列的样式数组，模板中没有设置时返回None"""
+        key = (col, total)
+        if key not in self._captured:
+            styles = self.layout.total_styles if total else self.layout.cell_styles
+            style = styles.get(col)
+            if style is not None:
+                from openpyxl.cell import Cell
+                cell = Cell(self.ws)
+                restore_style(cell, style)
+                style = cell._style
+            self._captured[key] = style
+        return self._captured[key]
+
+    def cell_style(self, col, value, base=None):
+        """数据行单元格的样式数组；数据区左侧的列返回None（不设置样式）"""
+        kind = self.layout.style_kind(col, value)
+        if kind is None:
+            return None
+        style = self.captured(col)
+        return style if style is not None else self.style_for(base, kind)
+
+    def apply(self, cell, col):
+        style = self.cell_style(col, cell.value, cell._style)
+        if style is not None:
+            cell._style = copy(style)
+
+    def apply_total(self, ws, row):
+        """合计行各列恢复为模板合计行的样式"""
+        for col in self.layout.total_styles:
+            ws.cell(row=row, column=col)._style = copy(self.captured(col, total=True))
+
+
+def build_row_values(seq_no, data):
+    """按台账列顺序（layout.LEDGER_HEADERS）生成一行的值，写入时由模板布局放到对应列"""
+    return [
+        seq_no,                      # 序号
+        '',                          # 发票代码
+        '',                          # 发票号码
+        data['invoice_no'],          # 数电发票号码
+        data['seller_tax_no'],       # 销方识别号
+        data['seller_name'],         # 销方名称
+        data['buyer_tax_no'],        # 购方识别号
+        data['buyer_name'],          # 购买方名称
+        data['date'],                # 开票日期
+        data['item_name'],           # 货物或应税劳务名称
+        float(data['amount']) if data['amount'] else '',  # 金额
+        float(data['tax']) if data['tax'] else '',        # 税额
+        float(data['total']) if data['total'] else '',    # 价税合计
+        '电子发票服务平台',           # 发票来源
+        '数电发票（增值税专用发票）',   # 发票票种
+        '正常',                      # 发票状态
+        '是',                        # 是否正数发票
+        '正常',                      # 发票风险等级
+        data['drawer'],              # 开票人
+        data['remark'],              # 备注
+        data['month'],               # 对应月份
+        '',                          # 项目名称
+    ]
+
+
+def write_row_data(ws, row, seq_no, data, styles=None):
+    """
+    写入一行数据到指定行，并应用样式（列位置按styles的模板布局）
+    批量写入时传入同一个RowStyles，避免逐格重复计算样式
+    """
+    if styles is None:
+        styles = RowStyles(ws)
+    layout = styles.layout
+    for col, value in enumerate(layout.place(build_row_values(seq_no, data)), 1):
+        if col < layout.first_col:
+            continue
+        cell = ws.cell(row=row, column=col, value=value)
+        # 应用样式：金额列使用数字格式，其他列使用文本格式
+        styles.apply(cell, col)
+
+
+def default_output_path(excel_path):
+    """生成不覆盖已有文件的输出路径（模板名_已填写.xlsx）"""
+    output_path = excel_path.replace('.xlsx', '_已填写.xlsx')
+    counter = 1
+    original_output = output_path
+    while os.path.exists(output_path):
+        name, ext = os.path.splitext(original_output)
+        output_path = f"{name}_{counter}{ext}"
+        counter += 1
+    return output_path
+
+
+def write_to_excel(excel_path, data_list, output_path=None, log=_no_log):
+    """
+    将数据写入Excel，在合计行上方插入，不覆盖合计行，并应用样式
+    列位置与合计行由模板布局（按模板哈希缓存）确定
+    未指定output_path时保存为模板旁的新文件
+    """
+    from openpyxl import load_workbook
+    from .excel_stream import shift_merged_cells
+
+    try:
+        with METRICS.timer('template_load'):
+            wb = load_workbook(excel_path)
+        ws = wb.active
+
+        layout = get_layout(excel_path, ws)
+        total_row = layout.total_row
+        styles = RowStyles(ws, layout)
+
+        if total_row:
+            log(f"  找到合计行在第{total_row}行")
+
+            # 在合计行前插入足够的空行
+            with METRICS.timer('insert_rows'):
+                ws.insert_rows(total_row, len(data_list))
+                shift_merged_cells(ws, total_row, len(data_list), layout)
+            log(f"  已在合计行前插入{len(data_list)}行")
+
+            # 从新插入的第一行开始写入数据
+            for idx, data in enumerate(data_list):
+                row = total_row + idx
+                with METRICS.timer('row_write'):
+                    write_row_data(ws, row, idx + 1, data, styles)
+                log(f"  写入第{row}行: 发票{data['invoice_no'][:8]}... 开票人:{data['drawer']}")
+            styles.apply_total(ws, total_row + len(data_list))
+        else:
+            # 没找到合计行，从表头下一行（默认第2行）开始写入
+            start_row = layout.data_row
+            log(f"  未找到合计行，从第{start_row}行开始写入")
+            for idx, data in enumerate(data_list):
+                with METRICS.timer('row_write'):
+                    write_row_data(ws, start_row + idx, idx + 1, data, styles)
+
+        # 保存到新文件
+        if output_path is None:
+            output_path = default_output_path(excel_path)
+
+        with METRICS.timer('save') as t:
+            wb.save(output_path)
+            if METRICS.enabled:
+                t.add_bytes(os.path.getsize(output_path))
+        return output_path
+
+    except Exception as e:
+        raise Exception(f"写入Excel失败: {str(e)}")
+
+
+def clean_filename(text):
+    """替换文件名中的非法字符"""
+    invalid_chars = '\\/:*?"<>|'
+    for char in invalid_chars:
+        text = text.replace(char, '_')
+    return text
+
+
+def build_new_name(data):
+    """
+    按规则生成新文件名
+    规则：备注+金额+日期（无备注则为金额+日期）
+    """
+    remark = data.get('remark', '')
+    total = data.get('total', '')
+    date = data.get('date', '')
+
+    if remark:
+        new_name = f"{remark}+{total}+{date}.pdf"
+    else:
+        new_name = f"{total}+{date}.pdf"
+
+    return clean_filename(new_name)
+
+
+def rename_pdf(pdf_path, data):
+    """
+    按规则重命名PDF文件
+    规则：备注+金额+日期（无备注则为金额+日期）
+    """
+    try:
+        new_name = build_new_name(data)
+
+        dir_name = os.path.dirname(pdf_path)
+        new_path = os.path.join(dir_name, new_name)
+
+        counter = 1
+        base_new_path = new_path
+        while os.path.exists(new_path):
+            name, ext = os.path.splitext(base_new_path)
+            new_path = f"{name}_{counter}{ext}"
+            counter += 1
+
+        with METRICS.timer('rename'):
+            shutil.move(pdf_path, new_path)
+        return new_path
+
+    except Exception as e:
+        raise Exception(f"重命名失败: {str(e)}")
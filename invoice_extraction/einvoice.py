@@ -0,0 +1,215 @@
+"""
+数电发票结构化文件（XML / OFD）
+电子发票服务平台开具的数电发票除PDF外还可下载XML（OFD版式文件中也内嵌同样的XML），
+字段直接取自元素，不必从PDF页面文本中按规则推断（如"最大的三个¥金额"）：
+XML用iterparse增量解析，OFD为zip容器，直接从压缩包中流式读取其中的XML
+
+与PDF同目录同名的XML/OFD优先使用（XML优先于OFD），解析失败时仍按PDF提取；
+没有同名PDF的XML/OFD单独作为输入
+"""
+import os
+import re
+import zipfile
+from decimal import Decimal, InvalidOperation
+from xml.etree.ElementTree import iterparse
+
+from .fields import _resolve_month
+from .metrics import METRICS
+from .profiles import get_profile
+
+STRUCTURED_EXTS = ('.xml', '.ofd')
+ROOT_TAG = 'EInvoice'
+
+# (父元素, 元素) -> 字段；同一字段出现多次时取第一个（如多行商品取第一行的名称）
+XML_FIELDS = {
+    ('TaxSupervisionInfo', 'InvoiceNumber'): 'invoice_no',
+    ('TaxSupervisionInfo', 'IssueTime'): 'issue_time',
+    ('BasicInformation', 'RequestTime'): 'request_time',
+    ('SellerInformation', 'SellerIdNum'): 'seller_tax_no',
+    ('SellerInformation', 'SellerName'): 'seller_name',
+    ('BuyerInformation', 'BuyerIdNum'): 'buyer_tax_no',
+    ('BuyerInformation', 'BuyerName'): 'buyer_name',
+    ('BasicInformation', 'TotalAmWithoutTax'): 'amount',
+    ('BasicInformation', 'TotalTaxAm'): 'tax',
+    ('BasicInformation', 'TotalTax-includedAmount'): 'total',
+    ('BasicInformation', 'Drawer'): 'drawer',
+    ('IssuItemInformation', 'ItemName'): 'item_name',
+    ('AdditionalInformation', 'Remark'): 'remark',
+}
+
+DATE_RE = re.compile(r'(\d{4})\D{1,2}(\d{1,2})\D{1,2}(\d{1,2})')
+
+
+class NotEInvoiceError(ValueError):
+    """XML的根元素不是数电发票（EInvoice）"""
+
+
+def is_structured(path):
+    return os.path.splitext(path)[1].lower() in STRUCTURED_EXTS
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_einvoice_xml(source):
+    """
+    增量解析数电发票XML（文件路径或二进制文件对象），返回 {字段: 文本}
+    根元素不是EInvoice时读到第一个元素即抛出NotEInvoiceError
+    """
+    found = {}
+    stack = []
+    for event, elem in iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if not stack and _local(elem.tag) != ROOT_TAG:
+                raise NotEInvoiceError(f"不是数电发票XML（根元素为{_local(elem.tag)}）")
+            stack.append(_local(elem.tag))
+            continue
+        tag = stack.pop()
+        if stack:
+            field = XML_FIELDS.get((stack[-1], tag))
+            if field and field not in found and elem.text and elem.text.strip():
+                found[field] = elem.text.strip()
+        elem.clear()
+    return found
+
+
+def _ofd_members(zf):
+    """OFD中的XML成员，附件（Attachs）中的排在前面"""
+    names = [name for name in zf.namelist() if name.lower().endswith('.xml')]
+    return sorted(names, key=lambda name: 'attach' not in name.lower())
+
+
+def parse_einvoice_ofd(path):
+    """从OFD压缩包中找到内嵌的数电发票XML并流式解析"""
+    with zipfile.ZipFile(path) as zf:
+        for name in _ofd_members(zf):
+            with zf.open(name) as f:
+                try:
+                    return parse_einvoice_xml(f)
+                except NotEInvoiceError:
+                    continue
+    raise ValueError('OFD中没有内嵌的数电发票XML')
+
+
+def _money(text):
+    """金额统一为两位小数的字符串（与PDF提取结果相同），无法识别时为空"""
+    try:
+        return f"{Decimal((text or '').replace(',', '')):.2f}"
+    except InvalidOperation:
+        return ''
+
+
+def _date(text):
+    match = DATE_RE.search(text or '')
+    if not match:
+        return ''
+    year, month, day = match.groups()
+    return f"{year}-{int(month):02d}-{int(day):02d}"
+
+
+def einvoice_data(found, profile=None):
+    """把XML字段映射为与parse_invoice_text相同的发票数据；缺少的购方/销方/开票人按提取配置补齐"""
+    profile = profile or get_profile()
+    if not found.get('invoice_no'):
+        raise ValueError('XML中没有发票号码')
+    data = {'invoice_no': found['invoice_no'],
+            'date': _date(found.get('issue_time') or found.get('request_time'))}
+    if found.get('buyer_tax_no') or found.get('buyer_name'):
+        data['buyer_tax_no'] = found.get('buyer_tax_no', '')
+        data['buyer_name'] = found.get('buyer_name', '')
+    else:
+        data['buyer_tax_no'], data['buyer_name'] = profile.default_buyer
+    if found.get('seller_tax_no') or found.get('seller_name'):
+        data['seller_tax_no'] = found.get('seller_tax_no', '')
+        data['seller_name'] = found.get('seller_name', '')
+    else:
+        data['seller_tax_no'], data['seller_name'] = profile.default_seller
+    data['total'] = _money(found.get('total'))
+    data['amount'] = _money(found.get('amount'))
+    data['tax'] = _money(found.get('tax'))
+    data['drawer'] = found.get('drawer') or profile.default_drawer
+    data['item_name'] = found.get('item_name') or profile.default_item_name
+    # 备注可能换行，合并为一行（用于文件名）
+    data['remark'] = ' '.join(found.get('remark', '').split())
+    data['month'] = _resolve_month(data['remark'], data['date'])
+    return data
+
+
+def read_einvoice(path, profile=None):
+    """读取XML或OFD文件，返回发票数据"""
+    with METRICS.timer('structured'):
+        if path.lower().endswith('.ofd'):
+            found = parse_einvoice_ofd(path)
+        else:
+            found = parse_einvoice_xml(path)
+        return einvoice_data(found, profile)
+
+
+def _list_structured(directory):
+    """目录中的XML/OFD文件 {规范化的文件名主干: 文件名}，同名时XML优先"""
+    found = {}
+    try:
+        with os.scandir(directory or '.') as it:
+            for entry in it:
+                stem, ext = os.path.splitext(entry.name)
+                ext = ext.lower()
+                if ext in STRUCTURED_EXTS:
+                    key = os.path.normcase(stem)
+                    if ext == '.xml' or key not in found:
+                        found[key] = entry.name
+    except OSError:
+        pass
+    return found
+
+
+def find_sources(paths, companions=True, listings=None):
+    """
+    返回 {路径: 结构化来源}：XML/OFD输入对应其自身；
+    companions为True时PDF对应同目录同名的XML或OFD（每个目录只列一次）
+    逐个文件查找时传入同一个listings字典，目录列表在多次调用间复用
+    """
+    sources = {}
+    if listings is None:
+        listings = {}
+    for path in paths:
+        if is_structured(path):
+            sources[path] = path
+            continue
+        if not companions:
+            continue
+        directory = os.path.dirname(path)
+        listing = listings.get(directory)
+        if listing is None:
+            listing = listings[directory] = _list_structured(directory)
+        name = listing.get(os.path.normcase(os.path.splitext(os.path.basename(path))[0]))
+        if name:
+            sources[path] = os.path.join(directory, name)
+    return sources
+
+
+def companion_source(path):
+    """
+    单个文件的结构化来源（见find_sources），直接按文件名检查同名XML/OFD，不列目录
+    只识别小写或大写的扩展名；批量查找用find_sources
+    """
+    if is_structured(path):
+        return path
+    stem = os.path.splitext(path)[0]
+    for ext in STRUCTURED_EXTS:
+        for variant in (ext, ext.upper()):
+            if os.path.isfile(stem + variant):
+                return stem + variant
+    return None
+
+
+def companion_names(pdf_name, names):
+    """names（目录中规范化后的文件名集合）中与pdf_name同名的XML/OFD文件名"""
+    stem = os.path.splitext(pdf_name)[0]
+    found = []
+    for ext in STRUCTURED_EXTS:
+        for variant in (ext, ext.upper()):
+            name = stem + variant
+            if os.path.normcase(name) in names and os.path.normcase(name) not in found:
+                found.append(os.path.normcase(name))
+    return found
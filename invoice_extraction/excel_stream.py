@@ -0,0 +1,243 @@
+"""
+流式Excel写入
+模板以只读模式逐行读取，输出用openpyxl的write-only模式逐行写出：
+表头原样复制 -> 逐行写入发票数据 -> 重新写出合计行及其后的行
+不调用insert_rows，也不把整个工作簿留在内存中，峰值内存只与行宽有关
+"""
+import os
+from xml.etree.ElementTree import iterparse
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter, range_boundaries
+
+from .core import RowStyles, build_row_values, default_output_path, _no_log
+from .layout import get_layout
+from .metrics import METRICS
+
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+def read_sheet_layout(ws):
+    """
+    单次流式解析工作表XML，取出列宽、行高和合并单元格（不保留单元格）
+    返回 (列宽 {列号: (宽度, 是否隐藏)}, 行高 {行号: 高度}, 合并区域列表)
+    """
+    columns = {}
+    row_heights = {}
+    merges = []
+    with ws._get_source() as src:
+        for _, elem in iterparse(src):
+            tag = elem.tag
+            if tag == SHEET_NS + 'col':
+                width = elem.get('width')
+                hidden = elem.get('hidden') in ('1', 'true')
+                for col in range(int(elem.get('min')), int(elem.get('max')) + 1):
+                    columns[col] = (float(width) if width else None, hidden)
+            elif tag == SHEET_NS + 'row':
+                if elem.get('customHeight') in ('1', 'true') and elem.get('ht'):
+                    row_heights[int(elem.get('r'))] = float(elem.get('ht'))
+                elem.clear()
+            elif tag == SHEET_NS + 'mergeCell':
+                merges.append(elem.get('ref'))
+    return columns, row_heights, merges
+
+
+def _copy_cell(ws, cell, styles):
+    """
+    复制只读单元格的值与样式
+    styles按源单元格的样式编号缓存输出端的样式数组：逐项赋值样式要对字体、边框等求哈希查重，
+    台账按批追加时每批都要复制全部已有行，同一样式只转换一次
+    """
+    out = WriteOnlyCell(ws, value=cell.value)
+    if getattr(cell, 'has_style', False):
+        style = styles.get(cell._style_id)
+        if style is not None:
+            out._style = style
+            return out
+        out.font = cell.font
+        out.fill = cell.fill
+        out.border = cell.border
+        out.alignment = cell.alignment
+        out.number_format = cell.number_format
+        out.protection = cell.protection
+        styles[cell._style_id] = out._style
+    return out
+
+
+def _copy_row(ws, row, styles):
+    return [_copy_cell(ws, cell, styles) for cell in row]
+
+
+def _data_row(ws, seq_no, data, styles, template=None):
+    """
+    生成一行发票数据，列位置与样式与write_row_data一致
+    template为被这一行覆盖的模板行（已复制的单元格）：与write_to_excel一样，
+    数据为None的列与数据区以外的列保留模板单元格，样式在模板单元格的样式上叠加
+    """
+    layout = styles.layout
+    values = layout.place(build_row_values(seq_no, data))
+    template = template or []
+    cells = []
+    for col in range(1, max(len(values), len(template)) + 1):
+        value = values[col - 1] if col <= len(values) else None
+        original = template[col - 1] if col <= len(template) else None
+        if original is not None and value is None:
+            value = original.value
+        style = styles.cell_style(col, value, original._style if original is not None else None) \
+            if col <= len(values) else None
+        if style is None:
+            cells.append(original)
+            continue
+        cell = WriteOnlyCell(ws, value=value)
+        # write-only单元格写出后即丢弃，可直接共用缓存的样式数组
+        cell._style = style
+        cells.append(cell)
+    return cells
+
+
+def shift_merged_range(ref, insert_at, count, first_col=1, last_col=None):
+    """
+    在insert_at行前插入count行后合并区域的新位置，返回区域列表：
+    插入点以上的不变，插入点及以下的下移；跨过插入点的区域与数据区的列（first_col到last_col）
+    不相交时向下延伸，相交时拆成插入点上下两段（只剩一个单元格的段不再合并），不与数据行重叠
+    """
+    min_col, min_row, max_col, max_row = range_boundaries(ref)
+    if max_row < insert_at:
+        return [ref]
+    if min_row >= insert_at:
+        pieces = [(min_row + count, max_row + count)]
+    elif max_col < first_col or (last_col is not None and min_col > last_col):
+        pieces = [(min_row, max_row + count)]
+    else:
+        pieces = [(min_row, insert_at - 1), (insert_at + count, max_row + count)]
+    first, last = get_column_letter(min_col), get_column_letter(max_col)
+    return [f"{first}{top}:{last}{bottom}" for top, bottom in pieces
+            if top < bottom or min_col < max_col]
+
+
+def shift_merged_cells(ws, insert_at, count, layout):
+    """insert_rows之后按shift_merged_range调整工作表的合并区域（openpyxl插入行时不移动合并区域）"""
+    from openpyxl.worksheet.cell_range import MultiCellRange
+    from openpyxl.worksheet.merge import MergedCellRange
+
+    refs = [r.coord for r in ws.merged_cells.ranges]
+    ws.merged_cells = MultiCellRange()
+    for ref in refs:
+        for new in shift_merged_range(ref, insert_at, count, layout.first_col, layout.last_col):
+            ws.merged_cells.add(MergedCellRange(ws, new))
+
+
+def _setup_sheet(ws, dimensions, insert_at, count, layout=None):
+    """复制列宽、行高和合并区域，插入点以下整体下移count行（合并区域见shift_merged_range）"""
+    columns, row_heights, merges = dimensions
+    for col, (width, hidden) in columns.items():
+        dim = ws.column_dimensions[get_column_letter(col)]
+        if width is not None:
+            dim.width = width
+        dim.hidden = hidden
+    for row, height in row_heights.items():
+        if insert_at is not None and row >= insert_at:
+            row += count
+        ws.row_dimensions[row].height = height
+    for ref in merges:
+        if insert_at is None:
+            ws.merged_cells.add(ref)
+            continue
+        for new in shift_merged_range(ref, insert_at, count, layout.first_col, layout.last_col):
+            ws.merged_cells.add(new)
+
+
+def _stream_sheet(src_ws, out_ws, data_list, log, layout, start_seq=1, append=False):
+    """
+    把活动工作表写出，并按模板布局在合计行之前插入发票数据
+    append为True时（追加到台账），没有合计行就接在最后一行之后，而不是覆盖表头以下的模板行
+    """
+    total_row = layout.total_row
+    first_row = layout.data_row
+    count = len(data_list)
+    if total_row:
+        log(f"  找到合计行在第{total_row}行")
+        insert_at = total_row
+    elif append:
+        log("  未找到合计行，追加到末尾")
+        insert_at = None
+    else:
+        # 没找到合计行，与write_to_excel一致：从表头下一行开始写入（覆盖模板行）
+        log(f"  未找到合计行，从第{first_row}行开始写入")
+        insert_at = None
+
+    with METRICS.timer('template_load'):
+        dimensions = read_sheet_layout(src_ws)
+    _setup_sheet(out_ws, dimensions, insert_at, count, layout)
+    styles = RowStyles(out_ws, layout)
+    pending = enumerate(data_list, start_seq)
+
+    def write_data():
+        for seq_no, data in pending:
+            with METRICS.timer('row_write'):
+                out_ws.append(_data_row(out_ws, seq_no, data, styles))
+
+    overwrite = not total_row and not append
+    copied_styles = {}
+    for idx, row in enumerate(src_ws.iter_rows(), 1):
+        if total_row and idx == total_row:
+            write_data()
+            log(f"  已在合计行前写入{count}行")
+        cells = _copy_row(out_ws, row, copied_styles)
+        if overwrite and idx >= first_row:
+            item = next(pending, None)
+            if item is not None:
+                # 被数据行覆盖的模板行
+                with METRICS.timer('row_write'):
+                    out_ws.append(_data_row(out_ws, *item, styles, template=cells))
+                continue
+        if total_row and idx == total_row:
+            for col in layout.total_styles:
+                if col <= len(cells):
+                    cells[col - 1]._style = styles.captured(col, total=True)
+        out_ws.append(cells)
+
+    # 模板只有表头（或为空）、或追加模式下没有合计行时，（其余的）数据接在末尾
+    write_data()
+
+
+def write_to_excel_streaming(excel_path, data_list, output_path=None, log=_no_log,
+                             start_seq=1, append=False, layout=None):
+    """
+    流式版write_to_excel：结果与原函数相同的行布局与样式，
+    但不加载整个工作簿、不调用insert_rows
+    start_seq为第一行的序号；append见_stream_sheet
+    layout为已知的模板布局（如台账索引中记录的），未指定时按模板哈希取缓存或分析
+    """
+    try:
+        with METRICS.timer('template_load'):
+            src = load_workbook(excel_path, read_only=True)
+        out = Workbook(write_only=True)
+        try:
+            active_title = src.active.title
+            for src_ws in src.worksheets:
+                out_ws = out.create_sheet(src_ws.title)
+                if src_ws.title == active_title:
+                    if layout is None:
+                        layout = get_layout(excel_path, src_ws)
+                    _stream_sheet(src_ws, out_ws, data_list, log, layout, start_seq, append)
+                else:
+                    _setup_sheet(out_ws, read_sheet_layout(src_ws), None, 0)
+                    copied_styles = {}
+                    for row in src_ws.iter_rows():
+                        out_ws.append(_copy_row(out_ws, row, copied_styles))
+            out.active = src.sheetnames.index(active_title)
+        finally:
+            src.close()
+
+        if output_path is None:
+            output_path = default_output_path(excel_path)
+        with METRICS.timer('save') as t:
+            out.save(output_path)
+            if METRICS.enabled:
+                t.add_bytes(os.path.getsize(output_path))
+        return output_path
+
+    except Exception as e:
+        raise Exception(f"写入Excel失败: {str(e)}")
@@ -0,0 +1,222 @@
+"""
+发票字段提取引擎
+全文字段由声明式规则表描述，正则在导入时编译；
+页面文本只切分一次行，开票人与备注在同一次遍历中确定
+购方/销方、货物名称规则与默认开票人来自提取配置（见profiles）
+"""
+import re
+
+from .profiles import get_profile
+
+# 全文字段规则：(规则名, 正则, 取值方式)
+# first: 取第一次匹配；all: 取全部匹配的第一个分组
+# 每条规则单独编译：带字面前缀的独立正则比合并成一个大的分支正则扫描更快
+TEXT_FIELD_SPECS = [
+    ('invoice_no', r'\b(\d{20})\b', 'first'),                            # 数电发票号码（20位数字）
+    ('date', r'(\d{4})年(\d{1,2})月(\d{1,2})日', 'first'),                # 开票日期
+    ('amount', r'[¥￥]\s*([\d,]+\.\d{2})', 'all'),                        # 金额
+]
+
+# 人名判断
+NAME_RE = re.compile(r'^[\u4e00-\u9fa5]{2,4}$')
+NAME_STOP_WORDS = ('公司', '电子', '发票', '号码')
+
+# 备注行判断：含"月"、不含排除词与完整日期（开票日期行）、含业务关键词；
+# 含本张发票购方/销方名称或识别号的行也跳过
+REMARK_SKIP_RE = re.compile('|'.join(map(re.escape, [
+    '开票人', '¥', '电子发票', '增值税专用发票',
+])) + r'|\d{4}年\d{1,2}月\d{1,2}日')
+REMARK_KEYWORD_RE = re.compile('费|服务|项目')
+
+# 购方名称（购方识别号未登记时，取其前面第一个"名称："后的文字）
+PARTY_NAME_RE = re.compile(r'名称[:：]\s*(\S+)')
+
+# 对应月份（从备注中提取）
+FULL_MONTH_RE = re.compile(r'(\d{4}年\d{1,2}[-~]\d{1,2}月|\d{4}年\d{1,2}月)')
+SHORT_MONTH_RE = re.compile(r'(\d{1,2}[-~]\d{1,2}月|\d{1,2}月)')
+
+
+def _compile_specs(specs):
+    """编译规则表，返回 [(规则名, 编译后的正则, 取值方式)]"""
+    return [(name, re.compile(pattern), mode) for name, pattern, mode in specs]
+
+
+COMPILED_SPECS = _compile_specs(TEXT_FIELD_SPECS)
+INVOICE_NO_RE = next(regex for name, regex, _ in COMPILED_SPECS if name == 'invoice_no')
+
+
+def scan_text_fields(text):
+    """
+    按规则表扫描全文，返回 {规则名: 匹配对象或分组列表}
+    """
+    found = {}
+    for name, regex, mode in COMPILED_SPECS:
+        if mode == 'all':
+            found[name] = regex.findall(text)
+        else:
+            found[name] = regex.search(text)
+    return found
+
+
+def find_invoice_no(text):
+    """页面文本中的数电发票号码，找不到返回空字符串"""
+    match = INVOICE_NO_RE.search(text or '')
+    return match.group(1) if match else ''
+
+
+def is_valid_name(text):
+    """
+    判断文本是否像人名（2-4个汉字，不含数字、英文、特殊符号）
+    """
+    if not text:
+        return False
+
+    # 过滤掉明显不是名字的内容
+    if any(x in text for x in NAME_STOP_WORDS):
+        return False
+
+    # 匹配2-4个汉字（中文人名常见长度），数字、金额符号等自然排除
+    return bool(NAME_RE.match(text))
+
+
+def _drawer_at(lines, i):
+    """"开票人"所在行或下一行中的人名，找不到返回None"""
+    current = lines[i].replace('开票人', '').replace(':', '').replace('：', '').strip()
+    if current and is_valid_name(current):
+        return current
+    if i + 1 < len(lines):
+        next_line = lines[i + 1].strip()
+        if is_valid_name(next_line):
+            return next_line
+    return None
+
+
+def _scan_lines(lines, default_drawer='', party_words=()):
+    """
+    单次遍历所有行，同时得到开票人和备注
+    备注取最后一个符合条件且不含开票人姓名的行；
+    含party_words（购方/销方名称、识别号）或为其一段的行跳过
+    """
+    drawer = None
+    remark_candidates = []
+
+    for i, line in enumerate(lines):
+        if drawer is None and '开票人' in line:
+            drawer = _drawer_at(lines, i)
+        if '月' not in line:
+            continue
+        if REMARK_SKIP_RE.search(line) or not REMARK_KEYWORD_RE.search(line):
+            continue
+        stripped = line.strip()
+        # 名称换行时，行本身是名称的一段
+        if any(word in line or stripped in word for word in party_words):
+            continue
+        remark_candidates.append(line)
+
+    if drawer is None:
+        drawer = default_drawer
+
+    remark = ''
+    for line in reversed(remark_candidates):
+        if not drawer or drawer not in line:
+            remark = line.strip()
+            break
+    return drawer, remark
+
+
+def extract_drawer(text, profile=None):
+    """
+    专门提取开票人，处理换行情况
+    策略：找到"开票人"关键字后，往后找第一个符合人名特征的行（2-4个汉字）
+    """
+    profile = profile or get_profile()
+    return _scan_lines(text.split('\n'), profile.default_drawer)[0]
+
+
+def _resolve_amounts(amounts):
+    """取最大的三个¥金额，依次为价税合计、金额、税额"""
+    if len(amounts) < 3:
+        return '', '', ''
+    nums = sorted(amounts, key=lambda a: float(a.replace(',', '')), reverse=True)
+    return tuple(a.replace(',', '') for a in nums[:3])
+
+
+def _resolve_month(remark, date):
+    """从备注提取对应月份，缺年份时用开票日期的年份补齐"""
+    if not remark:
+        return ''
+    match = FULL_MONTH_RE.search(remark)
+    if match:
+        return match.group(1).replace('月', '月份')
+    match = SHORT_MONTH_RE.search(remark)
+    if not match:
+        return ''
+    month_part = match.group(1).replace('月', '月份')
+    if date:
+        return f"{date[:4]}年{month_part}"
+    return month_part
+
+
+def parse_invoice_text(text, profile=None):
+    """
+    从发票页面文本中解析各字段，返回字段字典
+    profile为提取配置，默认使用当前进程的配置（get_profile）
+    """
+    profile = profile or get_profile()
+    found = scan_text_fields(text)
+    data = {}
+
+    # 1. 数电发票号码
+    match = found['invoice_no']
+    data['invoice_no'] = match.group(1) if match else ''
+
+    # 2. 开票日期 -> 转换为YYYY-MM-DD格式
+    match = found['date']
+    if match:
+        year, month, day = match.groups()
+        data['date'] = f"{year}-{int(month):02d}-{int(day):02d}"
+    else:
+        data['date'] = ''
+
+    # 3. 销方、4. 购方信息（按纳税人识别号定位，已登记的用登记名称）
+    buyer, seller = profile.match_parties(text)
+    if buyer is not None:
+        data['buyer_tax_no'] = buyer[0]
+        if buyer[3] and buyer[3][0]:
+            data['buyer_name'] = buyer[3][0]
+        else:
+            match = PARTY_NAME_RE.search(text, 0, buyer[1])
+            data['buyer_name'] = match.group(1) if match else ''
+    else:
+        data['buyer_tax_no'], data['buyer_name'] = profile.default_buyer
+
+    if seller is not None:
+        data['seller_tax_no'] = seller[0]
+        if seller[3] and seller[3][0]:
+            data['seller_name'] = seller[3][0]
+        elif buyer is not None and buyer[2] <= seller[1]:
+            # 数电发票中销方名称在两个识别号之间
+            data['seller_name'] = text[buyer[2]:seller[1]].replace('\n', '').strip()
+        else:
+            data['seller_name'] = ''
+    else:
+        data['seller_tax_no'], data['seller_name'] = profile.default_seller
+
+    # 5. 金额
+    data['total'], data['amount'], data['tax'] = _resolve_amounts(found['amount'])
+
+    # 6. 开票人、8. 备注（行只切分一次，一次遍历）
+    party_words = [w for w in (data['buyer_name'], data['buyer_tax_no'],
+                               data['seller_name'], data['seller_tax_no']) if w]
+    drawer, remark = _scan_lines(text.split('\n'), profile.default_drawer, party_words)
+    data['drawer'] = drawer
+
+    # 7. 货物或应税劳务名称
+    data['item_name'] = profile.item_name(text)
+
+    data['remark'] = remark
+
+    # 9. 对应月份
+    data['month'] = _resolve_month(data['remark'], data['date'])
+
+    return data
@@ -0,0 +1,441 @@
+"""
+可续跑的作业队列
+上万个文件的批处理中途失败（台账被Excel打开、PDF损坏、进程被杀）时不必从头再来：
+每个文件的状态保存在SQLite作业库中
+    pending（待提取） -> leased（已领取） -> extracted / failed（已提取 / 提取失败或分拣跳过）
+    -> written（已写入台账） -> renamed（已重命名）
+- 多个进程、或共享目录上的多台机器可同时运行同一命令：各自按批领取待提取的文件，
+  领取带租约，进程崩溃后租约到期即由其他进程重新领取；本机已退出进程的租约立即收回
+- 提取结果随提取成组提交，重新运行同一命令从中断处继续
+- 全部文件提取完后，由最后完成的进程按输入顺序一次性写入台账（或新Excel），再重命名；
+  追加台账按发票号码去重，重复执行不会重复入账，重命名按日志继续
+
+作业库放在共享目录上时依赖文件锁（不使用WAL，网络文件系统不支持）
+
+命令行:
+    python -m invoice_extraction.jobs status 作业库.sqlite3
+    python -m invoice_extraction.jobs retry 作业库.sqlite3     # 失败的文件重新提取
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+
+from .core import _no_log
+
+PENDING = 'pending'
+LEASED = 'leased'
+EXTRACTED = 'extracted'
+FAILED = 'failed'
+WRITTEN = 'written'
+RENAMED = 'renamed'
+STATE_LABELS = {
+    PENDING: '待提取', LEASED: '提取中', EXTRACTED: '已提取', FAILED: '失败/跳过',
+    WRITTEN: '已入账', RENAMED: '已重命名',
+}
+
+DEFAULT_LEASE = 300.0
+DEFAULT_CLAIM_SIZE = 200
+# 作业库被其他进程锁住时最多等待的秒数
+BUSY_TIMEOUT = 60.0
+# 提取结果成组提交：满COMMIT_SIZE个文件或距上次提交COMMIT_INTERVAL秒
+COMMIT_SIZE = 50
+COMMIT_INTERVAL = 1.0
+# 保存到作业库的结果字段
+RECORD_KEYS = ('pdf_path', 'data', 'error', 'error_type', 'source')
+
+
+def worker_id():
+    """主机名:进程号，用于标记租约的持有者"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_gone(owner):
+    """租约持有者是本机上已退出的进程（其他机器上的只能等租约到期）"""
+    host, _, pid = owner.rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit() or os.name != 'posix':
+        return False
+    if int(pid) == os.getpid():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+class JobStore:
+    """作业库：jobs(path, seq, state, owner, lease_until, attempts, records, error) 与 meta"""
+
+    def __init__(self, path):
+        self.path = path
+        # 自行管理事务（BEGIN IMMEDIATE），领取时先取得写锁，多个进程不会领到同一文件
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        with self._transaction():
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' path TEXT PRIMARY KEY,'
+                ' seq INTEGER NOT NULL,'
+                ' state TEXT NOT NULL,'
+                ' owner TEXT,'
+                ' lease_until REAL,'
+                ' attempts INTEGER NOT NULL DEFAULT 0,'
+                ' records TEXT,'
+                ' error TEXT,'
+                ' updated REAL)'
+            )
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_state_seq ON jobs(state, seq)')
+            # 重命名后的新文件名：再次扫描目录时不作为新文件加入
+            self.conn.execute('CREATE TABLE IF NOT EXISTS renamed (path TEXT PRIMARY KEY)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+    @contextmanager
+    def _transaction(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+
+    def get_meta(self, key):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._transaction():
+            if value is None:
+                self.conn.execute('DELETE FROM meta WHERE key = ?', (key,))
+            else:
+                self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                  (key, str(value)))
+
+    def _rename_targets(self):
+        """已重命名（或正在按日志重命名）得到的文件名"""
+        from .rename import RenameJournal
+
+        targets = {row[0] for row in self.conn.execute('SELECT path FROM renamed')}
+        journal = self.get_meta('rename_journal')
+        if journal and os.path.exists(journal):
+            targets.update(dst for _, dst in RenameJournal.load(journal).ops)
+        return targets
+
+    def add(self, paths):
+        """加入新文件（已在作业库中的、本作业重命名得到的跳过），返回新加入数"""
+        targets = self._rename_targets()
+        paths = [p for p in paths if p not in targets]
+        with self._transaction():
+            before = self.conn.total_changes
+            seq = self.conn.execute('SELECT COALESCE(MAX(seq), -1) + 1 FROM jobs').fetchone()[0]
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO jobs (path, seq, state, updated) VALUES (?, ?, ?, ?)',
+                [(p, seq + i, PENDING, time.time()) for i, p in enumerate(paths)]
+            )
+            return self.conn.total_changes - before
+
+    def claim(self, owner, count=DEFAULT_CLAIM_SIZE, lease=DEFAULT_LEASE):
+        """
+        领取最多count个待提取的文件（按输入顺序），返回路径列表
+        租约已到期、或持有者是本机已退出进程的文件一并收回重新领取
+        """
+        now = time.time()
+        with self._transaction():
+            gone = [o for (o,) in self.conn.execute(
+                'SELECT DISTINCT owner FROM jobs WHERE state = ?', (LEASED,)) if _owner_gone(o)]
+            if gone:
+                self.conn.executemany(
+                    'UPDATE jobs SET lease_until = 0 WHERE state = ? AND owner = ?',
+                    [(LEASED, o) for o in gone])
+            paths = [p for (p,) in self.conn.execute(
+                'SELECT path FROM jobs WHERE state = ? OR (state = ? AND lease_until < ?)'
+                ' ORDER BY seq LIMIT ?', (PENDING, LEASED, now, count))]
+            self.conn.executemany(
+                'UPDATE jobs SET state = ?, owner = ?, lease_until = ?, attempts = attempts + 1,'
+                ' updated = ? WHERE path = ?',
+                [(LEASED, owner, now + lease, now, p) for p in paths]
+            )
+        return paths
+
+    def renew(self, owner, lease=DEFAULT_LEASE):
+        """延长owner持有的全部租约"""
+        with self._transaction():
+            self.conn.execute('UPDATE jobs SET lease_until = ? WHERE state = ? AND owner = ?',
+                              (time.time() + lease, LEASED, owner))
+
+    def complete(self, owner, jobs):
+        """
+        在一个事务中提交一组文件的提取结果 [(路径, 结果列表)]（合并PDF为多条）
+        返回提交成功的路径；租约已被他人收回的文件丢弃
+        """
+        now = time.time()
+        done = []
+        with self._transaction():
+            for path, records in jobs:
+                saved = [{k: r.get(k) for k in RECORD_KEYS} for r in records]
+                state = EXTRACTED if any(r['data'] for r in saved) else FAILED
+                error = '; '.join(r['error'] for r in saved if r['error']) or None
+                cur = self.conn.execute(
+                    'UPDATE jobs SET state = ?, owner = NULL, lease_until = NULL, records = ?,'
+                    ' error = ?, updated = ? WHERE path = ? AND state = ? AND owner = ?',
+                    (state, json.dumps(saved, ensure_ascii=False), error, now, path, LEASED, owner)
+                )
+                if cur.rowcount == 1:
+                    done.append(path)
+        return done
+
+    def release(self, owner):
+        """交还owner未完成的文件（如被Ctrl+C中断）"""
+        with self._transaction():
+            self.conn.execute(
+                'UPDATE jobs SET state = ?, owner = NULL, lease_until = NULL'
+                ' WHERE state = ? AND owner = ?', (PENDING, LEASED, owner))
+
+    def results(self, *states):
+        """按输入顺序返回指定状态的 [(路径, 结果列表)]"""
+        marks = ','.join('?' * len(states))
+        rows = self.conn.execute(
+            f'SELECT path, records FROM jobs WHERE state IN ({marks}) ORDER BY seq', states)
+        return [(path, json.loads(records)) for path, records in rows]
+
+    def mark(self, paths, state):
+        with self._transaction():
+            self.conn.executemany('UPDATE jobs SET state = ?, updated = ? WHERE path = ?',
+                                  [(state, time.time(), p) for p in paths])
+
+    def mark_renamed(self, jobs, results):
+        """
+        按重命名结果 {原路径: (新路径或None, 错误或None)} 更新作业
+        全部改名成功的作业标记为renamed，结果中的路径改为新文件名；有失败的保留written，重新运行时再试
+        """
+        now = time.time()
+        with self._transaction():
+            for path, records in jobs:
+                errors = []
+                for record in records:
+                    if not record['data'] or record['pdf_path'] not in results:
+                        continue
+                    new_path, error = results[record['pdf_path']]
+                    if error:
+                        errors.append(error)
+                    else:
+                        record['pdf_path'] = new_path
+                        self.conn.execute('INSERT OR IGNORE INTO renamed (path) VALUES (?)',
+                                          (new_path,))
+                self.conn.execute(
+                    'UPDATE jobs SET state = ?, records = ?, error = ?, updated = ? WHERE path = ?',
+                    (WRITTEN if errors else RENAMED, json.dumps(records, ensure_ascii=False),
+                     '; '.join(errors) or None, now, path)
+                )
+
+    def claim_merge(self, owner, lease=DEFAULT_LEASE):
+        """取得入账锁（同一时间只有一个进程写台账、重命名）"""
+        now = time.time()
+        with self._transaction():
+            row = self.conn.execute(
+                "SELECT value FROM meta WHERE key = 'merge_owner'").fetchone()
+            until = self.conn.execute(
+                "SELECT value FROM meta WHERE key = 'merge_until'").fetchone()
+            if row and row[0] != owner and until and float(until[0]) > now \
+                    and not _owner_gone(row[0]):
+                return False
+            self.conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                  [('merge_owner', owner), ('merge_until', str(now + lease))])
+        return True
+
+    def release_merge(self, owner):
+        with self._transaction():
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'merge_owner'").fetchone()
+            if row and row[0] == owner:
+                self.conn.execute("DELETE FROM meta WHERE key IN ('merge_owner', 'merge_until')")
+
+    def retry_failed(self):
+        """失败的文件重新置为待提取，返回数量"""
+        with self._transaction():
+            return self.conn.execute(
+                'UPDATE jobs SET state = ?, records = NULL, error = NULL WHERE state = ?',
+                (PENDING, FAILED)).rowcount
+
+    def counts(self):
+        counts = dict.fromkeys(STATE_LABELS, 0)
+        for state, n in self.conn.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state'):
+            counts[state] = n
+        return counts
+
+    def failures(self):
+        return self.conn.execute(
+            'SELECT path, error FROM jobs WHERE state = ? ORDER BY seq', (FAILED,)).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def extract_jobs(store, owner, claim_size=DEFAULT_CLAIM_SIZE, lease=DEFAULT_LEASE,
+                 split_dir=None, on_file=None, log=_no_log, **extract_options):
+    """
+    循环领取并提取，直到没有可领取的文件；提取结果成组提交（中断时最多损失约COMMIT_INTERVAL秒的工作），
+    返回本进程提交的文件数
+    extract_options原样传给iter_extract（workers、cache、backend、split_pages、triage等）
+    """
+    from .bundle import split_records
+    from .parallel import iter_extract
+
+    pending = []
+    last_commit = time.perf_counter()
+
+    def commit():
+        nonlocal last_commit
+        done = set(store.complete(owner, pending))
+        for path, records in pending:
+            if path not in done:
+                log(f"  租约已被收回，丢弃结果: {path}")
+            elif on_file:
+                on_file(path, records)
+        pending.clear()
+        store.renew(owner, lease)
+        last_commit = time.perf_counter()
+        return len(done)
+
+    def finish(path, records):
+        if any(r['page_range'] for r in records):
+            split_records(records, out_dir=split_dir, log=log)
+        pending.append((path, records))
+        # 成组提交：每次提交都要同步磁盘，逐个提交会拖慢提取
+        if len(pending) >= COMMIT_SIZE or time.perf_counter() - last_commit >= COMMIT_INTERVAL:
+            return commit()
+        return 0
+
+    done = 0
+    while True:
+        paths = store.claim(owner, claim_size, lease)
+        if not paths:
+            return done
+        log(f"领取 {len(paths)} 个文件")
+        # 合并PDF展开为多条结果，原路径相同的连续结果属于同一文件
+        current, group = None, []
+        try:
+            for record in iter_extract(paths, **extract_options):
+                if group and record['pdf_path'] != current:
+                    done += finish(current, group)
+                    group = []
+                current = record['pdf_path']
+                group.append(record)
+            if group:
+                done += finish(current, group)
+        finally:
+            if pending:  # 被中断时也保存已提取完的文件
+                done += commit()
+
+
+def _journal_results(journal_path):
+    """按重命名日志返回 {原路径: (新路径或None, 错误或None)}（未执行的项不含）"""
+    from .rename import RenameJournal
+
+    journal = RenameJournal.load(journal_path)
+    results = {}
+    for i, (src, dst) in enumerate(journal.ops):
+        state = journal.status.get(i)
+        if state == 'done':
+            results[src] = (dst, None)
+        elif state == 'failed':
+            results[src] = (None, '重命名失败（见日志）')
+    return results
+
+
+def resume_pending_renames(store, workers=1, log=_no_log):
+    """
+    上次重命名中途中断时按日志继续，并把日志中的结果记入作业库
+    须在写入新的结果之前调用：此时已入账未改名的作业正是那次重命名的对象
+    返回 {原路径: (新路径或None, 错误或None)}
+    """
+    from .rename import resume_renames
+
+    journal_path = store.get_meta('rename_journal')
+    if not journal_path:
+        return {}
+    results = {}
+    if os.path.exists(journal_path):
+        log(f"继续上次中断的重命名: {journal_path}")
+        resume_renames(journal_path, workers, log)
+        results = _journal_results(journal_path)
+        store.mark_renamed(store.results(WRITTEN), results)
+    store.set_meta('rename_journal', None)
+    return results
+
+
+def rename_written(store, journal_path=None, workers=1, log=_no_log):
+    """
+    重命名已入账的文件，日志路径在执行前记入作业库（中断后由resume_pending_renames继续）
+    返回 {原路径: (新路径或None, 错误或None)}
+    """
+    from .rename import batch_rename, default_journal_path
+
+    jobs = store.results(WRITTEN)
+    items = [(r['pdf_path'], r['data']) for _, records in jobs for r in records if r['data']]
+    if not items:
+        return {}
+    journal_path = journal_path or default_journal_path()
+    store.set_meta('rename_journal', journal_path)
+    results = batch_rename(items, journal_path=journal_path, workers=workers, log=log)
+    store.mark_renamed(jobs, results)
+    store.set_meta('rename_journal', None)
+    return results
+
+
+def merge_results(store, write, append=True, log=_no_log):
+    """
+    把新提取的结果按输入顺序一次性写入：write([(pdf路径, 发票数据)])返回输出路径
+    append为True（追加台账）时只写新提取的；否则（写出新Excel）连同之前已写入的全部写出
+    返回输出路径，没有新结果时返回None
+    """
+    fresh = store.results(EXTRACTED)
+    if not fresh:
+        return None
+    jobs = fresh if append else store.results(EXTRACTED, WRITTEN, RENAMED)
+    items = [(r['pdf_path'], r['data']) for _, records in jobs for r in records if r['data']]
+    output = write(items)
+    store.mark([path for path, _ in fresh], WRITTEN)
+    log(f"已写入 {len(items)} 张发票: {output}")
+    return output
+
+
+def print_status(store, out=sys.stdout):
+    counts = store.counts()
+    print('  '.join(f"{STATE_LABELS[state]} {n}" for state, n in counts.items()), file=out)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='invoice_extraction.jobs',
+                                     description='查看作业库状态或重新提取失败的文件')
+    parser.add_argument('action', choices=('status', 'retry'))
+    parser.add_argument('store', help='作业库路径')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.store):
+        print(f"错误: 作业库不存在 {args.store}", file=sys.stderr)
+        return 1
+    with JobStore(args.store) as store:
+        if args.action == 'retry':
+            print(f"重新提取 {store.retry_failed()} 个失败的文件", file=sys.stderr)
+        print_status(store)
+        if args.action == 'status':
+            for path, error in store.failures():
+                print(f"  ✗ {path}: {error}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
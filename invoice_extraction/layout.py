@@ -0,0 +1,277 @@
+"""
+模板布局分析
+以只读模式扫描一次模板的活动工作表：定位表头行，把表头文字（数电发票号码、价税合计、开票人……）
+映射到列号，找到合计行，并按表头确定各列的样式类别（左对齐 / 居中 / 居中+千分位）；
+模板第一行数据行与合计行中各列已设置的样式（字体、填充、边框、对齐、数字格式）一并记下，写入时沿用
+分析结果以模板内容哈希为键缓存（进程内与用户缓存目录下的JSON），同一模板重复运行不再分析；
+列顺序不同、增删了列、表头上方有标题行的模板按表头写入，不必改代码
+"""
+import json
+import os
+
+from .metrics import METRICS
+
+# 台账各列表头，顺序与core.build_row_values生成的值一致
+LEDGER_HEADERS = (
+    '序号', '发票代码', '发票号码', '数电发票号码', '销方识别号', '销方名称', '购方识别号',
+    '购买方名称', '开票日期', '货物或应税劳务名称', '金额', '税额', '价税合计', '发票来源',
+    '发票票种', '发票状态', '是否正数发票', '发票风险等级', '开票人', '备注', '对应月份', '项目名称',
+)
+AMOUNT_HEADERS = {'金额', '税额', '价税合计'}
+NUMBER_HEADERS = {'序号'} | AMOUNT_HEADERS
+
+# 常见的表头写法 -> LEDGER_HEADERS中的名称
+HEADER_ALIASES = {
+    '销售方识别号': '销方识别号',
+    '销方纳税人识别号': '销方识别号',
+    '销售方名称': '销方名称',
+    '购买方识别号': '购方识别号',
+    '购方纳税人识别号': '购方识别号',
+    '购方名称': '购买方名称',
+    '货物或应税劳务、服务名称': '货物或应税劳务名称',
+    '金额（不含税）': '金额',
+}
+
+# 只在前若干行中找表头；一行中至少认出这么多列才算表头行
+HEADER_SCAN_ROWS = 20
+MIN_HEADER_LABELS = 3
+TOTAL_LABEL = '合计'
+
+CACHE_VERSION = 2
+MAX_CACHED_LAYOUTS = 64
+
+# 进程内缓存 {模板哈希: TemplateLayout}
+_LAYOUTS = {}
+
+
+def normalize_header(value):
+    """去掉表头中的空白与换行并换算别名，不是已知表头时返回None"""
+    if value is None:
+        return None
+    label = ''.join(str(value).split())
+    label = HEADER_ALIASES.get(label, label)
+    return label if label in LEDGER_HEADERS else None
+
+
+class TemplateLayout:
+    """
+    模板布局：{表头: 列号}、表头行、合计行、数据区的首列与末列
+    header_row为None表示没有认出表头，按LEDGER_HEADERS的顺序从第1列写起
+    cell_styles / total_styles：模板数据行 / 合计行中各列的样式 {列号: 样式}（见capture_style），
+    没有设置样式的列不列出
+    """
+
+    def __init__(self, columns, header_row=None, total_row=None, first_col=1, last_col=None,
+                 cell_styles=None, total_styles=None):
+        self.columns = columns
+        self.header_row = header_row
+        self.total_row = total_row
+        self.first_col = first_col
+        self.last_col = last_col or max(columns.values())
+        self.cell_styles = cell_styles or {}
+        self.total_styles = total_styles or {}
+        # 各列的样式类别（没有列出的为text）
+        self.kinds = {}
+        for header, col in columns.items():
+            if header in AMOUNT_HEADERS:
+                self.kinds[col] = 'amount'
+            elif header in NUMBER_HEADERS:
+                self.kinds[col] = 'center'
+        # LEDGER_HEADERS中每个值写入的列号（模板中没有的列为None）
+        self.slots = [columns.get(header) for header in LEDGER_HEADERS]
+        self.is_default = (self.slots == list(range(1, len(LEDGER_HEADERS) + 1))
+                           and first_col == 1 and self.last_col == len(LEDGER_HEADERS))
+
+    @property
+    def data_row(self):
+        """没有合计行时第一行数据写在哪一行（表头下一行）"""
+        return (self.header_row or 1) + 1
+
+    def column(self, header):
+        return self.columns.get(header)
+
+    def place(self, values):
+        """把按LEDGER_HEADERS顺序的一行值放到模板的对应列，返回第1列到末列的值"""
+        if self.is_default:
+            return values
+        row = [None] * self.last_col
+        for col, value in zip(self.slots, values):
+            if col:
+                row[col - 1] = value
+        return row
+
+    def style_kind(self, col, value):
+        """单元格样式类别：text / center / amount（金额为空时居中）；数据区左侧的列返回None"""
+        if col < self.first_col:
+            return None
+        kind = self.kinds.get(col, 'text')
+        if kind == 'amount' and not value:
+            return 'center'
+        return kind
+
+    def to_dict(self):
+        return {'columns': self.columns, 'header_row': self.header_row,
+                'total_row': self.total_row, 'first_col': self.first_col,
+                'last_col': self.last_col, 'cell_styles': self.cell_styles,
+                'total_styles': self.total_styles}
+
+    @classmethod
+    def from_dict(cls, d):
+        # JSON中列号键为字符串；旧版本记录的布局没有样式
+        def styles(key):
+            return {int(col): style for col, style in (d.get(key) or {}).items()}
+
+        return cls(d['columns'], d['header_row'], d['total_row'], d['first_col'], d['last_col'],
+                   styles('cell_styles'), styles('total_styles'))
+
+
+def capture_style(cell):
+    """单元格样式转为可存入JSON的字典（各样式对象的XML与数字格式），没有设置样式时返回None"""
+    if not getattr(cell, 'has_style', False):
+        return None
+    from openpyxl.xml.functions import tostring
+    style = {name: tostring(getattr(cell, name).to_tree()).decode()
+             for name in ('font', 'fill', 'border', 'alignment', 'protection')}
+    style['number_format'] = cell.number_format
+    return style
+
+
+def restore_style(cell, style):
+    """把capture_style得到的样式设置到单元格上"""
+    from openpyxl.styles import Alignment, Border, Font, Protection
+    from openpyxl.styles.fills import Fill
+    from openpyxl.xml.functions import fromstring
+    for name, cls in (('font', Font), ('fill', Fill), ('border', Border),
+                      ('alignment', Alignment), ('protection', Protection)):
+        setattr(cell, name, cls.from_tree(fromstring(style[name])))
+    cell.number_format = style['number_format']
+
+
+def capture_row_styles(ws, layout):
+    """
+    记下模板第一行数据行（表头下一行，在合计行之前时）与合计行中已映射各列的样式
+    只读模式下逐行读到合计行为止
+    """
+    rows = {}
+    if layout.total_row is None or layout.data_row < layout.total_row:
+        rows[layout.data_row] = layout.cell_styles = {}
+    if layout.total_row:
+        rows[layout.total_row] = layout.total_styles = {}
+    if not rows:
+        return layout
+    mapped = set(layout.columns.values())
+    start = min(rows)
+    for idx, row in enumerate(ws.iter_rows(min_row=start, max_row=max(rows),
+                                           max_col=layout.last_col), start):
+        styles = rows.get(idx)
+        if styles is None:
+            continue
+        for col, cell in enumerate(row, 1):
+            style = capture_style(cell) if col in mapped else None
+            if style:
+                styles[col] = style
+    return layout
+
+
+def default_layout(total_row=None):
+    """没有表头时的布局：LEDGER_HEADERS依次占第1-22列"""
+    return TemplateLayout({header: col for col, header in enumerate(LEDGER_HEADERS, 1)},
+                          total_row=total_row)
+
+
+def analyze_header(ws):
+    """在前HEADER_SCAN_ROWS行中找表头，返回不含合计行的布局"""
+    for idx, row in enumerate(ws.iter_rows(max_row=HEADER_SCAN_ROWS, values_only=True), 1):
+        columns = {}
+        for col, value in enumerate(row, 1):
+            header = normalize_header(value)
+            if header:
+                columns.setdefault(header, col)
+        if len(columns) >= MIN_HEADER_LABELS:
+            filled = [col for col, value in enumerate(row, 1) if value not in (None, '')]
+            return TemplateLayout(columns, header_row=idx, first_col=filled[0],
+                                  last_col=filled[-1])
+    return default_layout()
+
+
+def is_total_label(value):
+    return bool(value) and TOTAL_LABEL in str(value)
+
+
+def analyze_sheet(ws):
+    """分析工作表：表头，以及表头以下数据区首列中第一个含"合计"的行"""
+    layout = analyze_header(ws)
+    col = layout.first_col
+    start = (layout.header_row or 0) + 1
+    for idx, (value,) in enumerate(
+            ws.iter_rows(min_row=start, min_col=col, max_col=col, values_only=True), start):
+        if is_total_label(value):
+            layout.total_row = idx
+            break
+    return capture_row_styles(ws, layout)
+
+
+def analyze_template(template_path):
+    """以只读模式打开模板并分析活动工作表"""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(template_path, read_only=True)
+    try:
+        return analyze_sheet(wb.active)
+    finally:
+        wb.close()
+
+
+def default_layout_cache_path():
+    from .cache import default_cache_dir
+    return os.path.join(default_cache_dir(), 'template_layouts.json')
+
+
+def _load_entries(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cached, dict) or cached.get('version') != CACHE_VERSION:
+        return {}
+    return cached.get('layouts', {})
+
+
+def _save_entries(path, entries):
+    """先写临时文件再替换；缓存目录不可写时放弃（只影响下次运行是否要重新分析）"""
+    while len(entries) > MAX_CACHED_LAYOUTS:
+        entries.pop(next(iter(entries)))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'layouts': entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def get_layout(template_path, ws=None, cache_path=None):
+    """
+    返回模板布局：按模板内容哈希依次查进程内缓存、磁盘缓存，都没有时才分析
+    ws为已打开的该模板活动工作表时直接分析它，否则以只读模式打开模板
+    返回的布局为共用对象，调用方不要修改
+    """
+    from .cache import file_digest
+
+    with METRICS.timer('template_layout'):
+        digest = file_digest(template_path)
+        layout = _LAYOUTS.get(digest)
+        if layout is not None:
+            return layout
+        path = cache_path or default_layout_cache_path()
+        entries = _load_entries(path)
+        try:
+            layout = TemplateLayout.from_dict(entries[digest])
+        except (KeyError, TypeError, ValueError):
+            layout = analyze_template(template_path) if ws is None else analyze_sheet(ws)
+            entries[digest] = layout.to_dict()
+            _save_entries(path, entries)
+        _LAYOUTS[digest] = layout
+        return layout
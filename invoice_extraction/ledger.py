@@ -0,0 +1,316 @@
+"""
+追加到总台账
+每次运行不再另存新文件，而是把新发票追加到同一个台账中；
+台账旁保存一个SQLite索引（数电发票号码 -> 台账行号，已入账的PDF文件哈希 -> 台账行号）与台账的模板布局，
+查重只需按号码（号码读不出或与上次不同时按文件哈希）查索引，追加时也不必重新扫描工作表找合计行；
+新行直接写入xlsx中的工作表XML（见xlsx_append），不必把已有的行读入再写出
+"""
+import json
+import os
+import shutil
+import sqlite3
+
+from .cache import file_digest
+from .core import _no_log
+from .layout import TemplateLayout, analyze_header, capture_row_styles, is_total_label
+from .metrics import METRICS
+from .xlsx_append import AppendUnsupported, append_rows
+
+
+def default_index_path(ledger_path):
+    return ledger_path + '.index.sqlite3'
+
+
+def _ledger_signature(ledger_path):
+    """台账文件的大小与修改时间，用于判断索引是否仍与台账一致"""
+    st = os.stat(ledger_path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def _normalize_invoice_no(value):
+    """单元格中的发票号码统一为字符串（数字格式的单元格可能读出int）"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value).strip()
+    return text if text.isdigit() else None
+
+
+def scan_ledger(ledger_path):
+    """
+    流式扫描台账活动工作表，序号、发票号码所在列与合计行按表头确定
+    返回 (发票号码 {号码: 行号}, 合计行号或None, 最后一行行号, 最大序号, 模板布局)
+    """
+    invoices = {}
+    total_row = None
+    last_row = 0
+    max_seq = 0
+    from openpyxl import load_workbook
+    wb = load_workbook(ledger_path, read_only=True)
+    try:
+        ws = wb.active
+        layout = analyze_header(ws)
+        header_row = layout.header_row or 0
+        label_col = layout.first_col
+        seq_col = layout.column('序号')
+        no_col = layout.column('数电发票号码')
+        max_col = max(col for col in (label_col, seq_col, no_col) if col)
+        for idx, row in enumerate(ws.iter_rows(max_col=max_col, values_only=True), 1):
+            last_row = idx
+            if total_row is not None or idx <= header_row:
+                continue
+            if len(row) >= label_col and is_total_label(row[label_col - 1]):
+                total_row = idx
+                continue
+            if no_col is None or len(row) < no_col:
+                continue
+            invoice_no = _normalize_invoice_no(row[no_col - 1])
+            if invoice_no is None:
+                continue
+            invoices.setdefault(invoice_no, idx)
+            seq = row[seq_col - 1] if seq_col else None
+            if isinstance(seq, (int, float)):
+                max_seq = max(max_seq, int(seq))
+        layout.total_row = total_row
+        capture_row_styles(ws, layout)
+    finally:
+        wb.close()
+    return invoices, total_row, last_row, max_seq, layout
+
+
+class LedgerIndex:
+    """
+    台账索引：invoices(invoice_no, row)、files(file_hash, invoice_no, row) 与 meta(key, value)
+    files记录每个入账PDF的内容哈希（包括读不出号码的），同一文件再次投递时按哈希跳过；
+    meta中记录台账签名、模板布局、合计行、最后一行和下一个序号；
+    台账被其他程序修改（签名不符）时自动重新扫描重建
+    """
+
+    def __init__(self, ledger_path, index_path=None):
+        self.ledger_path = ledger_path
+        self.path = index_path or default_index_path(ledger_path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS invoices ('
+            ' invoice_no TEXT PRIMARY KEY,'
+            ' row INTEGER NOT NULL)'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            ' file_hash TEXT PRIMARY KEY,'
+            ' invoice_no TEXT,'
+            ' row INTEGER NOT NULL)'
+        )
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self._migrate()
+        self.conn.commit()
+        self.rebuilt = False
+
+    def _migrate(self):
+        """旧版本把文件哈希记在invoices.file_hash中：搬到files表"""
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(invoices)')]
+        if 'file_hash' in columns and self._get_meta('files_migrated') is None:
+            self.conn.execute(
+                'INSERT OR IGNORE INTO files (file_hash, invoice_no, row)'
+                ' SELECT file_hash, invoice_no, row FROM invoices WHERE file_hash IS NOT NULL')
+            self._set_meta(files_migrated=1)
+
+    def _get_meta(self, key):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, **values):
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+            [(k, None if v is None else str(v)) for k, v in values.items()]
+        )
+
+    @property
+    def total_row(self):
+        value = self._get_meta('total_row')
+        return int(value) if value else None
+
+    @property
+    def last_row(self):
+        return int(self._get_meta('last_row') or 0)
+
+    @property
+    def insert_row(self):
+        """新行写入的位置：合计行处，没有合计行时为最后一行之后"""
+        return self.total_row or self.last_row + 1
+
+    @property
+    def next_seq(self):
+        return int(self._get_meta('next_seq') or 1)
+
+    @property
+    def layout(self):
+        """台账的模板布局（合计行取索引中记录的当前位置）"""
+        layout = TemplateLayout.from_dict(json.loads(self._get_meta('layout')))
+        layout.total_row = self.total_row
+        return layout
+
+    def is_stale(self):
+        # 旧版本建立的索引没有记录布局，也要重新扫描
+        return (self._get_meta('signature') != _ledger_signature(self.ledger_path)
+                or self._get_meta('layout') is None)
+
+    def refresh(self, log=_no_log):
+        """
+        索引与台账不一致时重新扫描台账
+        已知的文件哈希中，号码仍在台账中的更新行号、已不在的删除；没有号码的无法核对，保留
+        """
+        if not self.is_stale():
+            return False
+        log("  台账索引已过期，重新扫描台账")
+        with METRICS.timer('ledger_scan'):
+            invoices, total_row, last_row, max_seq, layout = scan_ledger(self.ledger_path)
+        files = self.conn.execute(
+            'SELECT file_hash, invoice_no FROM files WHERE invoice_no IS NOT NULL').fetchall()
+        with self.conn:
+            self.conn.execute('DELETE FROM invoices')
+            self.conn.executemany('INSERT INTO invoices (invoice_no, row) VALUES (?, ?)',
+                                  invoices.items())
+            self.conn.executemany(
+                'DELETE FROM files WHERE file_hash = ?',
+                [(file_hash,) for file_hash, no in files if no not in invoices])
+            self.conn.executemany(
+                'UPDATE files SET row = ? WHERE file_hash = ?',
+                [(invoices[no], file_hash) for file_hash, no in files if no in invoices])
+            self._set_meta(signature=_ledger_signature(self.ledger_path), total_row=total_row,
+                           last_row=last_row, next_seq=max_seq + 1,
+                           layout=json.dumps(layout.to_dict(), ensure_ascii=False))
+        self.rebuilt = True
+        return True
+
+    def lookup(self, invoice_no):
+        """返回发票号码所在的台账行号，不存在时返回None"""
+        row = self.conn.execute(
+            'SELECT row FROM invoices WHERE invoice_no = ?', (invoice_no,)).fetchone()
+        return row[0] if row else None
+
+    def lookup_file(self, file_hash):
+        """返回该内容的PDF入账时的台账行号，没有入账过时返回None"""
+        row = self.conn.execute(
+            'SELECT row FROM files WHERE file_hash = ?', (file_hash,)).fetchone()
+        return row[0] if row else None
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM invoices').fetchone()[0]
+
+    def record_append(self, entries):
+        """
+        记录刚追加到台账的发票，entries为 [(发票号码, 文件哈希)]，按写入顺序
+        没有号码的发票不入号码索引，但仍占用台账行并记下文件哈希
+        新行位于原合计行处（没有合计行时接在最后一行之后）
+        """
+        count = len(entries)
+        total_row = self.total_row
+        first_row = self.insert_row
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO invoices (invoice_no, row) VALUES (?, ?)',
+                [(no, first_row + i) for i, (no, _) in enumerate(entries) if no]
+            )
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO files (file_hash, invoice_no, row) VALUES (?, ?, ?)',
+                [(file_hash, no or None, first_row + i)
+                 for i, (no, file_hash) in enumerate(entries) if file_hash]
+            )
+            self._set_meta(signature=_ledger_signature(self.ledger_path),
+                           total_row=total_row + count if total_row else None,
+                           last_row=self.last_row + count,
+                           next_seq=self.next_seq + count)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _file_hash(path):
+    try:
+        return file_digest(path)
+    except OSError:
+        return None
+
+
+def append_to_ledger(ledger_path, items, template=None, index_path=None, log=_no_log):
+    """
+    把 [(pdf路径, 发票数据)] 中的新发票追加到总台账
+    - 台账不存在时由template复制创建
+    - 发票号码已在台账（或本批次中已出现）的跳过；同一内容的PDF已入账的也跳过
+    - 序号接着台账中已有的最大序号继续
+    返回 {'added': 新增条数, 'duplicates': [(pdf路径, 发票号码, 台账行号)], 'output': 台账路径}
+    """
+    from .excel_stream import write_to_excel_streaming
+
+    try:
+        if not os.path.exists(ledger_path):
+            if not template:
+                raise FileNotFoundError(f"台账不存在且未指定模板: {ledger_path}")
+            shutil.copyfile(template, ledger_path)
+            log(f"  由模板创建台账: {ledger_path}")
+
+        with LedgerIndex(ledger_path, index_path) as index:
+            index.refresh(log)
+
+            new_items = []
+            entries = []
+            duplicates = []
+            batch = {}
+            for pdf_path, data in items:
+                invoice_no = data['invoice_no']
+                row = index.lookup(invoice_no) if invoice_no else None
+                if row is not None:
+                    duplicates.append((pdf_path, invoice_no, row))
+                    log(f"  跳过重复发票 {invoice_no}（台账第{row}行）")
+                    continue
+                if invoice_no in batch:
+                    duplicates.append((pdf_path, invoice_no, None))
+                    log(f"  跳过重复发票 {invoice_no}（与{os.path.basename(batch[invoice_no])}相同）")
+                    continue
+                # 号码读不出、或与上次入账时读到的不同：同一文件按内容哈希识别
+                file_hash = _file_hash(pdf_path)
+                row = index.lookup_file(file_hash) if file_hash else None
+                if row is not None or file_hash in batch:
+                    duplicates.append((pdf_path, invoice_no, row))
+                    log(f"  跳过已入账的文件 {os.path.basename(pdf_path)}"
+                        + (f"（台账第{row}行）" if row else "（本批次中重复）"))
+                    continue
+                if invoice_no:
+                    batch[invoice_no] = pdf_path
+                if file_hash:
+                    batch[file_hash] = pdf_path
+                new_items.append(data)
+                entries.append((invoice_no, file_hash))
+
+            result = {'added': len(new_items), 'duplicates': duplicates, 'output': ledger_path}
+            if not new_items:
+                log("  没有新发票，台账未修改")
+                return result
+
+            # 先写临时文件再替换，写入中途失败不会损坏台账
+            tmp_path = ledger_path + '.tmp.xlsx'
+            layout = index.layout
+            try:
+                with METRICS.timer('ledger_append'):
+                    append_rows(ledger_path, new_items, tmp_path, layout, index.next_seq,
+                                index.insert_row)
+            except AppendUnsupported as e:
+                # 如台账中还没有发票行（新建的台账）：完整写出一次，之后的追加沿用这些行的样式
+                log(f"  改为完整写出台账（{e}）")
+                write_to_excel_streaming(ledger_path, new_items, output_path=tmp_path, log=log,
+                                         start_seq=index.next_seq, append=True, layout=layout)
+            os.replace(tmp_path, ledger_path)
+            index.record_append(entries)
+            log(f"  已追加{len(new_items)}条到台账，跳过重复{len(duplicates)}条")
+            return result
+
+    except Exception as e:
+        raise Exception(f"追加台账失败: {str(e)}")
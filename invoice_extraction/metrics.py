@@ -0,0 +1,195 @@
+"""
+分阶段计时与性能剖析
+各阶段（打开文件、PDF解析、字段提取、加载模板、查找合计行、插入行、写行、保存、重命名）
+记录耗时样本、次数与处理字节数，可导出为JSON或Prometheus文本格式
+
+默认关闭：关闭时timer()返回共享的空上下文，开销只有一次函数调用
+进程池子进程中的样本随提取结果带回主进程合并（见parallel._map_extract）
+"""
+import json
+import math
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_PREFIX = 'invoice_stage'
+
+
+class _NullTimer:
+    """关闭时使用的空计时器"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_bytes(self, nbytes):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('registry', 'stage', 'nbytes', 'start')
+
+    def __init__(self, registry, stage, nbytes):
+        self.registry = registry
+        self.stage = stage
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.stage, time.perf_counter() - self.start, self.nbytes)
+        return False
+
+    def add_bytes(self, nbytes):
+        self.nbytes += nbytes
+
+
+def quantile(sorted_samples, q):
+    """最近秩法分位数"""
+    if not sorted_samples:
+        return 0.0
+    idx = min(len(sorted_samples) - 1, max(0, math.ceil(q * len(sorted_samples)) - 1))
+    return sorted_samples[idx]
+
+
+class Metrics:
+    """各阶段耗时样本（秒）与字节数"""
+
+    def __init__(self):
+        self.enabled = False
+        self.samples = {}
+        self.bytes = {}
+        self.lock = threading.Lock()  # 预读线程与主线程可能同时记录
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        self.samples = {}
+        self.bytes = {}
+
+    def timer(self, stage, nbytes=0):
+        """with METRICS.timer('parse') as t: ...；可用t.add_bytes()补记字节数"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage, nbytes)
+
+    def observe(self, stage, seconds, nbytes=0):
+        with self.lock:
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = array('d')
+                self.bytes[stage] = 0
+            samples.append(seconds)
+            self.bytes[stage] += nbytes
+
+    def drain(self):
+        """取出并清空当前样本（子进程把样本随结果带回时使用）"""
+        data = {stage: (samples.tolist(), self.bytes[stage])
+                for stage, samples in self.samples.items()}
+        self.reset()
+        return data
+
+    def merge(self, data):
+        for stage, (samples, nbytes) in data.items():
+            if stage not in self.samples:
+                self.samples[stage] = array('d')
+                self.bytes[stage] = 0
+            self.samples[stage].extend(samples)
+            self.bytes[stage] += nbytes
+
+    def summary(self):
+        """{阶段: {count, total_s, p50_ms, p95_ms, p99_ms, max_ms, bytes}}"""
+        result = {}
+        for stage, samples in self.samples.items():
+            ordered = sorted(samples)
+            stats = {'count': len(ordered), 'total_s': sum(ordered)}
+            for q in QUANTILES:
+                stats[f'p{int(q * 100)}_ms'] = quantile(ordered, q) * 1000
+            stats['max_ms'] = (ordered[-1] if ordered else 0.0) * 1000
+            stats['bytes'] = self.bytes[stage]
+            result[stage] = stats
+        return result
+
+    def to_prometheus(self):
+        """Prometheus文本格式（summary类型 + 字节计数器）"""
+        lines = [
+            f'# HELP {METRIC_PREFIX}_seconds 各处理阶段耗时',
+            f'# TYPE {METRIC_PREFIX}_seconds summary',
+        ]
+        summary = self.summary()
+        for stage, stats in summary.items():
+            for q in QUANTILES:
+                value = stats[f'p{int(q * 100)}_ms'] / 1000
+                lines.append(f'{METRIC_PREFIX}_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'{METRIC_PREFIX}_seconds_sum{{stage="{stage}"}} {stats["total_s"]:.6f}')
+            lines.append(f'{METRIC_PREFIX}_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        lines.append(f'# HELP {METRIC_PREFIX}_bytes_total 各处理阶段处理的字节数')
+        lines.append(f'# TYPE {METRIC_PREFIX}_bytes_total counter')
+        for stage, stats in summary.items():
+            lines.append(f'{METRIC_PREFIX}_bytes_total{{stage="{stage}"}} {stats["bytes"]}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path, extra=None):
+        """按扩展名导出：.prom/.txt为Prometheus文本，其余为JSON"""
+        if path.endswith(('.prom', '.txt')):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(dict({'stages': self.summary()}, **(extra or {})),
+                                 ensure_ascii=False, indent=2)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+
+# 进程内全局实例
+METRICS = Metrics()
+
+
+@contextmanager
+def profiling(profile_path=None, trace_memory=False, top=20):
+    """
+    单次运行的可选剖析：
+    - profile_path: 用cProfile记录并保存为pstats文件
+    - trace_memory: 用tracemalloc记录峰值内存与分配最多的代码行
+    产出一个字典，退出后填入 {'tracemalloc': {...}}（未开启则为空）
+    """
+    # 剖析模块只在开启时导入，不拖慢普通启动
+    report = {}
+    profiler = None
+    if profile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield report
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            report['tracemalloc'] = {
+                'current_mb': current / 1024 / 1024,
+                'peak_mb': peak / 1024 / 1024,
+                'top': [
+                    {'where': str(stat.traceback), 'size_kb': stat.size / 1024, 'count': stat.count}
+                    for stat in snapshot.statistics('lineno')[:top]
+                ],
+            }
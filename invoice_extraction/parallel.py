@@ -0,0 +1,417 @@
+"""
+多进程并行提取
+PDF解析与字段提取在进程池中执行，结果按输入顺序流式返回；
+合并了多张发票的PDF可展开为每张发票一条结果（见bundle）；
+有XML/OFD的发票直接读取结构化字段，不解析PDF（见einvoice）
+"""
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from .backends import get_backend
+from .bundle import group_pages, page_label, read_all_pages
+from .cache import file_digest
+from .core import read_first_page, parse_invoice_text
+from .einvoice import NotEInvoiceError, find_sources, is_structured, read_einvoice
+from .metrics import METRICS
+from .profiles import get_profile, use_profile
+from .prefetch import Prefetcher, load_pdf, parse_buffer
+from .triage import (ENCRYPTED, KIND_LABELS, NON_INVOICE, PASSWORD_REASON, TEXT, classify_bytes,
+                     classify_file, classify_text, password_error, should_probe, triage_info)
+
+NO_TEXT_ERROR = '无法提取文本（可能是扫描件）'
+
+
+def new_record(pdf_path):
+    """
+    结构化提取结果（不返回None，失败信息写入error字段）
+    {'pdf_path': 路径, 'data': 字段字典或None, 'error': 错误描述或None,
+     'error_type': 异常类型, 'io': 读取统计或None,
+     'pages': 总页数或None, 'page_range': 合并PDF中本张发票的页范围 (起始, 结束) 或None,
+     'triage': 解析前分拣信息（见triage.triage_info）或None,
+     'structured': 字段取自的XML/OFD路径或None}
+    """
+    return {'pdf_path': pdf_path, 'data': None, 'error': None, 'error_type': None, 'io': None,
+            'pages': None, 'page_range': None, 'triage': None, 'structured': None}
+
+
+def _fill_from_text(record, text):
+    if not text:
+        record['error'] = NO_TEXT_ERROR
+        record['error_type'] = 'NoText'
+    else:
+        with METRICS.timer('fields'):
+            record['data'] = parse_invoice_text(text)
+    return record
+
+
+def _reject(record, kind, reason):
+    record['triage']['kind'] = kind
+    record['triage']['reason'] = reason
+    record['error'] = f"{KIND_LABELS[kind]}: {reason}"
+    record['error_type'] = 'Rejected'
+    return record
+
+
+def _triage(record, classify, source, parse):
+    """
+    解析前分拣，返回是否可以继续解析；被拒绝的结果填写错误
+    被拒绝的文件每隔几个仍用parse解析一次并计时，用于估算分拣节省的解析时间
+    """
+    t0 = time.perf_counter()
+    kind, reason = classify(source)
+    elapsed = time.perf_counter() - t0
+    if METRICS.enabled:
+        METRICS.observe('triage', elapsed)
+    record['triage'] = triage_info(TEXT, '', elapsed)
+    if kind == TEXT:
+        return True
+    if should_probe():
+        t0 = time.perf_counter()
+        try:
+            parse()
+        except Exception:
+            pass  # 加密文件等解析失败也计入耗时
+        record['triage']['probe_seconds'] = time.perf_counter() - t0
+    _reject(record, kind, reason)
+    return False
+
+
+def fill_parsed(record, text, parse_seconds):
+    """解析完成后填写结果；分拣过的单页文件还要确认第一页像发票"""
+    info = record['triage']
+    if info is not None:
+        info['parse_seconds'] = parse_seconds
+        if text and (record['pages'] or 0) <= 1:
+            kind, reason = classify_text(text)
+            if kind != TEXT:
+                return _reject(record, kind, reason)
+    return _fill_from_text(record, text)
+
+
+def _fill_error(record, e):
+    # 分拣时未能确认空口令可打开、解析器也打不开的加密文件，与分拣拒绝的文件同样处理
+    if record['triage'] is not None and password_error(e):
+        return _reject(record, ENCRYPTED, PASSWORD_REASON)
+    record['error'] = str(e)
+    record['error_type'] = type(e).__name__
+    return record
+
+
+def extract_record(pdf_path, backend=None, input_mode='stream', count_reads=False, triage=False):
+    """
+    提取单个PDF，返回结构化结果
+    input_mode为read/mmap时先把整个文件载入内存再交给解析器
+    triage为True时先按原始字节分拣，扫描件、加密文件等不再解析
+    """
+    record = new_record(pdf_path)
+    try:
+        if input_mode == 'stream':
+            if triage and not _triage(record, classify_file, pdf_path,
+                                      partial(read_first_page, pdf_path, backend)):
+                return record
+            t0 = time.perf_counter()
+            text, record['pages'] = read_first_page(pdf_path, backend)
+            return fill_parsed(record, text, time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        buf = load_pdf(pdf_path, input_mode)
+        io_wait = time.perf_counter() - t0
+        return extract_buffer_record(buf, backend, count_reads, io_wait, triage)
+    except Exception as e:
+        return _fill_error(record, e)
+
+
+def extract_structured_record(path, source):
+    """
+    从XML/OFD（source）读取发票，结果的pdf_path仍为path（同名PDF或XML/OFD本身）
+    根元素不是数电发票的XML按非发票跳过
+    """
+    record = new_record(path)
+    record['structured'] = source
+    record['pages'] = 1
+    t0 = time.perf_counter()
+    try:
+        record['data'] = read_einvoice(source)
+    except NotEInvoiceError as e:
+        record['triage'] = triage_info(NON_INVOICE, '', time.perf_counter() - t0)
+        return _reject(record, NON_INVOICE, str(e))
+    except Exception as e:
+        return _fill_error(record, e)
+    return record
+
+
+def _with_structured(files, sources, extract_pdfs, backend, input_mode, count_reads, triage):
+    """
+    按输入顺序产出结果：有结构化来源的直接读取，其余交给extract_pdfs(文件列表)
+    同名XML/OFD读取失败的PDF在当前进程中按PDF重新提取
+    """
+    records = extract_pdfs([p for p in files if p not in sources])
+    for path in files:
+        source = sources.get(path)
+        if source is None:
+            yield next(records)
+            continue
+        record = extract_structured_record(path, source)
+        if record['error'] and not is_structured(path):
+            record = extract_record(path, backend, input_mode, count_reads, triage)
+        yield record
+
+
+def parse_buffer_record(buf, backend=None, count_reads=False, io_wait=0.0, triage=False):
+    """
+    分拣并解析已载入内存的PDF，字段留给fill_parsed填写
+    返回 (结果, 第一页文本, 解析秒数)；分拣跳过或解析失败时文本为None、结果中已写明错误
+    """
+    record = new_record(buf.pdf_path)
+    try:
+        if triage and not _triage(record, classify_bytes, buf.data,
+                                  lambda: get_backend(backend).first_page(buf.stream())):
+            buf.close()
+            return record, None, 0.0
+        t0 = time.perf_counter()
+        text, record['pages'], record['io'] = parse_buffer(buf, backend, count_reads)
+        record['io']['io_wait'] = io_wait
+        return record, text, time.perf_counter() - t0
+    except Exception as e:
+        return _fill_error(record, e), None, 0.0
+
+
+def extract_buffer_record(buf, backend=None, count_reads=False, io_wait=0.0, triage=False):
+    """提取已载入内存的PDF（预读路径使用）"""
+    record, text, parse_seconds = parse_buffer_record(buf, backend, count_reads, io_wait, triage)
+    if record['error']:
+        return record
+    try:
+        return fill_parsed(record, text, parse_seconds)
+    except Exception as e:
+        return _fill_error(record, e)
+
+
+def _collect_metrics(worker_func, pdf_path):
+    """子进程中开启计时，把本次样本随结果带回主进程"""
+    METRICS.enable()
+    record = worker_func(pdf_path)
+    record['metrics'] = METRICS.drain()
+    return record
+
+
+def resolve_workers(workers):
+    """workers为None或0时使用全部CPU核心"""
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, workers)
+
+
+def default_chunksize(total, workers):
+    """每个进程约分到4批任务，兼顾调度开销与负载均衡"""
+    return max(1, min(64, total // (workers * 4)))
+
+
+def _map_extract(pdf_files, workers, chunksize, worker_func, total=None):
+    """
+    按输入顺序产出提取结果（串行或进程池）
+    pdf_files可以是边产出边提交的迭代器，此时total为文件数的上限
+    """
+    workers = resolve_workers(workers)
+    if total is None:
+        total = len(pdf_files)
+
+    if workers == 1 or total <= 1:
+        for pdf_path in pdf_files:
+            yield worker_func(pdf_path)
+        return
+
+    workers = min(workers, total)
+    if chunksize is None:
+        chunksize = default_chunksize(total, workers)
+
+    collect = METRICS.enabled
+    if collect:
+        worker_func = partial(_collect_metrics, worker_func)
+    # 子进程加载与主进程相同的提取配置
+    with ProcessPoolExecutor(max_workers=workers, initializer=use_profile,
+                             initargs=(get_profile().path,)) as executor:
+        # Executor.map 逐个取出输入并提交（子进程随即开始解析），结果顺序与输入一致，且边完成边返回
+        for record in executor.map(worker_func, pdf_files, chunksize=chunksize):
+            if collect:
+                METRICS.merge(record.pop('metrics'))
+            yield record
+
+
+def _iter_prefetched(pdf_files, cache, backend, input_mode, prefetch, count_reads, triage):
+    """
+    串行预读路径：后台线程载入文件，当前线程解析
+    缓存键直接由已载入的内容计算，文件只读一次
+    """
+    for pdf_path, buf, error, io_wait in Prefetcher(pdf_files, input_mode, prefetch):
+        if error is not None:
+            yield _fill_error(new_record(pdf_path), error)
+            continue
+
+        key = None
+        if cache is not None:
+            key = cache.key_for_bytes(buf.data, backend)
+            data = cache.get(key)
+            if data is not None:
+                buf.close()
+                record = new_record(pdf_path)
+                record['data'] = data
+                record['pages'] = 1  # 多页PDF不缓存
+                yield record
+                continue
+
+        record = extract_buffer_record(buf, backend, count_reads, io_wait, triage)
+        if record['data'] and key is not None and record['pages'] == 1:
+            cache.put(key, record['data'])
+        yield record
+
+
+def _expand_bundles(records, workers, backend):
+    """
+    多页PDF重新按页读取并按发票号码分组：
+    只有一张发票（跨多页）时合并全部页文本解析为一条结果，
+    多张发票时每张一条，page_range标明页范围（另存为单独文件见bundle.split_records）
+    """
+    for record in records:
+        page_count = record['pages'] or 0
+        if page_count <= 1:
+            yield record
+            continue
+
+        pdf_path = record['pdf_path']
+        try:
+            texts = read_all_pages(pdf_path, page_count, backend, workers,
+                                   default_chunksize(page_count, workers))
+        except Exception as e:
+            record['data'] = None
+            yield _fill_error(record, e)
+            continue
+
+        groups = group_pages(texts)
+        if len(groups) == 1:
+            record['error'] = record['error_type'] = None
+            yield _fill_from_text(record, '\n'.join(texts))
+            continue
+        for i, (start, stop) in enumerate(groups):
+            part = new_record(pdf_path)
+            part['pages'] = page_count
+            part['page_range'] = (start, stop)
+            part['triage'] = record['triage'] if i == 0 else None  # 分拣按文件只计一次
+            _fill_from_text(part, '\n'.join(texts[start:stop]))
+            if part['error']:
+                part['error'] = f"{page_label(start, stop)}: {part['error']}"
+            yield part
+
+
+def expand_record(record, backend=None):
+    """单个文件的_expand_bundles（串行读取各页），返回结果列表"""
+    return list(_expand_bundles([record], 1, backend))
+
+
+def iter_extract(pdf_files, workers=1, chunksize=None, cache=None, backend=None,
+                 input_mode='stream', prefetch=0, count_reads=False, split_pages=False,
+                 triage=False, structured=False):
+    """
+    按输入顺序逐个产出提取结果
+    - workers: 进程数，1为串行，0/None为全部核心
+    - chunksize: 每次分发给子进程的文件数，默认自动计算
+    - cache: ExtractionCache，命中的文件不再解析（缓存只在主进程中访问）
+    - backend: PDF文本后端名称，默认DEFAULT_BACKEND
+    - input_mode: stream（直接打开文件）/ read（整读入内存）/ mmap（内存映射）
+    - prefetch: 串行时后台预读的文件数（仅read/mmap方式有效）
+    - count_reads: 统计解析器的读取请求次数（有少量开销）
+    - split_pages: 多页PDF按发票拆分为多条结果，各页在进程池中并行读取
+    - triage: 解析前按原始字节分拣，扫描件、加密文件、非发票不进入解析（见triage）
+    - structured: PDF有同目录同名的XML/OFD时改为读取其中的字段（XML/OFD输入总是直接读取）
+    """
+    pdf_files = list(pdf_files)
+    sources = find_sources(pdf_files, companions=structured)
+    if sources:
+        records = _with_structured(
+            pdf_files, sources,
+            partial(_iter_records, workers=workers, chunksize=chunksize, cache=cache,
+                    backend=backend, input_mode=input_mode, prefetch=prefetch,
+                    count_reads=count_reads, triage=triage),
+            backend, input_mode, count_reads, triage)
+    else:
+        records = _iter_records(pdf_files, workers, chunksize, cache, backend,
+                                input_mode, prefetch, count_reads, triage)
+    if split_pages:
+        records = _expand_bundles(records, resolve_workers(workers), backend)
+    return records
+
+
+def _iter_records(pdf_files, workers, chunksize, cache, backend, input_mode, prefetch,
+                  count_reads, triage):
+    """按输入顺序产出每个文件的提取结果（多页PDF只含第一页）"""
+    if input_mode != 'stream' and resolve_workers(workers) == 1:
+        yield from _iter_prefetched(pdf_files, cache, backend, input_mode, prefetch,
+                                    count_reads, triage)
+        return
+
+    worker_func = partial(extract_record, backend=backend, input_mode=input_mode,
+                          count_reads=count_reads, triage=triage)
+
+    if cache is None:
+        yield from _map_extract(pdf_files, workers, chunksize, worker_func)
+        return
+
+    workers = resolve_workers(workers)
+    keys = _iter_keys(pdf_files, cache, backend, workers)
+
+    def emit(pdf_path, key, data, extract):
+        if data is not None:
+            record = new_record(pdf_path)
+            record['data'] = data
+            record['pages'] = 1  # 多页PDF不缓存
+            return record
+        record = extract()
+        # 多页PDF可能需要拆分，只含第一页的结果不缓存
+        if record['data'] and key is not None and record['pages'] == 1:
+            cache.put(key, record['data'])
+        return record
+
+    if workers == 1 or len(pdf_files) <= 1:
+        for pdf_path, key in keys:
+            data = cache.get(key) if key is not None else None
+            yield emit(pdf_path, key, data, partial(worker_func, pdf_path))
+        return
+
+    # 查缓存（在主进程中）与分发交错进行：每查到一个未命中的文件就提交给进程池
+    looked_up = []
+
+    def misses():
+        for pdf_path, key in keys:
+            data = cache.get(key) if key is not None else None
+            looked_up.append((pdf_path, key, data))
+            if data is None:
+                yield pdf_path
+
+    results = _map_extract(misses(), workers, chunksize, worker_func, total=len(pdf_files))
+    # 取第一条结果前进程池已取完misses()，looked_up随之完整
+    first = next(results, None)
+    if first is not None:
+        results = itertools.chain([first], results)
+    for pdf_path, key, data in looked_up:
+        yield emit(pdf_path, key, data, partial(next, results))
+
+
+def _iter_keys(pdf_files, cache, backend, workers):
+    """
+    按输入顺序产出 (文件, 缓存键)：内容哈希在线程池中计算（读文件与SHA-256都会释放GIL），
+    与查缓存、分发解析重叠；读不到的文件键为None，交给解析阶段报告错误
+    """
+    def digest(pdf_path):
+        try:
+            return file_digest(pdf_path)
+        except OSError:
+            return None
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for pdf_path, value in zip(pdf_files, pool.map(digest, pdf_files)):
+            yield pdf_path, (cache.key_for_digest(value, backend) if value is not None else None)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
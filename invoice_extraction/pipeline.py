@@ -0,0 +1,400 @@
+"""
+异步分阶段流水线
+原批处理严格按阶段执行：全部提取完才写Excel，写完才重命名，结果全部留在内存中，读盘与解析也不重叠。
+这里改为asyncio各阶段同时运行，阶段之间用有界队列连接：
+    扫描 -> 读取（线程池） -> 解析（进程池或线程） -> 字段提取 -> 台账写入（按批） -> 重命名（按批）
+- 下游处理不过来（慢盘、台账写入慢）时队列写满，上游的put随之等待（反压），
+  已载入内存的PDF最多约 各队列长度 + 读取/解析并发数 个，内存不随文件数增长
+- 读取在线程中等待I/O时解析照常进行，两者重叠
+- 台账按批追加，写完的一批随即重命名；写入新Excel（-o）时只能在全部提取后写一次
+- 每张发票记录从进入流水线到重命名完成（不重命名时为写入完成）的端到端延迟，每批另记批次延迟
+有同名XML/OFD的发票在读取阶段直接读取结构化字段，不进入解析
+结果按输入顺序写入，与iter_extract一致
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .core import _no_log
+from .einvoice import find_sources, is_structured
+from .metrics import METRICS, quantile
+from .parallel import (
+    expand_record, extract_record, extract_structured_record, fill_parsed, new_record,
+    parse_buffer_record, _fill_error,
+)
+from .prefetch import load_pdf
+from .profiles import get_profile, use_profile
+
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_READ_WORKERS = 4
+DEFAULT_BATCH_SIZE = 200
+# 台账写入期间最多再攒几批（超过后等待写入完成）
+MAX_PENDING_BATCHES = 4
+
+# 队列结束标记
+_DONE = object()
+
+
+def _parse_job(buf, backend, count_reads, io_wait, triage, collect):
+    """解析执行器中的任务：分拣 + 解析第一页；进程池中开启计时时把样本带回"""
+    if collect:
+        METRICS.enable()
+    record, text, parse_seconds = parse_buffer_record(buf, backend, count_reads, io_wait, triage)
+    return record, text, parse_seconds, METRICS.drain() if collect else None
+
+
+def _journal_path(journal_path, batch_no):
+    """每批一个重命名日志：第2批起在文件名后加序号"""
+    if batch_no == 0:
+        return journal_path
+    root, ext = os.path.splitext(journal_path)
+    return f"{root}-{batch_no}{ext}"
+
+
+class PipelineStats:
+    """端到端延迟、批次与各阶段忙碌时间、队列最大深度"""
+
+    def __init__(self):
+        self.latencies = []
+        self.batches = []      # (发票数, 批次延迟, 写入秒数, 重命名秒数)
+        self.busy = {}
+        self.queue_peak = {}
+
+    def add(self, latency):
+        self.latencies.append(latency)
+
+    def add_batch(self, size, latency, sink_seconds, rename_seconds):
+        self.batches.append((size, latency, sink_seconds, rename_seconds))
+
+    def add_busy(self, stage, seconds):
+        self.busy[stage] = self.busy.get(stage, 0.0) + seconds
+
+    def observe_queue(self, name, depth):
+        if depth > self.queue_peak.get(name, 0):
+            self.queue_peak[name] = depth
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        batch_latencies = sorted(b[1] for b in self.batches)
+        count = len(self.batches) or 1
+        return {
+            'invoices': len(latencies),
+            'latency_p50_s': quantile(latencies, 0.5),
+            'latency_p95_s': quantile(latencies, 0.95),
+            'latency_max_s': latencies[-1] if latencies else 0.0,
+            'batches': len(self.batches),
+            'batch_size_avg': sum(b[0] for b in self.batches) / count,
+            'batch_latency_p50_s': quantile(batch_latencies, 0.5),
+            'batch_latency_max_s': batch_latencies[-1] if batch_latencies else 0.0,
+            'sink_s_per_batch': sum(b[2] for b in self.batches) / count,
+            'rename_s_per_batch': sum(b[3] for b in self.batches) / count,
+            'busy_s': dict(self.busy),
+            'queue_peak': dict(self.queue_peak),
+        }
+
+
+class Pipeline:
+    """
+    分阶段提取并入账
+    - ledger: 追加到总台账（按批），否则按template写出新Excel到output
+    - read_workers: 同时读取的文件数（线程）
+    - parse_workers: 解析进程数，1为在单独线程中解析，0/None为全部核心
+    - queue_size: 各阶段之间队列的长度
+    - batch_size: 每批写入台账/重命名的最少发票数（写入较慢时自动合并为更大的批）
+    - structured: PDF有同名XML/OFD时读取其中的字段（见einvoice）
+    - on_file(pdf路径, 结果列表): 每个文件按输入顺序在写入前回调（统计、日志、进度）；
+      合并PDF的结果列表中每张发票一条；回调抛出异常即中止流水线
+    - on_renamed(pdf路径, 新路径, 错误): 每个重命名结果回调
+    """
+
+    def __init__(self, template=None, output=None, ledger=None, cache=None, backend=None,
+                 input_mode='read', read_workers=DEFAULT_READ_WORKERS, parse_workers=1,
+                 queue_size=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                 count_reads=False, split_pages=True, split_dir=None, triage=True,
+                 structured=True, stream_excel=False, rename=True, rename_workers=1,
+                 rename_journal=None, on_file=None, on_renamed=None, log=_no_log):
+        self.template = template
+        self.output = output
+        self.ledger = ledger
+        self.cache = cache
+        self.backend = backend
+        self.read_workers = max(read_workers, 1)
+        self.parse_workers = parse_workers if parse_workers is not None else 0
+        if not self.parse_workers:
+            self.parse_workers = os.cpu_count() or 1
+        # 进程池要把已读入的内容传给子进程，内存映射无法传递，改为整读
+        self.input_mode = 'read' if input_mode == 'stream' or self.parse_workers > 1 else input_mode
+        self.queue_size = max(queue_size, 1)
+        self.batch_size = max(batch_size, 1)
+        self.count_reads = count_reads
+        self.split_pages = split_pages
+        self.split_dir = split_dir
+        self.triage = triage
+        self.structured = structured
+        self.listings = {}  # 查找同名XML/OFD时每个目录只列一次
+        self.stream_excel = stream_excel
+        self.rename = rename
+        self.rename_workers = rename_workers
+        self.rename_journal = rename_journal
+        self.on_file = on_file or (lambda pdf_path, records: None)
+        self.on_renamed = on_renamed or (lambda pdf_path, new_path, error: None)
+        self.log = log
+        self.stats = PipelineStats()
+        self.files = 0
+        self.duplicates = 0
+        self.result = None  # 台账或输出Excel路径
+
+    def run(self, pdf_files):
+        """处理pdf_files（可迭代，可以是边扫描边产出的生成器），返回台账或输出Excel路径"""
+        return asyncio.run(self._run(pdf_files))
+
+    async def _run(self, pdf_files):
+        loop = asyncio.get_running_loop()
+        self.io = ThreadPoolExecutor(max_workers=self.read_workers + 1,
+                                     thread_name_prefix='pipeline-io')
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pipeline-writer')
+        self.renamer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pipeline-rename')
+        if self.parse_workers > 1:
+            self.parser = ProcessPoolExecutor(max_workers=self.parse_workers,
+                                              initializer=use_profile,
+                                              initargs=(get_profile().path,))
+        else:
+            self.parser = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pipeline-parse')
+        self.loop = loop
+
+        size = self.queue_size
+        read_q, parse_q, fields_q, sink_q, rename_q = (asyncio.Queue(size) for _ in range(5))
+        # 队列按下游阶段命名（统计队列最大深度用）
+        self.queue_names = {read_q: '读取', parse_q: '解析', fields_q: '字段', sink_q: '写入',
+                            rename_q: '重命名'}
+        tasks = [
+            asyncio.ensure_future(self._scan(pdf_files, read_q)),
+            asyncio.ensure_future(self._stage('读取', self.read_workers, self._read, read_q, parse_q)),
+            asyncio.ensure_future(self._stage('解析', self.parse_workers, self._parse, parse_q, fields_q)),
+            asyncio.ensure_future(self._stage('字段', 1, self._fields, fields_q, sink_q)),
+            asyncio.ensure_future(self._sink(sink_q, rename_q)),
+            asyncio.ensure_future(self._rename(rename_q)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            self.io.shutdown(wait=True)
+            self.writer.shutdown(wait=True)
+            self.renamer.shutdown(wait=True)
+            self.parser.shutdown(wait=True, cancel_futures=True)
+        return self.result
+
+    async def _put(self, queue, item):
+        await queue.put(item)
+        self.stats.observe_queue(self.queue_names[queue], queue.qsize())
+
+    def _run_in(self, executor, func, *args):
+        return self.loop.run_in_executor(executor, func, *args)
+
+    async def _scan(self, pdf_files, read_q):
+        """扫描阶段：在线程中逐个取出文件（目录较大时扫描与后续阶段重叠）"""
+        files = iter(pdf_files)
+        seq = 0
+        while True:
+            t0 = time.perf_counter()
+            pdf_path = await self._run_in(self.io, next, files, None)
+            self.stats.add_busy('扫描', time.perf_counter() - t0)
+            if pdf_path is None:
+                break
+            await self._put(read_q, {'seq': seq, 'pdf_path': pdf_path,
+                                     'entered': time.perf_counter(), 'records': None})
+            seq += 1
+        self.files = seq
+        await read_q.put(_DONE)
+
+    async def _stage(self, name, workers, func, in_q, out_q):
+        """workers个并发的worker从in_q取任务，func处理后放入out_q"""
+
+        async def worker():
+            while True:
+                job = await in_q.get()
+                if job is _DONE:
+                    in_q.put_nowait(_DONE)  # 留给同阶段的其他worker
+                    return
+                t0 = time.perf_counter()
+                if job['records'] is None:
+                    await func(job)
+                self.stats.add_busy(name, time.perf_counter() - t0)
+                await self._put(out_q, job)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        await out_q.put(_DONE)
+
+    def _read_structured(self, pdf_path):
+        """有结构化来源时读取并返回结果，否则返回None；同名XML/OFD读取失败的PDF按PDF提取"""
+        source = find_sources([pdf_path], self.structured, self.listings).get(pdf_path)
+        if source is None:
+            return None
+        record = extract_structured_record(pdf_path, source)
+        if record['error'] and not is_structured(pdf_path):
+            record = extract_record(pdf_path, self.backend, self.input_mode, self.count_reads,
+                                    self.triage)
+        return record
+
+    async def _read(self, job):
+        """读取阶段：整读或内存映射；命中缓存、有XML/OFD的文件不再解析"""
+        pdf_path = job['pdf_path']
+        record = await self._run_in(self.io, self._read_structured, pdf_path)
+        if record is not None:
+            job['records'] = [record]
+            return
+        t0 = time.perf_counter()
+        try:
+            buf = await self._run_in(self.io, load_pdf, pdf_path, self.input_mode)
+        except OSError as e:
+            job['records'] = [_fill_error(new_record(pdf_path), e)]
+            return
+        job['io_wait'] = time.perf_counter() - t0
+        job['key'] = None
+        if self.cache is not None:
+            # 哈希计算在线程中进行（hashlib计算时释放GIL）；SQLite连接只在事件循环线程中使用
+            key = await self._run_in(self.io, self.cache.key_for_bytes, buf.data, self.backend)
+            data = self.cache.get(key)
+            if data is not None:
+                buf.close()
+                record = new_record(pdf_path)
+                record['data'] = data
+                record['pages'] = 1  # 多页PDF不缓存
+                job['records'] = [record]
+                return
+            job['key'] = key
+        job['buf'] = buf
+
+    async def _parse(self, job):
+        buf = job.pop('buf')
+        collect = METRICS.enabled and self.parse_workers > 1
+        record, text, parse_seconds, metrics = await self._run_in(
+            self.parser, _parse_job, buf, self.backend, self.count_reads, job['io_wait'],
+            self.triage, collect)
+        if metrics:
+            METRICS.merge(metrics)
+        job['parsed'] = (record, text, parse_seconds)
+
+    async def _fields(self, job):
+        """字段提取；多页PDF按发票拆分，每张另存为单独的PDF"""
+        record, text, parse_seconds = job.pop('parsed')
+        if not record['error']:
+            try:
+                fill_parsed(record, text, parse_seconds)
+            except Exception as e:
+                _fill_error(record, e)
+        if record['data'] and job['key'] is not None and record['pages'] == 1:
+            self.cache.put(job['key'], record['data'])
+        records = [record]
+        if self.split_pages and (record['pages'] or 0) > 1:
+            records = await self._run_in(self.parser, expand_record, record, self.backend)
+            if any(r['page_range'] for r in records):
+                from .bundle import split_records
+                await self._run_in(self.io, split_records, records, self.split_dir, self.log)
+        job['records'] = records
+
+    async def _sink(self, sink_q, rename_q):
+        """
+        按输入顺序攒批写入：台账每满batch_size张追加一次，新Excel在全部结果到齐后写一次
+        台账每次追加都要重写整个文件，上一批还在写时继续攒（组提交），写入越慢每批越大、
+        重写次数越少；攒到MAX_PENDING_BATCHES批仍未写完才等待，队列随之写满，反压到上游
+        """
+        pending = {}
+        next_seq = 0
+        batch = []
+        items = []
+        writing = None
+        while True:
+            job = await sink_q.get()
+            if job is _DONE:
+                break
+            pending[job['seq']] = job
+            while next_seq in pending:
+                job = pending.pop(next_seq)
+                next_seq += 1
+                self.on_file(job['pdf_path'], job['records'])
+                for record in job['records']:
+                    if record['data']:
+                        items.append((record['pdf_path'], record['data']))
+                batch.append(job)
+            if not self.ledger or len(items) < self.batch_size:
+                continue
+            if writing is not None:
+                if not writing.done() and len(items) < self.batch_size * MAX_PENDING_BATCHES:
+                    continue
+                await writing
+            writing = asyncio.ensure_future(self._flush(batch, items, rename_q))
+            batch, items = [], []
+
+        if writing is not None:
+            await writing
+        if items:
+            await self._flush(batch, items, rename_q)
+        await rename_q.put(_DONE)
+
+    async def _flush(self, jobs, items, rename_q):
+        t0 = time.perf_counter()
+        if self.ledger:
+            from .ledger import append_to_ledger
+            result = await self._run_in(self.writer, append_to_ledger, self.ledger, items,
+                                        self.template, None, self.log)
+            self.duplicates += len(result['duplicates'])
+            self.result = result['output']
+            # 已在台账中的发票没有写入，不改名（改名会与已入账的同一张发票撞名）
+            skipped = {pdf_path for pdf_path, _, _ in result['duplicates']}
+            if skipped:
+                items = [item for item in items if item[0] not in skipped]
+        else:
+            # Excel写入模块依赖openpyxl（导入较慢），用到时才导入
+            if self.stream_excel:
+                from .excel_stream import write_to_excel_streaming as writer
+            else:
+                from .core import write_to_excel as writer
+            self.result = await self._run_in(self.writer, writer, self.template,
+                                             [data for _, data in items], self.output, self.log)
+        sink_seconds = time.perf_counter() - t0
+        self.stats.add_busy('写入', sink_seconds)
+        await self._put(rename_q, (jobs, items, sink_seconds))
+
+    async def _rename(self, rename_q):
+        """重命名阶段：写入完成的一批随即改名，与下一批的提取、写入重叠"""
+        from .rename import batch_rename, default_journal_path
+
+        journal = self.rename_journal
+        batch_no = 0
+        while True:
+            entry = await rename_q.get()
+            if entry is _DONE:
+                return
+            jobs, items, sink_seconds = entry
+            t0 = time.perf_counter()
+            if self.rename:
+                journal = journal or default_journal_path()
+                try:
+                    results = await self._run_in(self.renamer, batch_rename, items,
+                                                 _journal_path(journal, batch_no),
+                                                 self.rename_workers, self.log)
+                except Exception as e:
+                    self.log(f"错误: 重命名失败: {e}")
+                    results = {pdf_path: (None, str(e)) for pdf_path, _ in items}
+                for pdf_path, (new_path, error) in results.items():
+                    self.on_renamed(pdf_path, new_path, error)
+                batch_no += 1
+                self.stats.add_busy('重命名', time.perf_counter() - t0)
+            now = time.perf_counter()
+            rename_seconds = now - t0
+            count = 0
+            for job in jobs:
+                for record in job['records']:
+                    if record['data']:
+                        self.stats.add(now - job['entered'])
+                        count += 1
+            if jobs:
+                self.stats.add_batch(count, now - min(job['entered'] for job in jobs),
+                                     sink_seconds, rename_seconds)
@@ -0,0 +1,292 @@
+"""
+批量重命名
+rename_pdf逐个文件用os.path.exists循环找可用文件名再shutil.move，
+网络共享上每张发票要往返多次。这里改为：
+- 每个目标目录只用os.scandir列一次，冲突在内存中解决
+- 执行前先把完整计划写入日志（journal），再批量（可选线程池）执行
+- 根据日志可回滚或在中断后继续
+- PDF的同名XML/OFD随PDF一起改名，保持配对；单独输入的XML/OFD保留原扩展名
+
+命令行:
+    python -m invoice_extraction.rename resume 日志.jsonl
+    python -m invoice_extraction.rename rollback 日志.jsonl
+"""
+import argparse
+import errno
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import default_cache_dir
+from .core import build_new_name, _no_log
+from .einvoice import STRUCTURED_EXTS, companion_names, is_structured
+from .metrics import METRICS
+
+JOURNAL_VERSION = 1
+# 完成记录每累积多少条刷新一次日志文件
+FLUSH_EVERY = 100
+
+
+def default_journal_path():
+    """默认日志路径：用户缓存目录/rename_journal/时间戳.jsonl"""
+    directory = os.path.join(default_cache_dir(), 'rename_journal')
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, time.strftime('%Y%m%d-%H%M%S') + f'-{os.getpid()}.jsonl')
+
+
+def _list_names(directory):
+    """单次列目录，返回规范化后的文件名集合（Windows下不区分大小写）"""
+    try:
+        with os.scandir(directory or '.') as it:
+            return {os.path.normcase(entry.name) for entry in it}
+    except FileNotFoundError:
+        return set()
+
+
+def plan_renames(items):
+    """
+    为 [(pdf路径, 发票数据)] 生成重命名计划 [(原路径, 新路径)]
+    命名规则与冲突后缀（_1、_2…）与rename_pdf一致；文件名已符合规则的不再改名
+    同名的XML/OFD紧随其PDF之后改为相同的文件名主干（冲突后缀对所有扩展名同时选取）
+    """
+    listings = {}
+    plan = []
+    for pdf_path, data in items:
+        dir_name = os.path.dirname(pdf_path)
+        taken = listings.get(dir_name)
+        if taken is None:
+            taken = listings[dir_name] = _list_names(dir_name)
+
+        base_name = os.path.basename(pdf_path)
+        new_name = build_new_name(data)
+        companions = []
+        if is_structured(pdf_path):
+            new_name = os.path.splitext(new_name)[0] + os.path.splitext(pdf_path)[1].lower()
+        else:
+            companions = companion_names(base_name, taken)
+        if os.path.normcase(new_name) == os.path.normcase(base_name):
+            continue
+        name, ext = os.path.splitext(new_name)
+        exts = [ext] + [os.path.splitext(c)[1] for c in companions]
+        # 新主干下不能已有PDF或XML/OFD，否则会与不相干的文件配成一对
+        checked = set(exts) | {'.pdf', *STRUCTURED_EXTS}
+        stem = name
+        counter = 1
+        while any(os.path.normcase(stem + e) in taken for e in checked):
+            stem = f"{name}_{counter}"
+            counter += 1
+        for e in exts:
+            taken.add(os.path.normcase(stem + e))
+        plan.append((pdf_path, os.path.join(dir_name, stem + ext)))
+        for companion, e in zip(companions, exts[1:]):
+            plan.append((os.path.join(dir_name, companion), os.path.join(dir_name, stem + e)))
+    return plan
+
+
+class RenameJournal:
+    """
+    重命名日志（JSON Lines）：
+    首行为计划头，随后每行一个操作 {"op": 序号, "src", "dst"}，
+    执行/回滚时追加 {"done"|"failed"|"undone": 序号}
+    """
+
+    def __init__(self, path, ops, status=None):
+        self.path = path
+        self.ops = ops
+        self.status = status or {}
+        self.file = None
+        self.pending = 0
+
+    @classmethod
+    def create(cls, path, ops):
+        """写入完整计划并落盘，之后才允许执行"""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'version': JOURNAL_VERSION, 'created': time.time(),
+                                'ops': len(ops)}) + '\n')
+            for i, (src, dst) in enumerate(ops):
+                f.write(json.dumps({'op': i, 'src': src, 'dst': dst}, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        return cls(path, ops)
+
+    @classmethod
+    def load(cls, path):
+        ops = []
+        status = {}
+        with open(path, encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != JOURNAL_VERSION:
+                raise ValueError(f"不支持的日志版本: {header.get('version')}")
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # 中断时写了一半的末行
+                if 'op' in entry:
+                    ops.append((entry['src'], entry['dst']))
+                else:
+                    for state in ('done', 'failed', 'undone'):
+                        if state in entry:
+                            status[entry[state]] = state
+        return cls(path, ops, status)
+
+    def mark(self, i, state, error=None):
+        self.status[i] = state
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+        entry = {state: i}
+        if error:
+            entry['error'] = error
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.pending += 1
+        if self.pending >= FLUSH_EVERY:
+            self.file.flush()
+            self.pending = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def _exists_error(dst):
+    return FileExistsError(errno.EEXIST, '目标文件已存在（计划生成后才出现），未覆盖', dst)
+
+
+def _move(src, dst):
+    """
+    不覆盖已有文件的改名：先硬链接到新名再删除原名，目标已存在时link失败
+    （POSIX上os.rename会静默覆盖计划生成后才出现的同名文件）；
+    文件系统不支持硬链接时改名前检查目标，跨设备时复制+删除
+    """
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        # 上次在link与unlink之间中断：两个名字指向同一文件，删除原名即可
+        if not os.path.samefile(src, dst):
+            raise _exists_error(dst)
+    except OSError as e:
+        if os.path.lexists(dst):
+            raise _exists_error(dst) from e
+        if e.errno == errno.EXDEV:
+            shutil.move(src, dst)
+        else:
+            os.rename(src, dst)  # 不支持硬链接（FAT、部分网络共享）
+        return
+    os.unlink(src)
+
+
+def _run_ops(journal, indices, func, state, workers, log):
+    """对indices中的操作执行func(i)，边完成边记入日志，返回 {序号: 错误或None}"""
+    errors = {}
+
+    def task(i):
+        t0 = time.perf_counter()
+        try:
+            func(i)
+            return i, None, time.perf_counter() - t0
+        except OSError as e:
+            return i, str(e), time.perf_counter() - t0
+
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 and len(indices) > 1 else None
+    try:
+        results = executor.map(task, indices) if executor else map(task, indices)
+        for i, error, elapsed in results:
+            if METRICS.enabled:
+                METRICS.observe('rename', elapsed)
+            errors[i] = error
+            journal.mark(i, 'failed' if error else state, error)
+            if error:
+                log(f"  ✗ {os.path.basename(journal.ops[i][0])}: {error}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        journal.close()
+    return errors
+
+
+def batch_rename(items, journal_path=None, workers=1, log=_no_log):
+    """
+    批量重命名 [(pdf路径, 发票数据)]
+    返回 {pdf路径: (新路径或None, 错误或None)}，每个结果只对应它自己的源文件
+    """
+    with METRICS.timer('rename_plan'):
+        ops = plan_renames(items)
+    results = {pdf_path: (pdf_path, None) for pdf_path, _ in items}
+    if not ops:
+        return results
+
+    journal = RenameJournal.create(journal_path or default_journal_path(), ops)
+    log(f"  重命名日志: {journal.path}")
+    errors = _run_ops(journal, range(len(ops)), lambda i: _move(*ops[i]), 'done', workers, log)
+    for i, (src, dst) in enumerate(ops):
+        if src not in results:
+            continue  # 随PDF改名的XML/OFD
+        error = errors.get(i)
+        results[src] = (None, error) if error else (dst, None)
+    return results
+
+
+def resume_renames(journal_path, workers=1, log=_no_log):
+    """中断后继续执行日志中未完成的重命名，返回失败数"""
+    journal = RenameJournal.load(journal_path)
+    ops = journal.ops
+
+    def pending(i):
+        # 中断可能发生在改名之后、记录之前：目标已存在且源已不在视为完成
+        if journal.status.get(i) == 'done':
+            return False
+        src, dst = ops[i]
+        if not os.path.exists(src) and os.path.exists(dst):
+            journal.mark(i, 'done')
+            return False
+        return True
+
+    todo = [i for i in range(len(ops)) if pending(i)]
+    errors = _run_ops(journal, todo, lambda i: _move(*ops[i]), 'done', workers, log)
+    log(f"继续执行 {len(todo)} 项，失败 {sum(1 for e in errors.values() if e)} 项")
+    return sum(1 for e in errors.values() if e)
+
+
+def rollback_renames(journal_path, workers=1, log=_no_log):
+    """按日志把已完成的重命名改回原名，返回失败数"""
+    journal = RenameJournal.load(journal_path)
+    ops = journal.ops
+
+    def undo(i):
+        src, dst = ops[i]
+        if os.path.exists(src):
+            raise FileExistsError(f"原文件名已被占用: {src}")
+        _move(dst, src)
+
+    # 中断时可能有已改名但未记录的操作，一并检查
+    todo = [i for i in range(len(ops))
+            if journal.status.get(i) == 'done'
+            or (journal.status.get(i) is None and os.path.exists(ops[i][1])
+                and not os.path.exists(ops[i][0]))]
+    errors = _run_ops(journal, todo, undo, 'undone', workers, log)
+    log(f"回滚 {len(todo)} 项，失败 {sum(1 for e in errors.values() if e)} 项")
+    return sum(1 for e in errors.values() if e)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='invoice_extraction.rename',
+                                     description='按重命名日志继续执行或回滚')
+    parser.add_argument('action', choices=('resume', 'rollback'))
+    parser.add_argument('journal', help='重命名日志路径')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='并行改名线程数')
+    args = parser.parse_args(argv)
+
+    def log(message):
+        print(message, file=sys.stderr)
+
+    func = resume_renames if args.action == 'resume' else rollback_renames
+    # 有失败项时返回3，与命令行入口的部分失败退出码一致
+    return 3 if func(args.journal, args.workers, log) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
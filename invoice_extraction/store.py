@@ -0,0 +1,302 @@
+"""
+列式发票结果存储
+每张发票一个字典（十几个字符串）在百万级对账时内存占用大，也无法对整批做校验。
+这里按列保存：
+- 数电发票号码：定长20字节（非ASCII或超长的号码原样另存，列中留空，校验时报告）
+- 销方/购方/开票人等重复度高的字符串：驻留到字符串表，列中只存编号
+- 金额/税额/价税合计：整数分（array('q')），开票日期：YYYYMMDD整数
+在列上做整批校验（金额+税额=价税合计、税率、重复号码、日期范围）和按销方/月份小计，
+校验在安装了numpy时对整列向量化计算（零拷贝引用array的缓冲区），否则逐行计算；
+并可导出CSV；row()/迭代仍返回与parse_invoice_text相同结构的字典，可直接写入Excel
+"""
+import csv
+from array import array
+
+INVOICE_NO_WIDTH = 20
+# 缺失金额的占位值
+MISSING = -(2 ** 63)
+# 常见增值税税率
+DEFAULT_TAX_RATES = (0.13, 0.09, 0.06, 0.05, 0.03, 0.01, 0.0)
+
+# 驻留字符串的字段
+STRING_FIELDS = ('seller_name', 'seller_tax_no', 'buyer_name', 'buyer_tax_no',
+                 'drawer', 'item_name', 'remark', 'month')
+AMOUNT_FIELDS = ('amount', 'tax', 'total')
+# 导出与row()的字段顺序（与parse_invoice_text的结果一致）
+FIELDS = ('invoice_no', 'date', 'seller_name', 'seller_tax_no', 'buyer_name', 'buyer_tax_no',
+          'total', 'amount', 'tax', 'drawer', 'item_name', 'remark', 'month')
+
+
+def _numpy():
+    """已安装numpy时返回该模块（用到时才导入，不影响启动），否则返回None"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def to_cents(text):
+    """'1,234.56' -> 123456；空值返回MISSING（不经过float，避免舍入误差）"""
+    if not text:
+        return MISSING
+    text = text.replace(',', '').strip()
+    negative = text.startswith('-')
+    whole, _, frac = text.lstrip('-').partition('.')
+    cents = int(whole or 0) * 100 + int((frac + '00')[:2])
+    return -cents if negative else cents
+
+
+def from_cents(cents):
+    """123456 -> '1234.56'；MISSING返回空字符串"""
+    if cents == MISSING:
+        return ''
+    sign = '-' if cents < 0 else ''
+    cents = abs(cents)
+    return f"{sign}{cents // 100}.{cents % 100:02d}"
+
+
+def _date_to_int(text):
+    """'2026-03-15' -> 20260315，空值为0"""
+    return int(text.replace('-', '')) if text else 0
+
+
+def _int_to_date(value):
+    if not value:
+        return ''
+    return f"{value // 10000:04d}-{value // 100 % 100:02d}-{value % 100:02d}"
+
+
+class StringTable:
+    """字符串驻留表：相同字符串只保存一份"""
+
+    def __init__(self):
+        self.values = []
+        self.index = {}
+
+    def intern(self, value):
+        idx = self.index.get(value)
+        if idx is None:
+            idx = self.index[value] = len(self.values)
+            self.values.append(value)
+        return idx
+
+    def __len__(self):
+        return len(self.values)
+
+
+class InvoiceStore:
+    """列式发票结果容器"""
+
+    def __init__(self, records=None):
+        self.invoice_no = bytearray()
+        self.date = array('i')
+        self.strings = StringTable()
+        self.ids = {field: array('I') for field in STRING_FIELDS}
+        self.cents = {field: array('q') for field in AMOUNT_FIELDS}
+        # 放不进定长列的发票号码 {行号: 原文}
+        self.bad_invoice_nos = {}
+        if records is not None:
+            self.extend(records)
+
+    def __len__(self):
+        return len(self.date)
+
+    def append(self, data):
+        """追加一条parse_invoice_text结构的结果"""
+        text = data.get('invoice_no') or ''
+        try:
+            no = text.encode('ascii')
+        except UnicodeEncodeError:
+            no = None
+        if no is None or len(no) > INVOICE_NO_WIDTH:
+            # 识别出错的号码不中断整批：列中留空，由check_invoice_nos报告
+            self.bad_invoice_nos[len(self)] = text
+            no = b''
+        self.invoice_no += no.ljust(INVOICE_NO_WIDTH, b'\0')
+        self.date.append(_date_to_int(data.get('date')))
+        intern = self.strings.intern
+        for field in STRING_FIELDS:
+            self.ids[field].append(intern(data.get(field) or ''))
+        for field in AMOUNT_FIELDS:
+            self.cents[field].append(to_cents(data.get(field)))
+
+    def extend(self, records):
+        for data in records:
+            self.append(data)
+
+    def invoice_no_at(self, i):
+        if i in self.bad_invoice_nos:
+            return self.bad_invoice_nos[i]
+        start = i * INVOICE_NO_WIDTH
+        return self.invoice_no[start:start + INVOICE_NO_WIDTH].rstrip(b'\0').decode('ascii')
+
+    def column(self, field):
+        """按字段取整列的Python值（字符串列解码驻留编号）"""
+        if field == 'invoice_no':
+            return [self.invoice_no_at(i) for i in range(len(self))]
+        if field == 'date':
+            return [_int_to_date(v) for v in self.date]
+        if field in self.cents:
+            return [from_cents(v) for v in self.cents[field]]
+        values = self.strings.values
+        return [values[i] for i in self.ids[field]]
+
+    def row(self, i):
+        """第i条结果，结构与parse_invoice_text相同"""
+        values = self.strings.values
+        data = {'invoice_no': self.invoice_no_at(i), 'date': _int_to_date(self.date[i])}
+        for field in STRING_FIELDS:
+            data[field] = values[self.ids[field][i]]
+        for field in AMOUNT_FIELDS:
+            data[field] = from_cents(self.cents[field][i])
+        return data
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def nbytes(self):
+        """列数据占用的字节数（不含字符串表）"""
+        total = len(self.invoice_no) + self.date.itemsize * len(self.date)
+        for col in list(self.ids.values()) + list(self.cents.values()):
+            total += col.itemsize * len(col)
+        return total
+
+    # ---- 校验 ----
+
+    def check_totals(self, tolerance_cents=0):
+        """金额+税额≠价税合计的行号（任一金额缺失也算）"""
+        np = _numpy()
+        if np is not None:
+            cols = self.to_numpy()
+            a, t, s = cols['amount'], cols['tax'], cols['total']
+            missing = (a == MISSING) | (t == MISSING) | (s == MISSING)
+            # 缺失值先置0再相加，避免占位值溢出
+            a, t, s = (np.where(missing, 0, col) for col in (a, t, s))
+            return np.flatnonzero(missing | (np.abs(a + t - s) > tolerance_cents)).tolist()
+
+        amount, tax, total = self.cents['amount'], self.cents['tax'], self.cents['total']
+        return [i for i, (a, t, s) in enumerate(zip(amount, tax, total))
+                if a == MISSING or t == MISSING or s == MISSING
+                or abs(a + t - s) > tolerance_cents]
+
+    def check_tax_rates(self, rates=DEFAULT_TAX_RATES, tolerance_cents=1):
+        """税额与金额×任一常见税率都不符的行号（缺失金额的行由check_totals报告）"""
+        np = _numpy()
+        if np is not None:
+            cols = self.to_numpy()
+            a, t = cols['amount'], cols['tax']
+            present = (a != MISSING) & (t != MISSING)
+            a = np.where(present, a, 0).astype(np.float64)
+            t = np.where(present, t, 0).astype(np.float64)
+            matched = np.zeros(len(a), dtype=bool)
+            for r in rates:
+                matched |= np.abs(a * r - t) <= tolerance_cents
+            return np.flatnonzero(present & ~matched).tolist()
+
+        bad = []
+        for i, (a, t) in enumerate(zip(self.cents['amount'], self.cents['tax'])):
+            if a == MISSING or t == MISSING:
+                continue
+            if not any(abs(a * r - t) <= tolerance_cents for r in rates):
+                bad.append(i)
+        return bad
+
+    def duplicate_invoice_nos(self):
+        """{重复的发票号码: [行号, ...]}（空号码不计），按首次出现的顺序"""
+        np = _numpy()
+        if np is not None and len(self):
+            nos = self.to_numpy()['invoice_no']
+            order = np.argsort(nos, kind='stable')  # 同一号码的行号保持升序
+            ordered = nos[order]
+            starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+            ends = np.r_[starts[1:], len(ordered)]
+            groups = [(order[start], start, end) for start, end in zip(starts, ends)
+                      if end - start > 1 and ordered[start]]
+            return {ordered[start].decode('ascii'): order[start:end].tolist()
+                    for _, start, end in sorted(groups)}
+
+        seen = {}
+        width = INVOICE_NO_WIDTH
+        raw = bytes(self.invoice_no)
+        for i in range(len(self)):
+            key = raw[i * width:(i + 1) * width]
+            if key.strip(b'\0'):
+                seen.setdefault(key, []).append(i)
+        return {k.rstrip(b'\0').decode('ascii'): rows for k, rows in seen.items() if len(rows) > 1}
+
+    def check_invoice_nos(self):
+        """发票号码含非ASCII字符或超过定长的行号"""
+        return sorted(self.bad_invoice_nos)
+
+    def check_dates(self, start=None, end=None):
+        """开票日期缺失或不在[start, end]内的行号，start/end为'YYYY-MM-DD'"""
+        lo = _date_to_int(start) if start else 0
+        hi = _date_to_int(end) if end else 99999999
+        np = _numpy()
+        if np is not None:
+            d = self.to_numpy()['date']
+            return np.flatnonzero((d == 0) | (d < lo) | (d > hi)).tolist()
+        return [i for i, d in enumerate(self.date) if not d or d < lo or d > hi]
+
+    def validate(self, start=None, end=None, rates=DEFAULT_TAX_RATES):
+        """全部校验，返回 {校验名: 行号列表或重复号码字典}"""
+        return {
+            'totals': self.check_totals(),
+            'tax_rates': self.check_tax_rates(rates),
+            'duplicates': self.duplicate_invoice_nos(),
+            'dates': self.check_dates(start, end),
+            'invoice_nos': self.check_invoice_nos(),
+        }
+
+    # ---- 汇总 ----
+
+    def _subtotal(self, keys):
+        """按keys分组累加 (张数, 金额分, 税额分, 价税合计分)，缺失金额按0计"""
+        groups = {}
+        amount, tax, total = self.cents['amount'], self.cents['tax'], self.cents['total']
+        for key, a, t, s in zip(keys, amount, tax, total):
+            g = groups.get(key)
+            if g is None:
+                g = groups[key] = [0, 0, 0, 0]
+            g[0] += 1
+            g[1] += a if a != MISSING else 0
+            g[2] += t if t != MISSING else 0
+            g[3] += s if s != MISSING else 0
+        return groups
+
+    def subtotal_by_seller(self):
+        """{销方名称: [张数, 金额分, 税额分, 价税合计分]}"""
+        values = self.strings.values
+        groups = self._subtotal(self.ids['seller_name'])
+        return {values[k]: v for k, v in groups.items()}
+
+    def subtotal_by_month(self):
+        """{开票月份'YYYY-MM': [张数, 金额分, 税额分, 价税合计分]}（无日期为''）"""
+        groups = self._subtotal(d // 100 for d in self.date)
+        return {(f"{k // 100:04d}-{k % 100:02d}" if k else ''): v for k, v in sorted(groups.items())}
+
+    # ---- 导出 ----
+
+    def to_csv(self, path):
+        """导出CSV（UTF-8带BOM，Excel可直接打开），列顺序见FIELDS"""
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            columns = [self.column(field) for field in FIELDS]
+            writer.writerows(zip(*columns))
+        return path
+
+    def to_numpy(self):
+        """各列转为NumPy数组（需要安装numpy），字符串列为驻留编号"""
+        import numpy as np
+        result = {
+            'invoice_no': np.frombuffer(bytes(self.invoice_no), dtype=f'S{INVOICE_NO_WIDTH}'),
+            'date': np.frombuffer(self.date, dtype=np.int32),
+        }
+        for field, col in self.ids.items():
+            result[field] = np.frombuffer(col, dtype=np.uint32)
+        for field, col in self.cents.items():
+            result[field] = np.frombuffer(col, dtype=np.int64)
+        return result
@@ -0,0 +1,419 @@
+"""
+解析前分拣
+收件箱中常有两三成是扫描件或不是发票的PDF，完整解析后才发现提取不到文字很浪费。
+这里只读交叉引用表与各对象的字典部分（不解析页面、不解压内容流），把文件分为：
+- text: 文本型，交给PDF后端解析
+- image: 没有字体（扫描件或纯图片），不可能提取出文字
+- encrypted: 已加密且需要打开口令（只设了权限口令的文件解析器能直接读取，不算）；
+  分拣只确认空口令能打开的文件，算不出或不符时交给解析器，解析器报口令错误时同样归为此类
+- non_invoice: 不是PDF文件，或解析出的第一页文本中没有发票特征
+拿不准的（如对象藏在压缩对象流中）一律按文本型处理，分拣只会少拒、不会误拒
+"""
+import csv
+import hashlib
+import itertools
+import mmap
+import os
+import re
+
+from .fields import find_invoice_no
+
+TEXT = 'text'
+IMAGE_ONLY = 'image'
+ENCRYPTED = 'encrypted'
+NON_INVOICE = 'non_invoice'
+
+KIND_LABELS = {
+    TEXT: '文本型发票',
+    IMAGE_ONLY: '扫描件/纯图片',
+    ENCRYPTED: '已加密',
+    NON_INVOICE: '非发票',
+}
+
+# PDF文件头可以在前1024字节内的任意位置
+HEADER_WINDOW = 1024
+# startxref在文件末尾1024字节内
+TAIL_WINDOW = 1024
+# 对象字典只看开头这么多字节（到stream或endobj为止）
+OBJECT_PEEK = 2048
+# 交叉引用表增量更新（/Prev）最多跟随的层数
+MAX_XREF_SECTIONS = 32
+# 每拒绝这么多个文件仍解析其中一个，实测被跳过文件的解析耗时（每个进程的第一个必测）
+PROBE_EVERY = 20
+
+STARTXREF_RE = re.compile(rb'startxref\s+(\d+)')
+# 交叉引用表中的条目（10位偏移 5位代数 n/f）或子段头（起始对象号 对象数）
+XREF_TOKEN_RE = re.compile(rb'(\d{10}) \d{5} ([nf])|(\d+) (\d+)')
+PREV_RE = re.compile(rb'/Prev\s+(\d+)')
+ENCRYPT_RE = re.compile(rb'/Encrypt\s*(?:(\d+)\s+\d+\s+R|<<)')
+OBJECT_START_RE = re.compile(rb'\s*\d+\s+\d+\s+obj')
+
+# 解析器表示需要口令的异常（按类名判断，不导入各后端）
+PASSWORD_ERRORS = ('FileNotDecryptedError', 'PDFPasswordIncorrect')
+PASSWORD_REASON = '需要打开口令'
+UNVERIFIED_ENCRYPTION = '已加密，未能确认空口令可打开，由解析器判断'
+
+# 标准安全处理器的口令填充串（PDF 32000-1 7.6.3.3）
+PASSWORD_PAD = bytes.fromhex(
+    '28bf4e5e4e758a4164004e56fffa01082e2e00b6d0683e802f0ca9fe6453697a')
+LITERAL_ESCAPES = {ord('n'): b'\n', ord('r'): b'\r', ord('t'): b'\t', ord('b'): b'\b',
+                   ord('f'): b'\f'}
+
+
+def _xref_sections(data):
+    """
+    读取经典交叉引用表，返回 ({对象号: 偏移}, [尾部字典，新的在前])
+    交叉引用流（PDF 1.5+）或表损坏时返回None，由解析器处理
+    """
+    pos = data.rfind(b'startxref', max(len(data) - TAIL_WINDOW, 0))
+    match = STARTXREF_RE.match(data[pos:pos + 32]) if pos >= 0 else None
+    if match is None:
+        return None
+    xref = int(match.group(1))
+    offsets = {}
+    trailers = []
+    for _ in range(MAX_XREF_SECTIONS):
+        if data[xref:xref + 4] != b'xref':
+            return None
+        end = data.find(b'trailer', xref)
+        if end < 0:
+            return None
+        num = 0
+        for token in XREF_TOKEN_RE.finditer(data[xref + 4:end]):
+            if token.group(3) is not None:
+                num = int(token.group(3))  # 子段头
+                continue
+            if token.group(2) == b'n':
+                offsets.setdefault(num, int(token.group(1)))  # 增量更新中较新的优先
+            num += 1
+        stop = data.find(b'startxref', end)
+        trailer = data[end:stop if stop > 0 else end + OBJECT_PEEK]
+        if b'/XRefStm' in trailer:
+            return None  # 混合交叉引用，部分对象在流中
+        trailers.append(trailer)
+        prev = PREV_RE.search(trailer)
+        if prev is None:
+            return offsets, trailers
+        xref = int(prev.group(1))
+    return None
+
+
+def _object_header(data, offset):
+    """对象的字典部分（不含流数据）"""
+    head = data[offset:offset + OBJECT_PEEK]
+    for marker in (b'stream', b'endobj'):
+        stop = head.find(marker)
+        if stop >= 0:
+            head = head[:stop]
+    return head
+
+
+def _pdf_string(buf, pos):
+    """解析buf[pos]开始的十六进制串<...>或字面串(...)，返回bytes；格式不对返回None"""
+    if buf[pos:pos + 1] == b'<':
+        end = buf.find(b'>', pos)
+        if end < 0:
+            return None
+        digits = re.sub(rb'\s', b'', buf[pos + 1:end])
+        try:
+            return bytes.fromhex((digits + b'0' * (len(digits) % 2)).decode('ascii'))
+        except ValueError:
+            return None
+    if buf[pos:pos + 1] != b'(':
+        return None
+    out = bytearray()
+    depth = 0
+    i = pos + 1
+    while i < len(buf):
+        c = buf[i]
+        if c == 0x5C:  # 反斜杠转义
+            i += 1
+            nxt = buf[i:i + 1]
+            if nxt.isdigit():
+                octal = re.match(rb'[0-7]{1,3}', buf[i:i + 3]).group()
+                out.append(int(octal, 8) & 0xFF)
+                i += len(octal)
+                continue
+            if nxt in (b'\r', b'\n'):  # 续行
+                i += 2 if buf[i:i + 2] == b'\r\n' else 1
+                continue
+            out += LITERAL_ESCAPES.get(buf[i], nxt) if nxt else b''
+        elif c == 0x28:
+            depth += 1
+            out.append(c)
+        elif c == 0x29:
+            if depth == 0:
+                return bytes(out)
+            depth -= 1
+            out.append(c)
+        else:
+            out.append(c)
+        i += 1
+    return None
+
+
+def _string_value(buf, key):
+    match = re.search(rb'/' + key + rb'\s*([(<])(?!<)', buf)
+    return _pdf_string(buf, match.start(1)) if match else None
+
+
+def _int_value(buf, key, default=None):
+    match = re.search(rb'/' + key + rb'\s+(-?\d+)', buf)
+    return int(match.group(1)) if match else default
+
+
+def _split_dict(buf):
+    """
+    把buf中第一个字典分为 (顶层部分, 嵌套字典部分)，跳过其中的字符串
+    避免把嵌套字典（如/CF中加密过滤器的/Length）当成顶层的键
+    """
+    start = buf.find(b'<<')
+    if start < 0:
+        return b'', b''
+    top = bytearray()
+    nested = bytearray()
+    depth = 0
+    i = start
+    while i < len(buf):
+        pair = buf[i:i + 2]
+        c = buf[i:i + 1]
+        if pair == b'<<':
+            depth += 1
+            i += 2
+            continue
+        if pair == b'>>':
+            depth -= 1
+            i += 2
+            if depth == 0:
+                break
+            continue
+        if c == b'(':
+            # 字面串：成对括号与反斜杠转义
+            end, level = i + 1, 1
+            while end < len(buf) and level:
+                ch = buf[end:end + 1]
+                if ch == b'\\':
+                    end += 1
+                elif ch == b'(':
+                    level += 1
+                elif ch == b')':
+                    level -= 1
+                end += 1
+        elif c == b'<':
+            end = buf.find(b'>', i)
+            end = len(buf) if end < 0 else end + 1
+        else:
+            end = i + 1
+        (top if depth == 1 else nested).extend(buf[i:end])
+        i = end
+    return bytes(top), bytes(nested)
+
+
+def _key_length(top, nested, revision):
+    """文件密钥字节数：R2为5；R3取顶层/Length（位）；R4取加密过滤器（AESV2为16，/Length为字节数）"""
+    if revision == 2:
+        return 5
+    if revision == 4:
+        if b'/AESV2' in nested:
+            return 16
+        length = _int_value(nested, b'Length', 16)
+        return length // 8 if length > 16 else length  # 少数生成器按位写
+    length = _int_value(top, b'Length', 40)
+    return length // 8 if length >= 40 else length
+
+
+def _rc4(key, data):
+    state = list(range(256))
+    j = 0
+    for i in range(256):
+        j = (j + state[i] + key[i % len(key)]) & 0xFF
+        state[i], state[j] = state[j], state[i]
+    out = bytearray()
+    i = j = 0
+    for byte in data:
+        i = (i + 1) & 0xFF
+        j = (j + state[i]) & 0xFF
+        state[i], state[j] = state[j], state[i]
+        out.append(byte ^ state[(state[i] + state[j]) & 0xFF])
+    return bytes(out)
+
+
+def _opens_with_empty_password(encrypt, file_id):
+    """
+    空用户口令能否打开（只设了权限口令的文件解析器可以直接读取）
+    能确认时返回True；校验不符、不认识的安全处理器或版本返回None，由解析器判断
+    （不返回False：算错时宁可多解析一次，也不误拒能打开的文件）
+    """
+    top, nested = _split_dict(encrypt)
+    if b'/Standard' not in top:
+        return None
+    revision = _int_value(top, b'R')
+    owner = _string_value(top, b'O')
+    user = _string_value(top, b'U')
+    if revision is None or owner is None or user is None:
+        return None
+    if revision == 5:
+        # AES-256（扩展级别3）：SHA-256(口令 + 验证盐) 与U的前32字节比较
+        return hashlib.sha256(user[32:40]).digest() == user[:32] or None
+    if revision not in (2, 3, 4) or file_id is None:
+        return None
+
+    # 算法2：由空口令计算文件密钥
+    length = _key_length(top, nested, revision)
+    permissions = _int_value(top, b'P', 0) & 0xFFFFFFFF
+    digest = hashlib.md5(PASSWORD_PAD + owner[:32] + permissions.to_bytes(4, 'little') + file_id)
+    if revision >= 4 and re.search(rb'/EncryptMetadata\s+false', top):
+        digest.update(b'\xff\xff\xff\xff')
+    key = digest.digest()[:length]
+    if revision >= 3:
+        for _ in range(50):
+            key = hashlib.md5(key).digest()[:length]
+
+    # 算法4/5：用文件密钥计算U并比较
+    if revision == 2:
+        return _rc4(key, PASSWORD_PAD) == user[:32] or None
+    check = _rc4(key, hashlib.md5(PASSWORD_PAD + file_id).digest())
+    for i in range(1, 20):
+        check = _rc4(bytes(b ^ i for b in key), check)
+    return check == user[:16] or None
+
+
+def _encryption(data, offsets, trailer):
+    """
+    文件加密情况：None为未加密，True为确认空口令即可打开，False为无法确认（交给解析器判断）
+    """
+    match = ENCRYPT_RE.search(trailer)
+    if match is None:
+        return None
+    if match.group(1) is not None:
+        offset = offsets.get(int(match.group(1)))
+        encrypt = _object_header(data, offset) if offset is not None else b''
+    else:
+        encrypt = trailer[match.start():]
+    id_match = re.search(rb'/ID\s*\[\s*([(<])', trailer)
+    file_id = _pdf_string(trailer, id_match.start(1)) if id_match else None
+    return _opens_with_empty_password(encrypt, file_id) is True
+
+
+def classify_bytes(data):
+    """
+    按原始字节分拣（data为bytes或mmap），返回 (类别, 原因)
+    经典交叉引用表：逐个查看对象字典（跳过流数据），找到字体即为文本型；
+    交叉引用流的文件对象多在压缩流中，原始字节看不出，交给解析器判断
+    """
+    if data.find(b'%PDF-', 0, HEADER_WINDOW) < 0:
+        return NON_INVOICE, '不是PDF文件'
+    sections = _xref_sections(data)
+    if sections is None:
+        return TEXT, ''
+    offsets, trailers = sections
+    # 加密文件一律交给解析器：需要口令时解析器报错，再归为encrypted（见password_error）
+    if _encryption(data, offsets, trailers[0]) is False:
+        return TEXT, UNVERIFIED_ENCRYPTION
+    has_image = False
+    for offset in offsets.values():
+        header = _object_header(data, offset)
+        # 偏移不对（交叉引用表有误，解析器会重建）时无法判断
+        if not OBJECT_START_RE.match(header) or b'/Font' in header or b'/ObjStm' in header:
+            return TEXT, ''
+        has_image = has_image or b'/Image' in header
+    if has_image:
+        return IMAGE_ONLY, '没有字体，只有图片'
+    return IMAGE_ONLY, '没有字体，无法提取文字'
+
+
+def classify_file(pdf_path):
+    """按文件分拣，内存映射读取，不拷贝文件内容"""
+    with open(pdf_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return NON_INVOICE, '空文件'
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return classify_bytes(data)
+
+
+def classify_text(text):
+    """第一页文本中既没有"发票"字样也没有20位发票号码时视为非发票"""
+    if '发票' in text or find_invoice_no(text):
+        return TEXT, ''
+    return NON_INVOICE, '第一页没有发票字样或发票号码'
+
+
+def password_error(e):
+    """解析器的异常是否表示需要打开口令"""
+    return type(e).__name__ in PASSWORD_ERRORS
+
+
+def triage_info(kind, reason, seconds):
+    """
+    提取结果中的分拣信息：parse_seconds为通过分拣后的解析耗时，
+    probe_seconds为被拒绝文件抽样解析的耗时（估算节省时间用）
+    """
+    return {'kind': kind, 'reason': reason, 'seconds': seconds, 'parse_seconds': None,
+            'probe_seconds': None}
+
+
+_rejections = itertools.count()
+
+
+def should_probe():
+    """被拒绝的文件是否抽样解析（本进程内每PROBE_EVERY个一次）"""
+    return next(_rejections) % PROBE_EVERY == 0
+
+
+class TriageStats:
+    """分拣计数与节省的解析时间估算"""
+
+    def __init__(self):
+        self.counts = dict.fromkeys(KIND_LABELS, 0)
+        self.rejected = []         # (pdf路径, 类别, 原因)
+        self.triage_time = 0.0
+        self.parse_time = 0.0      # 通过分拣的文件的解析耗时合计
+        self.parsed = 0
+        self.probe_time = 0.0      # 被拒绝文件抽样解析的耗时合计
+        self.probed = 0
+        self.skipped_parse = 0     # 解析前即被拒绝的文件数（含抽样解析的）
+
+    def add(self, record):
+        info = record.get('triage')
+        if not info:
+            return
+        self.counts[info['kind']] += 1
+        self.triage_time += info['seconds']
+        if info['parse_seconds'] is not None:
+            self.parse_time += info['parse_seconds']
+            self.parsed += 1
+        elif info['kind'] != TEXT:
+            self.skipped_parse += 1
+            if info['probe_seconds'] is not None:
+                self.probe_time += info['probe_seconds']
+                self.probed += 1
+        if info['kind'] != TEXT:
+            self.rejected.append((record['pdf_path'], info['kind'], info['reason']))
+
+    def summary(self):
+        """
+        汇总字典：saved_s = 被跳过文件的实测平均解析耗时 × 实际未解析的文件数 - 全部分拣与抽样耗时
+        """
+        probe_avg = self.probe_time / self.probed if self.probed else 0.0
+        gross = probe_avg * (self.skipped_parse - self.probed)
+        files = sum(self.counts.values())
+        return {
+            'counts': dict(self.counts),
+            'rejected': len(self.rejected),
+            'skipped_parse': self.skipped_parse,
+            'probed': self.probed,
+            'triage_ms_per_file': self.triage_time / files * 1000 if files else 0.0,
+            'parse_ms_per_file': self.parse_time / self.parsed * 1000 if self.parsed else 0.0,
+            'skipped_parse_ms_per_file': probe_avg * 1000,
+            'saved_s': gross - self.triage_time,
+        }
+
+    def write_report(self, path):
+        """把被拒绝的文件写入CSV（列 pdf_path,kind,label,reason），返回条数"""
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(['pdf_path', 'kind', 'label', 'reason'])
+            for pdf_path, kind, reason in self.rejected:
+                writer.writerow([pdf_path, kind, KIND_LABELS[kind], reason])
+        return len(self.rejected)
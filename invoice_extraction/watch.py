@@ -0,0 +1,382 @@
+"""
+监视文件夹，持续增量入账
+新PDF写完（大小与修改时间稳定）后按小批次提取并追加到总台账，
+把月底一次性处理的压力分散到平时
+
+Linux下用inotify（ctypes直接调用libc，无需额外依赖），其他平台或不可用时退回定时扫描目录
+只监视一层目录，不递归
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from collections import deque
+
+from .bundle import split_records
+from .core import _no_log
+from .ledger import append_to_ledger
+from .parallel import iter_extract
+from .rename import batch_rename
+
+# inotify事件（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')
+
+DEFAULT_SETTLE = 1.0
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_BATCH_WAIT = 2.0
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+def _is_pdf(name):
+    return name.lower().endswith('.pdf')
+
+
+def _signature(st):
+    return st.st_size, st.st_mtime_ns
+
+
+class InotifySource:
+    """inotify事件源：返回有变化的文件名"""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1失败')
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch失败: {directory}')
+        self.directory = directory
+
+    def wait(self, timeout):
+        """
+        等待最多timeout秒，返回有变化的文件名集合
+        事件队列溢出时返回None，由调用方重新扫描目录
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        names = set()
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(buf):
+            _, mask, _, length = EVENT_HEADER.unpack_from(buf, offset)
+            offset += EVENT_HEADER.size
+            name = buf[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingSource:
+    """定时扫描目录的事件源（inotify不可用时使用）"""
+
+    def __init__(self, directory, interval=DEFAULT_POLL_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        return None  # 每次都全量扫描
+
+    def close(self):
+        pass
+
+
+def open_source(directory, polling=False, poll_interval=DEFAULT_POLL_INTERVAL):
+    """优先使用inotify，不可用时退回轮询"""
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifySource(directory)
+        except (OSError, AttributeError):
+            pass
+    return PollingSource(directory, poll_interval)
+
+
+class FolderWatcher:
+    """
+    跟踪文件夹中的PDF，文件大小与修改时间在settle秒内不再变化才视为写完
+    poll() 返回本次新就绪的 [(路径, 首次发现时间)]
+    """
+
+    def __init__(self, directory, settle=DEFAULT_SETTLE, polling=False,
+                 poll_interval=DEFAULT_POLL_INTERVAL):
+        self.directory = directory
+        self.settle = settle
+        self.source = open_source(directory, polling, poll_interval)
+        # 路径 -> (签名, 签名最后变化时间, 首次发现时间)
+        self.candidates = {}
+        # 已交出（或主动忽略）的文件及其签名，签名变化后重新处理
+        self.seen = {}
+        self._scan_all()
+
+    @property
+    def polling(self):
+        return isinstance(self.source, PollingSource)
+
+    def _scan_all(self):
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if _is_pdf(entry.name) and entry.is_file():
+                    self._touch(entry.path)
+
+    def _touch(self, path, now=None):
+        """记录文件当前签名；签名变化则重新计时"""
+        try:
+            sig = _signature(os.stat(path))
+        except FileNotFoundError:
+            self.candidates.pop(path, None)
+            return
+        if self.seen.get(path) == sig:
+            return
+        now = now or time.monotonic()
+        old = self.candidates.get(path)
+        if old is None:
+            self.candidates[path] = (sig, now, now)
+        elif old[0] != sig:
+            self.candidates[path] = (sig, now, old[2])
+
+    def ignore(self, path):
+        """调用方自己产生的文件（如改名后的PDF）不再作为新文件处理"""
+        try:
+            self.seen[path] = _signature(os.stat(path))
+        except FileNotFoundError:
+            pass
+        self.candidates.pop(path, None)
+
+    @property
+    def pending(self):
+        return len(self.candidates)
+
+    def poll(self, timeout=DEFAULT_POLL_INTERVAL):
+        # 有未稳定的文件时缩短等待，以便及时复查
+        if self.candidates:
+            timeout = min(timeout, self.settle / 2 or 0.05)
+        names = self.source.wait(timeout)
+        if names is None:
+            self._scan_all()
+        else:
+            for name in names:
+                if _is_pdf(name):
+                    self._touch(os.path.join(self.directory, name))
+
+        now = time.monotonic()
+        ready = []
+        for path in list(self.candidates):
+            self._touch(path, now)
+            if path not in self.candidates:
+                continue
+            sig, changed_at, first_seen = self.candidates[path]
+            if sig[0] > 0 and now - changed_at >= self.settle:
+                del self.candidates[path]
+                self.seen[path] = sig
+                ready.append((path, first_seen))
+        return ready
+
+    def close(self):
+        self.source.close()
+
+
+class WatchStats:
+    """队列深度、延迟与吞吐量计数"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.ingested = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.append_errors = 0
+        self.queue_depth = 0
+        self.waiting = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.last_lag = 0.0
+        self.oldest_wait = 0.0
+
+    def record_batch(self, lags, failed, duplicates):
+        self.batches += 1
+        self.failed += failed
+        self.duplicates += duplicates
+        for lag in lags:
+            self.ingested += 1
+            self.lag_total += lag
+            self.lag_max = max(self.lag_max, lag)
+            self.last_lag = lag
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            'queue_depth': self.queue_depth,      # 已就绪待入账
+            'waiting': self.waiting,              # 尚未写完（未稳定）
+            'oldest_wait_s': self.oldest_wait,
+            'ingested': self.ingested,
+            'failed': self.failed,
+            'duplicates': self.duplicates,
+            'batches': self.batches,
+            'append_errors': self.append_errors,
+            'lag_avg_s': self.lag_total / self.ingested if self.ingested else 0.0,
+            'lag_max_s': self.lag_max,
+            'lag_last_s': self.last_lag,
+            'throughput_per_min': self.ingested / elapsed * 60 if elapsed > 0 else 0.0,
+        }
+
+
+class WatchDaemon:
+    """
+    监视directory，把就绪的PDF按批提取并追加到ledger
+    一批满batch_size个，或最早就绪的文件已等待batch_wait秒时入账
+    延迟（lag）为文件首次被发现到写入台账的时间
+    """
+
+    def __init__(self, directory, ledger, template=None, cache=None, rename=True,
+                 settle=DEFAULT_SETTLE, batch_size=DEFAULT_BATCH_SIZE,
+                 batch_wait=DEFAULT_BATCH_WAIT, polling=False,
+                 poll_interval=DEFAULT_POLL_INTERVAL, log=_no_log):
+        self.watcher = FolderWatcher(directory, settle, polling, poll_interval)
+        self.ledger = ledger
+        self.template = template
+        self.cache = cache
+        self.rename = rename
+        self.batch_size = max(batch_size, 1)
+        self.batch_wait = batch_wait
+        self.log = log
+        self.queue = deque()  # (路径, 首次发现时间, 就绪时间)
+        self.stats = WatchStats()
+
+    def _update_gauges(self, now):
+        self.stats.queue_depth = len(self.queue)
+        self.stats.waiting = self.watcher.pending
+        self.stats.oldest_wait = now - self.queue[0][2] if self.queue else 0.0
+
+    def _batch_due(self, now):
+        if not self.queue:
+            return False
+        return len(self.queue) >= self.batch_size or now - self.queue[0][2] >= self.batch_wait
+
+    def process_batch(self):
+        """取出最多batch_size个文件，提取并入账，返回本批数量"""
+        batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+        if not batch:
+            return 0
+
+        seen = {pdf_path: seen_at for pdf_path, seen_at, _ in batch}
+        records = list(iter_extract(list(seen), cache=self.cache, split_pages=True, triage=True,
+                                    structured=True))
+        # 合并PDF拆分为每张发票一个文件（保存在子目录中，不会再被监视到）
+        split_records(records, log=self.log)
+
+        items = []
+        first_seen = {}
+        failed = 0
+        for record in records:
+            pdf_path = record['pdf_path']
+            if record['data']:
+                items.append((pdf_path, record['data']))
+                first_seen[pdf_path] = seen[record.get('source', pdf_path)]
+            else:
+                # 分拣跳过的文件（扫描件等）也计入失败，留在目录中等人工处理
+                failed += 1
+                action = '跳过' if record['error_type'] == 'Rejected' else '提取失败'
+                self.log(f"{action} {os.path.basename(pdf_path)}: {record['error']}")
+
+        duplicate_paths = set()
+        if items:
+            try:
+                result = append_to_ledger(self.ledger, items, template=self.template, log=self.log)
+            except Exception as e:
+                # 台账暂时不可写（如被Excel打开）：放回队列，batch_wait后重试
+                self.log(f"错误: {e}，{len(items)}张发票稍后重试")
+                retry_at = time.monotonic()
+                for pdf_path, _ in reversed(items):
+                    self.queue.appendleft((pdf_path, first_seen[pdf_path], retry_at))
+                self.stats.append_errors += 1
+                self.stats.record_batch([], failed, 0)
+                return len(batch)
+            duplicate_paths = {pdf_path for pdf_path, _, _ in result['duplicates']}
+            if self.rename:
+                for new_path, error in batch_rename(items, log=self.log).values():
+                    if not error:
+                        self.watcher.ignore(new_path)
+
+        now = time.monotonic()
+        lags = [now - first_seen[p] for p, _ in items if p not in duplicate_paths]
+        self.stats.record_batch(lags, failed, len(duplicate_paths))
+        self.log(f"入账 {len(lags)} 张，重复 {len(duplicate_paths)}，失败 {failed}，"
+                 f"待处理 {len(self.queue)}")
+        return len(batch)
+
+    def step(self, timeout=DEFAULT_POLL_INTERVAL):
+        """一次循环：收集就绪文件，到期则处理一批；返回本次入账处理的文件数"""
+        now = time.monotonic()
+        if self.queue:
+            # 已有排队文件时，最多等到这一批到期
+            timeout = max(0.0, min(timeout, self.queue[0][2] + self.batch_wait - now))
+        for pdf_path, seen_at in self.watcher.poll(timeout):
+            self.queue.append((pdf_path, seen_at, time.monotonic()))
+
+        now = time.monotonic()
+        processed = 0
+        # 轮数有上限：入账失败放回队列的文件不会在本次循环中反复重试
+        for _ in range(len(self.queue) // self.batch_size + 1):
+            if not self._batch_due(now):
+                break
+            processed += self.process_batch()
+            now = time.monotonic()
+        self._update_gauges(now)
+        return processed
+
+    def run(self, stop_event=None, stats_interval=60.0, stats_callback=None):
+        """持续运行直到stop_event被设置（或KeyboardInterrupt）"""
+        last_report = time.monotonic()
+        try:
+            while stop_event is None or not stop_event.is_set():
+                self.step()
+                if stats_callback and time.monotonic() - last_report >= stats_interval:
+                    stats_callback(self.stats.summary())
+                    last_report = time.monotonic()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.drain()
+            self._update_gauges(time.monotonic())
+            if stats_callback:
+                stats_callback(self.stats.summary())
+
+    def drain(self):
+        """
+        退出前把已就绪的文件入账；台账写入失败时不再重试（否则退出会一直卡住），
+        记录未入账的文件，下次启动时它们仍在目录中，会重新处理
+        """
+        while self.queue:
+            errors = self.stats.append_errors
+            self.process_batch()
+            if self.stats.append_errors > errors:
+                self.log(f"台账写入失败，退出时仍有 {len(self.queue)} 个文件未入账:")
+                for pdf_path, _, _ in self.queue:
+                    self.log(f"  {pdf_path}")
+                break
+
+    def close(self):
+        self.watcher.close()
@@ -0,0 +1,275 @@
+"""
+在xlsx文件中就地追加行
+xlsx是zip包：台账的活动工作表（xl/worksheets/sheetN.xml）逐块流式改写——插入点以上的行原样复制，
+在合计行（没有合计行时为末尾）之前插入新行，其后的行号、合并区域与dimension顺延；
+其余成员（样式、共享字符串、其他工作表……）内容不变地复制过去
+新行的样式编号沿用插入点上一行（已有的发票行），文字以内联字符串写入，不改动共享字符串表；
+耗时与台账大小只成字节复制的关系，不必把已有行逐格读入再写出
+无法这样追加时（插入点上一行不是发票行、行没有行号等）抛出AppendUnsupported，由调用方改用完整写入
+"""
+import os
+import posixpath
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from .core import build_row_values
+
+CHUNK = 1 << 20
+
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+CALC_CHAIN = 'xl/calcChain.xml'
+
+_ROW_START = re.compile(rb'<row\b')
+_ROW_ELEM = re.compile(rb'<row\b[^>]*?(?:/>|>.*?</row>)', re.S)
+_ROW_NUMBER = re.compile(rb'(<row\b[^>]*?\br=")(\d+)(")')
+_CELL = re.compile(rb'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_CELL_REF = re.compile(rb'(<c\b[^>]*?\br=")([A-Z]+)(\d+)(")')
+_ATTR = re.compile(rb'\b([\w:]+)="([^"]*)"')
+_DIMENSION = re.compile(rb'(<dimension\b[^>]*?\bref="[A-Z]+\d+:[A-Z]+)(\d+)(")')
+_MERGE = re.compile(rb'(<mergeCell\b[^>]*?\bref=")([^"]+)("[^>]*/>)')
+_MERGE_COUNT = re.compile(rb'(<mergeCells\b[^>]*?\bcount=")(\d+)(")')
+_SHEET_DATA = re.compile(rb'<sheetData\s*(/?)>')
+_SHEET_DATA_END = b'</sheetData>'
+
+
+class AppendUnsupported(ValueError):
+    """工作表无法就地追加（由调用方改用完整写入）"""
+
+
+def _read_member(zf, name):
+    with zf.open(name) as f:
+        return f.read()
+
+
+def active_sheet_part(zf):
+    """活动工作表在zip中的成员名"""
+    from xml.etree.ElementTree import fromstring
+
+    ns = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+    workbook = fromstring(_read_member(zf, 'xl/workbook.xml'))
+    view = workbook.find(f'{ns}bookViews/{ns}workbookView')
+    active = int(view.get('activeTab', 0)) if view is not None else 0
+    sheets = workbook.findall(f'{ns}sheets/{ns}sheet')
+    if active >= len(sheets):
+        raise AppendUnsupported('工作簿中没有活动工作表')
+    rel_id = sheets[active].get(f'{{{REL_NS}}}id')
+    rels = fromstring(_read_member(zf, 'xl/_rels/workbook.xml.rels'))
+    for rel in rels:
+        if rel.get('Id') == rel_id:
+            target = rel.get('Target')
+            if target.startswith('/'):
+                return target.lstrip('/')
+            return posixpath.normpath(posixpath.join('xl', target))
+    raise AppendUnsupported('找不到活动工作表')
+
+
+def _column_number(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ch - 64
+    return n
+
+
+def _cell_xml(ref, value, style):
+    attrs = f' r="{ref}"' + (f' s="{style}"' if style else '')
+    if value is None or value == '':
+        return f'<c{attrs}/>' if style else ''
+    if isinstance(value, bool):
+        return f'<c{attrs} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c{attrs}><v>{value!r}</v></c>'
+    text = escape(str(value))
+    space = ' xml:space="preserve"' if text != text.strip() else ''
+    return f'<c{attrs} t="inlineStr"><is><t{space}>{text}</t></is></c>'
+
+
+class _Prototype:
+    """插入点上一行：行属性与各列的样式编号"""
+
+    def __init__(self, row_xml, number_col):
+        start_tag = row_xml[:row_xml.index(b'>') + 1]
+        self.attrs = [(k.decode(), v.decode()) for k, v in _ATTR.findall(start_tag)
+                      if k != b'r']
+        self.styles = {}
+        has_number = False
+        for attrs, body in _CELL.findall(row_xml):
+            ref = re.search(rb'\br="([A-Z]+)\d+"', attrs)
+            if ref is None:
+                raise AppendUnsupported('单元格没有位置')
+            col = _column_number(ref.group(1))
+            style = re.search(rb'\bs="(\d+)"', attrs)
+            if style:
+                self.styles[col] = style.group(1).decode()
+            if col == number_col and body and (b'<v>' in body or b'<t' in body):
+                has_number = True
+        if not has_number:
+            raise AppendUnsupported('插入点上一行不是发票行')
+
+    def row_xml(self, row, values, first_col):
+        from openpyxl.utils import get_column_letter
+
+        attrs = ''.join(f' {k}="{v}"' for k, v in self.attrs)
+        cells = []
+        for col in range(first_col, max(len(values), max(self.styles, default=0)) + 1):
+            value = values[col - 1] if col <= len(values) else None
+            cells.append(_cell_xml(f"{get_column_letter(col)}{row}", value,
+                                   self.styles.get(col)))
+        return f'<row r="{row}"{attrs}>{"".join(cells)}</row>'.encode('utf-8')
+
+
+def _shift_row(row_xml, count):
+    """行及其单元格的行号加count"""
+    row_xml = _ROW_NUMBER.sub(lambda m: m.group(1) + str(int(m.group(2)) + count).encode()
+                              + m.group(3), row_xml, count=1)
+    return _CELL_REF.sub(lambda m: m.group(1) + m.group(2) + str(int(m.group(3)) + count).encode()
+                         + m.group(4), row_xml)
+
+
+def _rewrite_tail(tail, insert_at, count, layout):
+    """sheetData之后的部分：合并区域按shift_merged_range顺延"""
+    from .excel_stream import shift_merged_range
+
+    total = 0
+
+    def shift(m):
+        nonlocal total
+        refs = shift_merged_range(m.group(2).decode(), insert_at, count, layout.first_col,
+                                  layout.last_col)
+        total += len(refs)
+        return b''.join(m.group(1) + ref.encode() + m.group(3) for ref in refs)
+
+    tail = _MERGE.sub(shift, tail)
+    return _MERGE_COUNT.sub(lambda m: m.group(1) + str(total).encode() + m.group(3), tail,
+                            count=1)
+
+
+def _rewrite_sheet(src, dst, rows_xml, insert_at, count, layout, before_total):
+    """
+    流式改写工作表XML：插入点以上原样复制，新行（rows_xml(上一行XML)）从insert_at行开始：
+    before_total为True时插在原insert_at行（合计行）之前，其后的行顺延count行；否则接在末尾
+    """
+    buffer = b''
+    eof = False
+
+    def fill():
+        nonlocal buffer, eof
+        chunk = src.read(CHUNK)
+        if chunk:
+            buffer += chunk
+        else:
+            eof = True
+
+    # 表头部分（sheetData之前）：顺延dimension
+    while not eof and _SHEET_DATA.search(buffer) is None:
+        fill()
+    match = _SHEET_DATA.search(buffer)
+    if match is None or match.group(1):
+        raise AppendUnsupported('工作表没有数据行')
+    dst.write(_DIMENSION.sub(lambda m: m.group(1) + str(int(m.group(2)) + count).encode()
+                             + m.group(3), buffer[:match.end()], count=1))
+    buffer = buffer[match.end():]
+
+    # 插入点以上的行原样复制，保留最后一行（插入点上一行）
+    marker = (re.compile(rb'<row\b[^>]*?\br="%d"' % insert_at) if before_total
+              else re.compile(re.escape(_SHEET_DATA_END)))
+    while True:
+        found = marker.search(buffer)
+        if found:
+            break
+        if eof:
+            raise AppendUnsupported('找不到插入点')
+        starts = [m.start() for m in _ROW_START.finditer(buffer)]
+        keep = starts[-1] if starts else max(0, len(buffer) - 64)
+        dst.write(buffer[:keep])
+        buffer = buffer[keep:]
+        fill()
+    before = buffer[:found.start()]
+    starts = [m.start() for m in _ROW_START.finditer(before)]
+    if not starts:
+        raise AppendUnsupported('插入点上一行不是发票行')
+    previous = before[starts[-1]:]
+    number = _ROW_NUMBER.match(previous)
+    if number is None or int(number.group(2)) != insert_at - 1:
+        raise AppendUnsupported('行没有行号或插入点上一行为空行')
+    dst.write(before)
+    dst.write(rows_xml(previous))
+    buffer = buffer[found.start():]
+
+    # 插入点及以下的行顺延
+    while True:
+        end = buffer.find(_SHEET_DATA_END)
+        if end >= 0:
+            break
+        if eof:
+            raise AppendUnsupported('工作表XML不完整')
+        fill()
+    if before_total:
+        dst.write(_ROW_ELEM.sub(lambda m: _shift_row(m.group(0), count), buffer[:end]))
+    while not eof:
+        fill()
+    dst.write(_rewrite_tail(buffer[end:], insert_at, count, layout)
+              if before_total else buffer[end:])
+
+
+def _drop_calc_chain(name, data):
+    """删除计算链的引用（行号变化后计算链失效，Excel打开时会重建）"""
+    if name == '[Content_Types].xml':
+        return re.sub(rb'<Override\b[^>]*?PartName="/xl/calcChain.xml"[^>]*/>', b'', data)
+    return re.sub(rb'<Relationship\b[^>]*?Target="[^"]*calcChain.xml"[^>]*/>', b'', data)
+
+
+def append_rows(ledger_path, data_list, output_path, layout, start_seq, insert_at):
+    """
+    把data_list写成从insert_at行开始的新行，结果保存到output_path：
+    layout有合计行（即insert_at）时插在合计行之前，否则insert_at应为最后一行的下一行
+    layout为台账的模板布局；start_seq为第一行的序号
+    """
+    number_col = layout.column('数电发票号码')
+    if number_col is None:
+        raise AppendUnsupported('台账没有数电发票号码列')
+    if insert_at - 1 <= (layout.header_row or 0):
+        raise AppendUnsupported('台账中还没有发票行')
+
+    count = len(data_list)
+    before_total = layout.total_row is not None
+
+    def rows_xml(previous):
+        prototype = _Prototype(previous, number_col)
+        return b''.join(
+            prototype.row_xml(insert_at + i, layout.place(build_row_values(start_seq + i, data)),
+                              layout.first_col)
+            for i, data in enumerate(data_list)
+        )
+
+    with zipfile.ZipFile(ledger_path) as zin:
+        sheet = active_sheet_part(zin)
+        if sheet not in zin.namelist():
+            raise AppendUnsupported('找不到活动工作表')
+        has_chain = CALC_CHAIN in zin.namelist()
+        try:
+            with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zout:
+                for info in zin.infolist():
+                    if info.filename == CALC_CHAIN:
+                        continue
+                    out_info = zipfile.ZipInfo(info.filename, info.date_time)
+                    out_info.compress_type = zipfile.ZIP_DEFLATED
+                    out_info.external_attr = info.external_attr
+                    with zin.open(info) as src, zout.open(out_info, 'w') as dst:
+                        if info.filename == sheet:
+                            _rewrite_sheet(src, dst, rows_xml, insert_at, count, layout,
+                                           before_total)
+                        elif has_chain and info.filename in ('[Content_Types].xml',
+                                                             'xl/_rels/workbook.xml.rels'):
+                            dst.write(_drop_calc_chain(info.filename, src.read()))
+                        else:
+                            while True:
+                                chunk = src.read(CHUNK)
+                                if not chunk:
+                                    break
+                                dst.write(chunk)
+        except BaseException:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+    return output_path
@@ -0,0 +1,33 @@
+"""
+测试共用的夹具：用benchmarks中的合成语料生成器造发票PDF与台账模板
+缓存目录指向临时目录，测试不读写用户缓存
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# 合成语料生成器（corpus、common）在benchmarks中；测试不引用基准脚本本身，对照函数见helpers
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    home = tmp_path / 'xdg'
+    monkeypatch.setenv('XDG_CACHE_HOME', str(home))
+    return home
+
+
+@pytest.fixture
+def make_corpus(tmp_path):
+    """make_corpus(count, **选项) -> (语料目录, manifest)，选项见benchmarks/corpus.generate"""
+    from corpus import generate
+
+    def make(count, name='corpus', **options):
+        out_dir = tmp_path / name
+        manifest = generate(str(out_dir), count, **options)
+        return out_dir, manifest
+
+    return make
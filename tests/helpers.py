@@ -0,0 +1,214 @@
+"""
+测试用的对照实现与输出核对函数
+benchmarks中的基准脚本各自带有同样的函数；测试只依赖这里的副本（以及合成语料生成器corpus/common），
+修改基准脚本不会影响测试
+"""
+import os
+import random
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from openpyxl import load_workbook
+
+from common import synthetic_invoice
+from invoice_extraction.fields import parse_invoice_text
+
+# 输出台账中核对的列 {列号: 字段}
+CHECKED_COLUMNS = {4: 'invoice_no', 6: 'seller_name', 9: 'date', 13: 'total', 19: 'drawer', 20: 'remark'}
+# 数电发票XML中核对的字段
+CHECKED = ('invoice_no', 'date', 'seller_name', 'seller_tax_no', 'amount', 'tax', 'total',
+           'drawer', 'remark')
+BUYER = ('91430100MA4TCG0Q2E', '湖南新飞创不良资产处置有限公司')
+
+
+def sample_records(count, seed=0):
+    """count张合成发票的提取结果（与从PDF提取得到的字段相同），用于直接测试写入"""
+    rng = random.Random(seed)
+    return [parse_invoice_text('\n'.join(synthetic_invoice(rng)[0])) for _ in range(count)]
+
+
+def sheet_values(path):
+    """活动工作表的全部单元格值（按行）"""
+    wb = load_workbook(path)
+    try:
+        return [list(row) for row in wb.active.iter_rows(values_only=True)]
+    finally:
+        wb.close()
+
+
+def check_output(output, manifest):
+    """按数电发票号码把输出台账与真实字段对比，返回各字段不一致数"""
+    expected = {e['invoice_no']: e for e in manifest.values() if e}
+    mismatches = dict.fromkeys(CHECKED_COLUMNS.values(), 0)
+    found = 0
+    wb = load_workbook(output, read_only=True)
+    try:
+        for row in wb.active.iter_rows(min_row=2, values_only=True):
+            if len(row) < max(CHECKED_COLUMNS) or not row[3]:
+                continue
+            e = expected.get(str(row[3]))
+            if e is None:
+                continue
+            found += 1
+            for col, field in CHECKED_COLUMNS.items():
+                value = row[col - 1]
+                if field == 'total':
+                    ok = value is not None and abs(float(value) - float(e['total'])) < 0.005
+                else:
+                    ok = (value or '') == e[field]
+                if not ok:
+                    mismatches[field] += 1
+    finally:
+        wb.close()
+    mismatches['missing'] = len(expected) - found
+    return mismatches
+
+
+def count_rows(output):
+    """台账中写入的发票行数（序号为整数的行，不含合计行）"""
+    wb = load_workbook(output, read_only=True)
+    try:
+        return sum(1 for row in wb.active.iter_rows(min_row=2, values_only=True)
+                   if row and isinstance(row[0], int))
+    finally:
+        wb.close()
+
+
+# ---- 旧版字段解析（逐字段re.search/re.findall），作为新引擎的对照 ----
+
+def legacy_is_valid_name(text):
+    if not text:
+        return False
+    if any(x in text for x in ['¥', '公司', '电子', '发票', '号码', '2026', '9144']):
+        return False
+    return bool(re.match(r'^[\u4e00-\u9fa5]{2,4}$', text))
+
+
+def legacy_extract_drawer(text):
+    lines = text.split('\n')
+    for i, line in enumerate(lines):
+        if '开票人' in line:
+            current = line.replace('开票人', '').replace(':', '').replace('：', '').strip()
+            if current and legacy_is_valid_name(current):
+                return current
+            if i + 1 < len(lines):
+                next_line = lines[i + 1].strip()
+                if legacy_is_valid_name(next_line):
+                    return next_line
+    return '高健铭'
+
+
+def legacy_parse_invoice_text(text):
+    data = {}
+    match = re.search(r'\b(\d{20})\b', text)
+    data['invoice_no'] = match.group(1) if match else ''
+    match = re.search(r'(\d{4})年(\d{1,2})月(\d{1,2})日', text)
+    if match:
+        year, month, day = match.groups()
+        data['date'] = f"{year}-{int(month):02d}-{int(day):02d}"
+    else:
+        data['date'] = ''
+    seller_match = re.search(r'91430100MA4TCG0Q2E\s*([\s\S]*?)\s*(91440300MA5H2BG470)', text)
+    if seller_match:
+        data['seller_name'] = seller_match.group(1).replace('\n', '').strip()
+    else:
+        data['seller_name'] = '鼎越数科（深圳）信息技术有限公司'
+    data['seller_tax_no'] = '91440300MA5H2BG470'
+    data['buyer_name'] = '湖南新飞创不良资产处置有限公司'
+    data['buyer_tax_no'] = '91430100MA4TCG0Q2E'
+    amounts = re.findall(r'[¥￥]\s*([\d,]+\.\d{2})', text)
+    if len(amounts) >= 3:
+        nums = [(float(a.replace(',', '')), a) for a in amounts]
+        nums.sort(key=lambda x: x[0], reverse=True)
+        data['total'] = nums[0][1].replace(',', '')
+        data['amount'] = nums[1][1].replace(',', '')
+        data['tax'] = nums[2][1].replace(',', '')
+    else:
+        data['amount'] = ''
+        data['tax'] = ''
+        data['total'] = ''
+    data['drawer'] = legacy_extract_drawer(text)
+    item_match = re.search(r'(\*信息系统服务\*技术服务费?)', text)
+    data['item_name'] = item_match.group(1) if item_match else '*信息系统服务*技术服务费'
+    lines = [l.strip() for l in text.split('\n') if l.strip()]
+    data['remark'] = ''
+    for line in reversed(lines):
+        if any(x in line for x in ['开票人', data['drawer'], '鼎越', '新飞创', '9144', '2026年']):
+            continue
+        if '¥' in line or '电子发票' in line or '增值税专用发票' in line:
+            continue
+        if '月' in line and ('费' in line or '服务' in line or '项目' in line):
+            data['remark'] = line
+            break
+    if data['remark']:
+        month_match = re.search(r'(\d{4}年\d{1,2}[-~]\d{1,2}月|\d{4}年\d{1,2}月)', data['remark'])
+        if month_match:
+            data['month'] = month_match.group(1).replace('月', '月份')
+        else:
+            month_match = re.search(r'(\d{1,2}[-~]\d{1,2}月|\d{1,2}月)', data['remark'])
+            if month_match:
+                month_part = month_match.group(1).replace('月', '月份')
+                if data['date']:
+                    data['month'] = f"{data['date'][:4]}年{month_part}"
+                else:
+                    data['month'] = month_part
+            else:
+                data['month'] = ''
+    else:
+        data['month'] = ''
+    return data
+
+
+def diff_fields(text):
+    """返回 (不一致字段列表, 已知差异字段列表)"""
+    old = legacy_parse_invoice_text(text)
+    new = parse_invoice_text(text)
+    fields = [k for k in new if old.get(k) != new[k]]
+    # 旧版跳过所有含"2026年"的行，这类备注现在能正确取到
+    if '2026年' in new['remark']:
+        known = [k for k in fields if k in ('remark', 'month')]
+        return [k for k in fields if k not in known], known
+    return fields, []
+
+
+def einvoice_xml(e):
+    """按电子发票服务平台导出格式（节选）生成一张发票的XML"""
+    def el(tag, value):
+        return f"<{tag}>{escape(value)}</{tag}>"
+
+    return ('<?xml version="1.0" encoding="UTF-8"?><EInvoice>'
+            '<Header><EIid>' + e['invoice_no'] + '</EIid></Header><EInvoiceData>'
+            '<SellerInformation>' + el('SellerIdNum', e['seller_tax_no'])
+            + el('SellerName', e['seller_name']) + '</SellerInformation>'
+            '<BuyerInformation>' + el('BuyerIdNum', BUYER[0]) + el('BuyerName', BUYER[1])
+            + '</BuyerInformation><BasicInformation>'
+            + el('TotalAmWithoutTax', e['amount']) + el('TotalTaxAm', e['tax'])
+            + el('TotalTax-includedAmount', e['total']) + el('Drawer', e['drawer'])
+            + el('RequestTime', e['date'] + ' 10:00:00') + '</BasicInformation>'
+            '<IssuItemInformation>' + el('ItemName', '*信息系统服务*技术服务费')
+            + '</IssuItemInformation><AdditionalInformation>' + el('Remark', e['remark'])
+            + '</AdditionalInformation></EInvoiceData><TaxSupervisionInfo>'
+            + el('InvoiceNumber', e['invoice_no']) + el('IssueTime', e['date'])
+            + '</TaxSupervisionInfo></EInvoice>').encode('utf-8')
+
+
+def write_structured(corpus, manifest):
+    """为每张（非扫描件）发票写同名XML，另在ofd子目录写只含版式骨架与内嵌XML的OFD"""
+    ofd_dir = os.path.join(corpus, 'ofd')
+    os.makedirs(ofd_dir)
+    xml_files, ofd_files = [], []
+    for name, e in manifest.items():
+        if not e:
+            continue
+        stem = os.path.splitext(name)[0]
+        xml = einvoice_xml(e)
+        xml_files.append(os.path.join(corpus, stem + '.xml'))
+        with open(xml_files[-1], 'wb') as f:
+            f.write(xml)
+        ofd_files.append(os.path.join(ofd_dir, stem + '.ofd'))
+        with zipfile.ZipFile(ofd_files[-1], 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('OFD.xml', '<ofd:OFD xmlns:ofd="http://www.ofdspec.org/2016"/>')
+            zf.writestr('Doc_0/Document.xml', '<ofd:Document xmlns:ofd="http://www.ofdspec.org/2016"/>')
+            zf.writestr(f"Doc_0/Attachs/{stem}.xml", xml)
+    return xml_files, ofd_files
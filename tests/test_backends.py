@@ -0,0 +1,54 @@
+"""PDF文本后端：各后端读取的第一页、页数与页范围都能解析出同样的字段"""
+import io
+import random
+
+import pytest
+
+from common import synthetic_invoice
+from corpus import bundle_pdf_bytes, continuation_page, text_pdf_bytes
+from helpers import CHECKED
+from invoice_extraction.backends import BACKENDS, get_backend
+from invoice_extraction.fields import parse_invoice_text
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def backend(request):
+    module = {'pypdf2': 'PyPDF2', 'pypdf': 'pypdf', 'pdfminer': 'pdfminer'}[request.param]
+    pytest.importorskip(module)
+    return get_backend(request.param)
+
+
+def fields(text):
+    data = parse_invoice_text(text)
+    return {field: data[field] for field in CHECKED}
+
+
+def test_first_page(backend):
+    lines, expected = synthetic_invoice(random.Random(1))
+    text, pages = backend.first_page(io.BytesIO(text_pdf_bytes(lines)))
+    assert pages == 1
+    assert fields(text) == {field: expected[field] for field in CHECKED}
+    assert backend.first_page_text(io.BytesIO(text_pdf_bytes(lines))) == text
+
+
+def test_page_range_of_bundle(backend):
+    rng = random.Random(2)
+    invoices = [synthetic_invoice(rng) for _ in range(3)]
+    pages = [invoices[0][0], invoices[1][0] + ['共2页 第1页'], continuation_page(2, 2),
+             invoices[2][0]]
+    data = bundle_pdf_bytes(pages)
+
+    text, count = backend.first_page(io.BytesIO(data))
+    assert count == 4
+    assert fields(text)['invoice_no'] == invoices[0][1]['invoice_no']
+    # 只读取请求的页，超出总页数的部分忽略
+    texts = backend.page_texts(io.BytesIO(data), 3, 10)
+    assert len(texts) == 1
+    assert fields(texts[0])['invoice_no'] == invoices[2][1]['invoice_no']
+    assert len(backend.page_texts(io.BytesIO(data), 1, 3)) == 2
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_backend('nope')
+    assert get_backend('pypdf2') is get_backend('pypdf2')
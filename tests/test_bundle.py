@@ -0,0 +1,39 @@
+"""合并PDF：按发票号码分组拆分，重复运行不重复入账、不覆盖已有文件"""
+import os
+
+from corpus import generate_bundle
+from helpers import check_output, count_rows
+from invoice_extraction.bundle import SPLIT_DIR_SUFFIX, _write_new, group_pages
+from invoice_extraction.cli import EXIT_OK, collect_pdf_files, main
+
+
+def test_group_pages_keeps_continuation_pages():
+    texts = ['数电发票号码：11111111111111111111', '共2页 第2页',
+             '数电发票号码：22222222222222222222', '数电发票号码：22222222222222222222',
+             '数电发票号码：33333333333333333333']
+    assert group_pages(texts) == [(0, 2), (2, 4), (4, 5)]
+
+
+def test_write_new_never_overwrites(tmp_path):
+    path = str(tmp_path / 'a.pdf')
+    assert _write_new(path, b'one') == path
+    assert _write_new(path, b'one') == path
+    assert _write_new(path, b'two') == str(tmp_path / 'a_2.pdf')
+    assert (tmp_path / 'a.pdf').read_bytes() == b'one'
+
+
+def test_recursive_rerun_skips_split_dir(tmp_path):
+    inbox = tmp_path / 'inbox'
+    manifest = generate_bundle(str(inbox), 6, seed=4, multi_page=0.5)
+    split_dir = inbox / ('bundle' + SPLIT_DIR_SUFFIX)
+    for run in (1, 2):
+        output = tmp_path / f"out{run}.xlsx"
+        code = main([str(inbox), '-r', '-t', str(inbox / 'template.xlsx'), '-o', str(output),
+                     '-q', '--no-rename'])
+        assert code == EXIT_OK
+        # 第二次运行不读取拆分目录中的文件，每张发票只出现一次
+        assert count_rows(str(output)) == len(manifest)
+        assert not any(m for m in check_output(str(output), manifest).values())
+        assert len(os.listdir(split_dir)) == len(manifest)
+    assert collect_pdf_files([str(inbox)], recursive=True) == [str(inbox / 'bundle.pdf')]
+    assert len(collect_pdf_files([str(split_dir / '*.pdf')])) == len(manifest)
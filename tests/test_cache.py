@@ -0,0 +1,100 @@
+"""提取结果缓存：命中、淘汰与多进程共用时不阻塞"""
+import sqlite3
+
+from invoice_extraction.cache import ExtractionCache
+
+
+def test_put_get_roundtrip(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    with ExtractionCache(path) as cache:
+        cache.put('k', {'invoice_no': '1'})
+        assert cache.get('k') == {'invoice_no': '1'}
+        assert cache.get('missing') is None
+        assert (cache.hits, cache.misses) == (1, 1)
+    # 关闭后另一个实例可读到
+    with ExtractionCache(path) as cache:
+        assert cache.get('k') == {'invoice_no': '1'}
+
+
+def test_evicts_least_recently_used(tmp_path):
+    with ExtractionCache(str(tmp_path / 'cache.sqlite3'), max_bytes=2000) as cache:
+        for i in range(20):
+            cache.put(f"k{i}", {'remark': 'x' * 100})
+        assert cache.evictions
+        assert cache.total_bytes <= 2000
+        assert cache.get('k0') is None
+        assert cache.get('k19') is not None
+
+
+def test_writes_are_visible_to_other_connections(tmp_path):
+    """每次写入立即提交：另一个实例（进程）马上能读到，也能马上写入"""
+    path = str(tmp_path / 'cache.sqlite3')
+    first = ExtractionCache(path)
+    second = ExtractionCache(path)
+    try:
+        first.put('a', {'n': 1})
+        first.get('a')
+        assert second.get('a') == {'n': 1}
+        second.put('b', {'n': 2})
+        assert first.get('b') == {'n': 2}
+        assert first.errors == second.errors == 0
+    finally:
+        first.close()
+        second.close()
+
+
+def test_locked_database_is_a_miss(tmp_path):
+    """其他连接持有写锁时读写不抛异常：写入跳过，之后恢复正常"""
+    path = str(tmp_path / 'cache.sqlite3')
+    with ExtractionCache(path) as cache:
+        cache.put('a', {'n': 1})
+        blocker = sqlite3.connect(path, isolation_level=None)
+        blocker.execute('BEGIN EXCLUSIVE')
+        try:
+            cache.put('b', {'n': 2})
+            assert cache.get('a') is None or cache.get('a') == {'n': 1}
+            assert cache.errors
+        finally:
+            blocker.execute('ROLLBACK')
+            blocker.close()
+        assert cache.get('b') is None
+        cache.put('b', {'n': 2})
+        assert cache.get('b') == {'n': 2}
+
+
+def test_failed_write_rolls_back(tmp_path):
+    """action()抛出非OperationalError时回滚并抛出，之后的写入照常提交"""
+    path = str(tmp_path / 'cache.sqlite3')
+    with ExtractionCache(path) as cache:
+        def fail():
+            cache.conn.execute("INSERT INTO entries VALUES ('x', '{}', 1, 0)")
+            raise sqlite3.IntegrityError('boom')
+
+        try:
+            cache._write(fail)
+        except sqlite3.IntegrityError:
+            pass
+        else:
+            raise AssertionError('异常应向上抛出')
+        assert not cache.conn.in_transaction
+        assert cache.get('x') is None
+        cache.put('a', {'n': 1})
+        assert ExtractionCache(path).get('a') == {'n': 1}
+
+
+def test_eviction_counts_other_writers(tmp_path):
+    """两个实例共用缓存：按数据库中的实际总大小淘汰，而不是各自记下的大小"""
+    path = str(tmp_path / 'cache.sqlite3')
+    first = ExtractionCache(path, max_bytes=3000)
+    second = ExtractionCache(path, max_bytes=3000)
+    try:
+        for i in range(10):
+            first.put(f"a{i}", {'remark': 'x' * 300})
+            second.put(f"b{i}", {'remark': 'x' * 300})
+        actual = first.conn.execute('SELECT SUM(size) FROM entries').fetchone()[0]
+        assert actual <= 3000
+        assert first.evictions + second.evictions
+        assert second.total_bytes == actual
+    finally:
+        first.close()
+        second.close()
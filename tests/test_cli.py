@@ -0,0 +1,63 @@
+"""命令行批处理：退出码、台账内容与重命名"""
+import os
+import subprocess
+import sys
+
+import pytest
+from openpyxl import load_workbook
+
+from helpers import check_output
+from invoice_extraction.cli import EXIT_FAILED, EXIT_OK, EXIT_PARTIAL, main
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_batch_writes_and_renames(make_corpus, tmp_path):
+    corpus, manifest = make_corpus(20, scanned=0)
+    output = tmp_path / 'out.xlsx'
+    code = main([str(corpus), '-t', str(corpus / 'template.xlsx'), '-o', str(output), '-q',
+                 '--rename-journal', str(tmp_path / 'rename.jsonl')])
+    assert code == EXIT_OK
+    assert not any(m for m in check_output(str(output), manifest).values())
+    assert not [name for name in os.listdir(corpus) if name.startswith('inv_')]
+
+
+def test_scanned_files_give_partial_exit(make_corpus, tmp_path):
+    corpus, manifest = make_corpus(30, scanned=0.2, seed=3)
+    scanned = [name for name, expected in manifest.items() if expected is None]
+    assert scanned
+    output = tmp_path / 'out.xlsx'
+    code = main([str(corpus), '-t', str(corpus / 'template.xlsx'), '-o', str(output), '-q',
+                 '--no-rename'])
+    assert code == EXIT_PARTIAL
+    rows = [row for row in load_workbook(output).active.iter_rows(min_row=2, values_only=True)
+            if row[3]]
+    assert len(rows) == len(manifest) - len(scanned)
+
+
+def test_missing_template(tmp_path):
+    assert main([str(tmp_path), '-t', str(tmp_path / 'none.xlsx')]) == EXIT_FAILED
+
+
+def test_stream_excel_rejected_with_ledger(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        main([str(tmp_path), '--ledger', str(tmp_path / 'ledger.xlsx'), '--stream-excel'])
+    assert '--stream-excel' in capsys.readouterr().err
+
+
+def test_modes_share_summary(make_corpus, tmp_path):
+    """批处理、流水线与作业模式的计数与汇总一致（子进程中运行，汇总输出到真实的标准输出）"""
+    corpus, manifest = make_corpus(12, scanned=0.2, seed=4)
+    common = [str(corpus), '-t', str(corpus / 'template.xlsx'), '-q', '--no-rename', '--check']
+    summaries = []
+    for name, extra in (('run', []), ('async', ['--async-pipeline']),
+                        ('jobs', ['--jobs', str(tmp_path / 'jobs.sqlite3')])):
+        proc = subprocess.run(
+            [sys.executable, '-m', 'invoice_extraction'] + common
+            + ['-o', str(tmp_path / f"{name}.xlsx")] + extra,
+            cwd=ROOT, capture_output=True, text=True, encoding='utf-8')
+        assert proc.returncode == EXIT_PARTIAL, proc.stderr
+        out = proc.stdout
+        assert '校验: ' in out
+        summaries.append(next(line for line in out.splitlines() if line.startswith('文件数')))
+    assert len(set(summaries)) == 1
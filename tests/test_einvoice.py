@@ -0,0 +1,98 @@
+"""数电发票XML/OFD：字段读取、回退解析PDF、同名文件的查找与重命名"""
+import os
+
+import pytest
+
+from helpers import CHECKED, check_output, einvoice_xml, write_structured
+from invoice_extraction import einvoice
+from invoice_extraction.cli import EXIT_OK, main
+from invoice_extraction.core import extract_invoice_data
+from invoice_extraction.einvoice import NotEInvoiceError, read_einvoice
+
+
+@pytest.fixture
+def structured(make_corpus):
+    corpus, manifest = make_corpus(6, scanned=0, seed=9)
+    xml_files, ofd_files = write_structured(str(corpus), manifest)
+    return corpus, manifest, xml_files, ofd_files
+
+
+def expected_for(manifest, path):
+    return manifest[os.path.splitext(os.path.basename(path))[0] + '.pdf']
+
+
+def test_read_xml_and_ofd(structured):
+    _, manifest, xml_files, ofd_files = structured
+    for path in xml_files + ofd_files:
+        data, expected = read_einvoice(path), expected_for(manifest, path)
+        assert {f: data.get(f) for f in CHECKED} == {f: expected[f] for f in CHECKED}
+
+
+def test_other_xml_rejected(tmp_path):
+    path = tmp_path / 'other.xml'
+    path.write_text('<?xml version="1.0"?><Order><Id>1</Id></Order>', encoding='utf-8')
+    with pytest.raises(NotEInvoiceError):
+        read_einvoice(str(path))
+
+
+def test_companion_xml_read_before_pdf(structured):
+    corpus, manifest, _, _ = structured
+    name = sorted(manifest)[0]
+    expected = manifest[name]
+    # XML中的开票人与PDF不同，读到的是XML的值
+    xml = einvoice_xml(dict(expected, drawer='王五'))
+    (corpus / name).with_suffix('.xml').write_bytes(xml)
+    assert extract_invoice_data(str(corpus / name))['drawer'] == '王五'
+
+
+def test_broken_companion_falls_back_to_pdf(structured):
+    corpus, manifest, _, _ = structured
+    name = sorted(manifest)[0]
+    (corpus / name).with_suffix('.xml').write_text('<EInvoice>', encoding='utf-8')
+    messages = []
+    data = extract_invoice_data(str(corpus / name), log=messages.append)
+    assert data['invoice_no'] == manifest[name]['invoice_no']
+    assert any('改为解析PDF' in m for m in messages)
+
+
+def test_listings_scanned_once_per_directory(structured, monkeypatch):
+    corpus, manifest, _, _ = structured
+    calls = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        calls.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(einvoice.os, 'scandir', counting_scandir)
+    pdfs = [str(corpus / name) for name in sorted(manifest)]
+    for path in pdfs:
+        assert extract_invoice_data(path)['invoice_no']
+    assert calls == []
+
+    listings = {}
+    for path in pdfs:
+        assert extract_invoice_data(path, listings=listings)['invoice_no']
+    assert calls == [str(corpus)]
+
+
+def test_cli_reads_xml_and_renames_companions(structured, tmp_path):
+    corpus, manifest, _, _ = structured
+    output = tmp_path / 'out.xlsx'
+    code = main([str(corpus), '-t', str(corpus / 'template.xlsx'), '-o', str(output), '-q',
+                 '--rename-journal', str(tmp_path / 'rename.jsonl')])
+    assert code == EXIT_OK
+    assert not any(m for m in check_output(str(output), manifest).values())
+    names = os.listdir(corpus)
+    assert not [name for name in names if name.startswith('inv_')]
+    stems = {os.path.splitext(name)[0] for name in names if name.endswith('.pdf')}
+    assert {os.path.splitext(name)[0] for name in names if name.endswith('.xml')} == stems
+
+
+def test_cli_standalone_ofd(structured, tmp_path):
+    corpus, manifest, _, _ = structured
+    output = tmp_path / 'out.xlsx'
+    code = main([str(corpus / 'ofd'), '-t', str(corpus / 'template.xlsx'), '-o', str(output),
+                 '-q', '--no-rename'])
+    assert code == EXIT_OK
+    assert not any(m for m in check_output(str(output), manifest).values())
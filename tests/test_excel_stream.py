@@ -0,0 +1,76 @@
+"""流式写入与write_to_excel（insert_rows）对同一模板的输出一致"""
+import pytest
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font
+
+from helpers import sample_records, sheet_values
+from invoice_extraction.core import write_to_excel
+from invoice_extraction.excel_stream import shift_merged_range, write_to_excel_streaming
+from invoice_extraction.layout import LEDGER_HEADERS
+
+
+def make_template(path, total=True):
+    """
+    A列为说明列（数据区以外，没有表头）、B-W列为台账表头、X列为审核列（数据区以外），
+    标题、说明列与合计行有合并单元格，模板数据行的审核列已填好
+    """
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['', '发票台账'])
+    ws.append([None, *LEDGER_HEADERS, '审核'])
+    ws.append(['', *[None] * len(LEDGER_HEADERS), '王审核'])
+    ws.append(['', *[None] * len(LEDGER_HEADERS), '王审核'])
+    ws.merge_cells('B1:W1')
+    if total:
+        ws.append(['', '合计', None, None, None, None, None, None, None, None, None, None, '=SUM(M3:M4)'])
+        ws.merge_cells('A2:A5')   # 跨过合计行、在数据区左侧：向下延伸
+        ws.merge_cells('B5:D5')   # 合计行：整体下移
+        ws.merge_cells('F2:F5')   # 跨过合计行且在数据区内：拆成上下两段
+        ws.cell(row=5, column=2).font = Font(bold=True)
+    wb.save(path)
+    return path
+
+
+def merged(path):
+    wb = load_workbook(path)
+    try:
+        return sorted(r.coord for r in wb.active.merged_cells.ranges)
+    finally:
+        wb.close()
+
+
+@pytest.mark.parametrize('total', [True, False])
+@pytest.mark.parametrize('count', [1, 3])
+def test_streaming_matches_write_to_excel(tmp_path, total, count):
+    template = make_template(str(tmp_path / 't.xlsx'), total)
+    records = sample_records(count, seed=count)
+    expected = write_to_excel(template, records, output_path=str(tmp_path / 'a.xlsx'))
+    streamed = write_to_excel_streaming(template, records, output_path=str(tmp_path / 'b.xlsx'))
+
+    rows = sheet_values(streamed)
+    assert rows == sheet_values(expected)
+    assert merged(streamed) == merged(expected)
+    # 有合计行时插入在合计行（第5行）之前，否则从表头下一行起覆盖模板行
+    start = 4 if total else 2
+    data = rows[start:start + count]
+    assert [row[4] for row in data] == [r['invoice_no'] for r in records]
+    if total:
+        assert rows[start + count][1] == '合计'
+        assert merged(streamed) == sorted(['B1:W1', f"A2:A{5 + count}", 'F2:F4',
+                                           f"B{5 + count}:D{5 + count}"])
+        assert [row[23] for row in data] == [None] * count
+    else:
+        # 覆盖模板行时保留数据区以外的审核列
+        assert [row[23] for row in data][:2] == ['王审核'] * min(count, 2)
+
+
+@pytest.mark.parametrize('ref, expected', [
+    ('A1:B1', ['A1:B1']),
+    ('A5:C6', ['A8:C9']),
+    ('A2:A5', ['A2:A8']),
+    ('F2:F5', ['F2:F4']),
+    ('E4:F5', ['E4:F4', 'E8:F8']),
+    ('Y1:Y5', ['Y1:Y8']),
+])
+def test_shift_merged_range(ref, expected):
+    assert shift_merged_range(ref, 5, 3, first_col=2, last_col=23) == expected
@@ -0,0 +1,62 @@
+"""单次扫描字段引擎与旧版逐条正则实现（benchmarks/bench_fields）的结果一致"""
+import random
+
+import pytest
+
+from common import synthetic_invoice, synthetic_text
+from helpers import diff_fields, legacy_parse_invoice_text
+from invoice_extraction.fields import extract_drawer, parse_invoice_text
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_legacy_parser(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        text = synthetic_text(rng)
+        mismatched, _ = diff_fields(text)
+        assert mismatched == [], text
+
+
+def test_remark_with_year_is_kept():
+    """旧版跳过所有含"2026年"的行；新引擎能取到这类备注并换算对应月份"""
+    rng = random.Random(0)
+    for _ in range(200):
+        lines, expected = synthetic_invoice(rng)
+        if '2026年' in expected['remark']:
+            break
+    text = '\n'.join(lines)
+    data = parse_invoice_text(text)
+    assert data['remark'] == expected['remark']
+    assert data['month'].startswith('2026年')
+    assert legacy_parse_invoice_text(text)['remark'] != expected['remark']
+
+
+def test_fields_match_manifest():
+    rng = random.Random(1)
+    for _ in range(100):
+        lines, expected = synthetic_invoice(rng)
+        data = parse_invoice_text('\n'.join(lines))
+        for key, value in expected.items():
+            assert data[key] == value, key
+
+
+def test_amounts_ordered_by_value():
+    text = '发票号码：12345678901234567890\n¥1,060.00\n¥60.00\n¥1,000.00'
+    data = parse_invoice_text(text)
+    assert (data['total'], data['amount'], data['tax']) == ('1060.00', '1000.00', '60.00')
+
+
+def test_missing_fields_are_empty():
+    data = parse_invoice_text('没有发票内容')
+    assert data['invoice_no'] == '' and data['date'] == ''
+    assert data['total'] == data['amount'] == data['tax'] == ''
+    assert data == legacy_parse_invoice_text('没有发票内容')
+
+
+@pytest.mark.parametrize('text, drawer', [
+    ('开票人：李晓明', '李晓明'),
+    ('开票人：\n欧阳娜娜', '欧阳娜娜'),
+    ('开票人：\n¥100.00', '高健铭'),
+])
+def test_drawer(text, drawer):
+    assert extract_drawer(text) == drawer
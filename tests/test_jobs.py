@@ -0,0 +1,68 @@
+"""作业模式：多个进程共用一个作业库与提取缓存"""
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+
+from conftest import ROOT
+from helpers import count_rows
+from invoice_extraction.jobs import EXTRACTED, FAILED, LEASED, PENDING, JobStore
+
+
+def test_two_workers_share_one_job_store(make_corpus, tmp_path, cache_home):
+    corpus, manifest = make_corpus(120, scanned=0, seed=5)
+    ledger = tmp_path / 'ledger.xlsx'
+    jobs = tmp_path / 'jobs.sqlite3'
+    command = [sys.executable, '-m', 'invoice_extraction', str(corpus), '--ledger', str(ledger),
+               '-t', str(corpus / 'template.xlsx'), '--jobs', str(jobs), '--claim-size', '4',
+               '--no-rename', '-q']
+    env = dict(os.environ, XDG_CACHE_HOME=str(cache_home))
+    workers = [subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, text=True) for _ in range(2)]
+    outputs = [w.communicate(timeout=120) for w in workers]
+    assert [w.returncode for w in workers] == [0, 0], outputs
+
+    conn = sqlite3.connect(jobs)
+    rows = conn.execute('SELECT state, attempts FROM jobs').fetchall()
+    conn.close()
+    assert len(rows) == len(manifest)
+    assert {state for state, _ in rows} == {'written'}
+    assert {attempts for _, attempts in rows} == {1}
+    # 每个文件只由一个进程提取，两个进程都分到文件（缓存不会让一个进程等另一个）
+    files = [int(re.search(r'文件数: (\d+)', out).group(1)) for out, _ in outputs]
+    assert sum(files) == len(manifest) and min(files) > 0
+    # 台账只写入一次（重复追加会多出一倍行数）
+    assert count_rows(str(ledger)) == len(manifest)
+
+
+def test_claim_complete_and_lease_expiry(tmp_path):
+    paths = [str(tmp_path / f"{i}.pdf") for i in range(5)]
+    with JobStore(str(tmp_path / 'jobs.sqlite3')) as store:
+        assert store.add(paths) == 5
+        assert store.add(paths) == 0
+        assert store.claim('a', 2) == paths[:2]
+        assert store.claim('b', 2, lease=-1) == paths[2:4]
+        # b的租约已到期，其文件由其他进程重新领取
+        assert store.claim('c', 5) == paths[2:]
+
+        ok = {'pdf_path': paths[0], 'data': {'invoice_no': '1'}, 'error': None}
+        bad = {'pdf_path': paths[1], 'data': None, 'error': '无法解析'}
+        assert store.complete('a', [(paths[0], [ok]), (paths[1], [bad])]) == paths[:2]
+        # 租约已被c收回，b提交的结果丢弃
+        assert store.complete('b', [(paths[2], [ok])]) == []
+
+        counts = store.counts()
+        assert (counts[EXTRACTED], counts[FAILED], counts[LEASED]) == (1, 1, 3)
+        store.release('c')
+        assert store.counts()[PENDING] == 3
+        assert store.retry_failed() == 1
+        assert store.counts()[PENDING] == 4
+
+
+def test_merge_lock(tmp_path):
+    with JobStore(str(tmp_path / 'jobs.sqlite3')) as store:
+        assert store.claim_merge('a')
+        assert not store.claim_merge('b')
+        store.release_merge('a')
+        assert store.claim_merge('b')
@@ -0,0 +1,82 @@
+"""模板布局：按表头映射列、定位合计行，沿用模板数据行与合计行的样式"""
+import pytest
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font, PatternFill
+
+from helpers import sample_records
+from invoice_extraction.core import write_to_excel
+from invoice_extraction.excel_stream import write_to_excel_streaming
+from invoice_extraction.layout import LEDGER_HEADERS, TemplateLayout, analyze_template, get_layout
+
+WRITERS = [write_to_excel, write_to_excel_streaming]
+
+
+def make_styled_template(path):
+    """标题行 + 列顺序打乱、含别名的表头 + 带样式的空数据行 + 合计行"""
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['发票台账'])
+    headers = ['开票人', '数电发票号码', '价税合计', '销售方名称', '序号', '开票日期']
+    ws.append(headers)
+    ws.append([None] * len(headers))
+    ws.append(['合计'])
+    for col in range(1, len(headers) + 1):
+        cell = ws.cell(row=3, column=col)
+        cell.font = Font(name='宋体', size=9, color='FF0000FF')
+        cell.fill = PatternFill('solid', fgColor='FFFFFF99')
+    ws.cell(row=3, column=3).number_format = '0.000'
+    ws.cell(row=4, column=1).font = Font(bold=True)
+    wb.save(path)
+    return path
+
+
+def test_columns_mapped_by_header(tmp_path):
+    layout = analyze_template(make_styled_template(str(tmp_path / 't.xlsx')))
+    assert layout.header_row == 2 and layout.total_row == 4
+    assert layout.column('销方名称') == 4 and layout.column('价税合计') == 3
+    assert (layout.first_col, layout.last_col) == (1, 6)
+    values = layout.place(list(range(len(LEDGER_HEADERS))))
+    assert values == [LEDGER_HEADERS.index(h) for h in
+                      ('开票人', '数电发票号码', '价税合计', '销方名称', '序号', '开票日期')]
+
+
+def test_layout_roundtrips_with_styles(tmp_path):
+    layout = analyze_template(make_styled_template(str(tmp_path / 't.xlsx')))
+    assert sorted(layout.cell_styles) == [1, 2, 3, 4, 5, 6]
+    assert sorted(layout.total_styles) == [1]
+    restored = TemplateLayout.from_dict(layout.to_dict())
+    assert restored.cell_styles == layout.cell_styles
+    assert restored.total_styles == layout.total_styles
+    # 磁盘缓存的布局同样带样式
+    cache = str(tmp_path / 'layouts.json')
+    template = str(tmp_path / 't.xlsx')
+    first = get_layout(template, cache_path=cache)
+    assert first.cell_styles == layout.cell_styles
+
+
+@pytest.mark.parametrize('writer', WRITERS)
+def test_template_data_row_style_kept(tmp_path, writer):
+    template = make_styled_template(str(tmp_path / 't.xlsx'))
+    output = str(tmp_path / 'out.xlsx')
+    records = sample_records(3)
+    writer(template, records, output_path=output)
+    ws = load_workbook(output).active
+    for row in range(4, 7):
+        cell = ws.cell(row=row, column=2)
+        assert cell.value == records[row - 4]['invoice_no']
+        assert cell.font.name == '宋体' and cell.font.color.rgb == 'FF0000FF'
+        assert cell.fill.fgColor.rgb == 'FFFFFF99'
+        assert ws.cell(row=row, column=3).number_format == '0.000'
+    assert ws.cell(row=7, column=1).value == '合计'
+    assert ws.cell(row=7, column=1).font.bold
+
+
+@pytest.mark.parametrize('writer', WRITERS)
+def test_unstyled_template_uses_default_styles(make_corpus, tmp_path, writer):
+    corpus, _ = make_corpus(0)
+    output = str(tmp_path / 'out.xlsx')
+    writer(str(corpus / 'template.xlsx'), sample_records(2), output_path=output)
+    ws = load_workbook(output).active
+    amount = ws.cell(row=2, column=13)
+    assert amount.number_format == '#,##0.00' and amount.border.left.style == 'thin'
+    assert ws.cell(row=2, column=6).alignment.horizontal == 'left'
@@ -0,0 +1,150 @@
+"""追加总台账：按索引查重、序号续接、就地改写工作表XML，台账被手工修改后重建索引"""
+import os
+
+from openpyxl import Workbook, load_workbook
+
+from helpers import check_output, count_rows, sample_records, sheet_values
+from invoice_extraction.core import extract_invoice_data
+from invoice_extraction.excel_stream import write_to_excel_streaming
+from invoice_extraction.layout import LEDGER_HEADERS
+from invoice_extraction.ledger import LedgerIndex, append_to_ledger, default_index_path
+
+
+def extracted(corpus, names):
+    return [(str(corpus / name), extract_invoice_data(str(corpus / name))) for name in names]
+
+
+def test_append_skips_duplicates(make_corpus, tmp_path):
+    corpus, manifest = make_corpus(15, scanned=0, seed=11)
+    names = sorted(manifest)
+    ledger = str(tmp_path / 'ledger.xlsx')
+    template = str(corpus / 'template.xlsx')
+
+    first = append_to_ledger(ledger, extracted(corpus, names[:10]), template=template)
+    assert first['added'] == 10 and not first['duplicates']
+    # 与台账重复的记下台账行号，本批次内重复的行号为None
+    items = extracted(corpus, names[5:]) + extracted(corpus, names[12:13])
+    second = append_to_ledger(ledger, items, template=template)
+    assert second['added'] == 5
+    assert len(second['duplicates']) == 6
+    assert all(row for _, _, row in second['duplicates'][:5])
+    assert second['duplicates'][5][2] is None
+
+    assert count_rows(ledger) == 15
+    assert not any(m for m in check_output(ledger, manifest).values())
+    seqs = [row[0] for row in load_workbook(ledger).active.iter_rows(min_row=2, values_only=True)
+            if isinstance(row[0], int)]
+    assert seqs == list(range(1, 16))
+    with LedgerIndex(ledger) as index:
+        assert len(index) == 15 and not index.is_stale()
+
+
+def test_index_rebuilt_after_manual_edit(make_corpus, tmp_path):
+    corpus, manifest = make_corpus(6, scanned=0, seed=12)
+    names = sorted(manifest)
+    ledger = str(tmp_path / 'ledger.xlsx')
+    append_to_ledger(ledger, extracted(corpus, names), template=str(corpus / 'template.xlsx'))
+
+    # 手工删掉台账中一张发票的号码：索引过期，重新扫描后这张发票可以再次追加
+    wb = load_workbook(ledger)
+    ws = wb.active
+    removed = next(row for row in ws.iter_rows(min_row=2) if row[3].value)
+    removed[3].value = None
+    wb.save(ledger)
+    with LedgerIndex(ledger) as index:
+        assert index.is_stale()
+
+    messages = []
+    result = append_to_ledger(ledger, extracted(corpus, names), log=messages.append)
+    assert result['added'] == 1 and len(result['duplicates']) == 5
+    assert any('重新扫描' in m for m in messages)
+
+
+def test_missing_index_is_rebuilt(make_corpus, tmp_path):
+    corpus, manifest = make_corpus(4, scanned=0, seed=13)
+    names = sorted(manifest)
+    ledger = str(tmp_path / 'ledger.xlsx')
+    append_to_ledger(ledger, extracted(corpus, names), template=str(corpus / 'template.xlsx'))
+    os.remove(default_index_path(ledger))
+
+    result = append_to_ledger(ledger, extracted(corpus, names))
+    assert result['added'] == 0 and len(result['duplicates']) == 4
+    assert count_rows(ledger) == 4
+
+
+def style_reprs(path):
+    wb = load_workbook(path)
+    try:
+        return [[tuple(repr(getattr(c, k)) for k in ('font', 'border', 'alignment', 'number_format'))
+                 for c in row] for row in wb.active.iter_rows()]
+    finally:
+        wb.close()
+
+
+def fake_items(tmp_path, records, start=0):
+    """每张发票配一个内容不同的文件（文件哈希不同）"""
+    items = []
+    for i, data in enumerate(records, start):
+        path = tmp_path / f"{i}.pdf"
+        path.write_text(str(i))
+        items.append((str(path), data))
+    return items
+
+
+def make_ledger_template(path):
+    """合计行后还有备注行，合计行有合并单元格"""
+    wb = Workbook()
+    ws = wb.active
+    ws.append(LEDGER_HEADERS)
+    ws.append(['合计'])
+    ws.append(['备注：本台账由程序追加'])
+    ws.merge_cells('A2:C2')
+    ws.merge_cells('A3:V3')
+    wb.save(path)
+    return path
+
+
+def test_append_rewrites_only_sheet_xml(tmp_path):
+    template = make_ledger_template(str(tmp_path / 't.xlsx'))
+    records = sample_records(9)
+    items = fake_items(tmp_path, records)
+    ledger = str(tmp_path / 'ledger.xlsx')
+    messages = []
+    append_to_ledger(ledger, items[:3], template=template, log=messages.append)
+    assert any('完整写出' in m for m in messages)  # 新台账还没有发票行
+    for batch in (items[3:4], items[4:]):
+        messages.clear()
+        append_to_ledger(ledger, batch, log=messages.append)
+        assert not any('完整写出' in m for m in messages)
+
+    expected = write_to_excel_streaming(template, records, output_path=str(tmp_path / 'ref.xlsx'))
+    assert sheet_values(ledger) == sheet_values(expected)
+    assert style_reprs(ledger) == style_reprs(expected)
+    wb = load_workbook(ledger)
+    assert sorted(r.coord for r in wb.active.merged_cells.ranges) == ['A11:C11', 'A12:V12']
+    with LedgerIndex(ledger) as index:
+        assert (index.total_row, index.last_row, index.next_seq) == (11, 12, 10)
+        assert index.lookup(records[-1]['invoice_no']) == 10
+    # 索引与重新扫描的结果一致
+    os.remove(default_index_path(ledger))
+    with LedgerIndex(ledger) as index:
+        index.refresh()
+        assert (index.total_row, index.last_row, index.next_seq) == (11, 12, 10)
+        assert index.lookup(records[-1]['invoice_no']) == 10
+
+
+def test_same_file_skipped_by_hash(tmp_path, make_corpus):
+    corpus, _ = make_corpus(0)
+    records = sample_records(3)
+    items = fake_items(tmp_path, records)
+    ledger = str(tmp_path / 'ledger.xlsx')
+    # 第三个文件读不出号码
+    items[2] = (items[2][0], dict(records[2], invoice_no=''))
+    assert append_to_ledger(ledger, items, template=str(corpus / 'template.xlsx'))['added'] == 3
+
+    # 同样的文件再次投递：号码读不出的、号码与上次不同的都按文件哈希跳过
+    again = [(items[0][0], dict(records[0], invoice_no='99999999999999999999')), items[2]]
+    result = append_to_ledger(ledger, again)
+    assert result['added'] == 0
+    assert [row for _, _, row in result['duplicates']] == [2, 4]
+    assert count_rows(ledger) == 3
@@ -0,0 +1,86 @@
+"""图形界面的后台处理：后台线程只通过消息队列与界面交互，界面按批取出消息（不需要显示器）"""
+import os
+import queue
+import threading
+
+import main
+from main import InvoiceProcessorApp
+
+
+def headless_app():
+    """不创建窗口的应用对象：只有后台线程与消息轮询用到的属性"""
+    app = InvoiceProcessorApp.__new__(InvoiceProcessorApp)
+    app.msg_queue = queue.Queue()
+    app.cancel_event = threading.Event()
+    return app
+
+
+def drain(app):
+    messages = []
+    while not app.msg_queue.empty():
+        messages.append(app.msg_queue.get_nowait())
+    return messages
+
+
+def run_in_thread(app, files, template):
+    worker = threading.Thread(target=app.run_pipeline, args=(files, template))
+    worker.start()
+    worker.join(60)
+    assert not worker.is_alive()
+    return drain(app)
+
+
+def test_worker_reports_progress_and_result(make_corpus):
+    corpus, manifest = make_corpus(8, scanned=0)
+    files = sorted(str(corpus / name) for name in manifest)
+    messages = run_in_thread(headless_app(), files, str(corpus / 'template.xlsx'))
+
+    progress = [m for m in messages if m[0] == 'progress']
+    assert progress[-1] == ('progress', len(files), len(files))
+    kind, count, output = messages[-1]
+    assert (kind, count) == ('done', len(files))
+    assert os.path.exists(output)
+
+
+def test_cancel_before_write(make_corpus):
+    corpus, manifest = make_corpus(4, scanned=0)
+    files = sorted(str(corpus / name) for name in manifest)
+    app = headless_app()
+    app.cancel_event.set()
+    messages = run_in_thread(app, files, str(corpus / 'template.xlsx'))
+
+    assert messages[-1] == ('cancelled',)
+    assert all(os.path.exists(p) for p in files)  # 未重命名
+    assert not [name for name in os.listdir(corpus) if name.endswith('已填写.xlsx')]
+
+
+class FakeRoot:
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, func):
+        self.scheduled.append(ms)
+
+
+def test_poll_queue_batches_messages(monkeypatch):
+    app = headless_app()
+    app.root = FakeRoot()
+    flushed, events = [], []
+    app.flush_log = lambda lines: flushed.append(list(lines)) if lines else None
+    app.update_progress = lambda done, total: events.append(('progress', done))
+    app.finish_processing = lambda kind, *payload: events.append((kind, len(flushed)))
+    monkeypatch.setattr(main, 'POLL_BATCH_SIZE', 5)
+
+    for i in range(7):
+        app.log(f"第{i}行")
+    app.poll_queue()
+    # 每次最多取POLL_BATCH_SIZE条，日志合并为一次写入，剩余的留到下一轮
+    assert flushed == [[f"第{i}行" for i in range(5)]]
+    assert app.root.scheduled == [main.POLL_INTERVAL_MS]
+
+    app.msg_queue.put(('progress', 3, 4))
+    app.msg_queue.put(('done', 3, 'out.xlsx'))
+    app.poll_queue()
+    # 结束消息之前先写出已积累的日志
+    assert flushed[1] == ['第5行', '第6行']
+    assert events == [('progress', 3), ('done', 2)]
@@ -0,0 +1,36 @@
+"""计时统计与可选剖析"""
+import os
+import subprocess
+import sys
+
+from invoice_extraction.metrics import Metrics, profiling
+
+
+def test_profiling_imports_nothing_when_disabled():
+    code = ('import sys\n'
+            'from invoice_extraction.metrics import profiling\n'
+            'with profiling():\n'
+            '    pass\n'
+            "print(any(m in sys.modules for m in ('cProfile', 'tracemalloc')))\n")
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert out.stdout.strip() == 'False'
+
+
+def test_profiling_reports(tmp_path):
+    path = tmp_path / 'run.pstats'
+    with profiling(str(path), trace_memory=True) as report:
+        sum(range(1000))
+    assert path.exists()
+    assert report['tracemalloc']['peak_mb'] >= 0
+
+
+def test_timer_records_when_enabled():
+    metrics = Metrics()
+    with metrics.timer('fields'):
+        pass
+    assert not metrics.summary()
+    metrics.enable()
+    with metrics.timer('fields'):
+        pass
+    assert 'fields' in metrics.summary()
@@ -0,0 +1,33 @@
+"""并行提取：进程数不影响结果顺序与写出的台账，缓存命中与未命中交错时也一样"""
+import os
+
+from helpers import sheet_values
+from invoice_extraction.cache import ExtractionCache
+from invoice_extraction.core import write_to_excel
+from invoice_extraction.parallel import iter_extract
+
+
+def extract(files, workers, cache_path):
+    with ExtractionCache(cache_path) as cache:
+        records = list(iter_extract(files, workers=workers, chunksize=2, cache=cache))
+        return records, cache.stats()
+
+
+def test_workers_give_same_rows(make_corpus, tmp_path):
+    corpus, manifest = make_corpus(24, scanned=0.1, seed=5)
+    files = sorted(str(corpus / name) for name in manifest)
+    # 先缓存一部分文件，使命中与未命中交错
+    for name in ('serial', 'pool'):
+        extract(files[::3], 1, str(tmp_path / f"{name}.sqlite3"))
+
+    outputs = {}
+    for name, workers in (('serial', 1), ('pool', 3)):
+        records, stats = extract(files, workers, str(tmp_path / f"{name}.sqlite3"))
+        assert [r['pdf_path'] for r in records] == files
+        assert stats['hits'] == len([r for r in files[::3] if manifest[os.path.basename(r)]])
+        output = str(tmp_path / f"{name}.xlsx")
+        write_to_excel(str(corpus / 'template.xlsx'), [r['data'] for r in records if r['data']],
+                       output)
+        outputs[name] = sheet_values(output)
+    assert outputs['serial'] == outputs['pool']
+    assert len(outputs['serial']) > len(files) // 2
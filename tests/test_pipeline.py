@@ -0,0 +1,51 @@
+"""异步流水线：写入较慢时队列有界、台账行按输入顺序，已入账的发票不改名"""
+import os
+import time
+
+from helpers import sheet_values
+from invoice_extraction import ledger
+from invoice_extraction.pipeline import Pipeline
+
+
+def invoice_column(path):
+    return [row[3] for row in sheet_values(path)[1:] if row[3]]
+
+
+def test_slow_sink_keeps_queues_bounded_and_order(make_corpus, tmp_path, monkeypatch):
+    corpus, manifest = make_corpus(30, scanned=0, seed=8)
+    files = sorted(str(corpus / name) for name in manifest)
+    real_append = ledger.append_to_ledger
+
+    def slow_append(*args, **kwargs):
+        time.sleep(0.05)
+        return real_append(*args, **kwargs)
+
+    monkeypatch.setattr(ledger, 'append_to_ledger', slow_append)
+    ledger_path = str(tmp_path / 'ledger.xlsx')
+    pipeline = Pipeline(template=str(corpus / 'template.xlsx'), ledger=ledger_path,
+                        queue_size=2, batch_size=3, rename=False)
+    pipeline.run(iter(files))
+
+    peaks = pipeline.stats.queue_peak
+    assert peaks and max(peaks.values()) <= 2
+    assert pipeline.stats.summary()['batches'] > 1
+    expected = [manifest[os.path.basename(p)]['invoice_no'] for p in files]
+    assert [str(no) for no in invoice_column(ledger_path)] == expected
+
+
+def test_ledger_duplicates_are_not_renamed(make_corpus, tmp_path):
+    corpus, manifest = make_corpus(6, scanned=0, seed=9)
+    files = sorted(str(corpus / name) for name in manifest)
+    ledger_path = str(tmp_path / 'ledger.xlsx')
+    Pipeline(template=str(corpus / 'template.xlsx'), ledger=ledger_path,
+             rename=False).run(files)
+
+    renamed = []
+    pipeline = Pipeline(template=str(corpus / 'template.xlsx'), ledger=ledger_path,
+                        rename_journal=str(tmp_path / 'rename.jsonl'),
+                        on_renamed=lambda *args: renamed.append(args))
+    pipeline.run(files)
+    assert pipeline.duplicates == len(files)
+    assert not renamed
+    assert all(os.path.exists(p) for p in files)
+    assert len(invoice_column(ledger_path)) == len(files)
@@ -0,0 +1,74 @@
+"""整读/内存映射输入与预读：载入内容与文件一致，按输入顺序产出，读取统计正确"""
+import io
+import mmap
+
+import pytest
+
+from invoice_extraction.parallel import extract_record
+from invoice_extraction.prefetch import (CountingStream, IOStats, Prefetcher, load_pdf,
+                                         parse_buffer)
+
+
+@pytest.fixture
+def pdfs(make_corpus):
+    corpus, manifest = make_corpus(6, scanned=0)
+    return sorted(str(corpus / name) for name in manifest)
+
+
+@pytest.mark.parametrize('mode', ['read', 'mmap'])
+def test_load_pdf(pdfs, mode):
+    with open(pdfs[0], 'rb') as f:
+        raw = f.read()
+    buf = load_pdf(pdfs[0], mode)
+    assert buf.nbytes == len(raw)
+    if mode == 'mmap':
+        assert isinstance(buf.data, mmap.mmap) and buf.syscalls == 0
+    else:
+        assert buf.syscalls <= 2
+    assert buf.stream().read() == raw
+    buf.close()
+
+
+@pytest.mark.parametrize('mode', ['read', 'mmap'])
+def test_buffer_gives_same_fields_as_stream(pdfs, mode):
+    for pdf_path in pdfs:
+        expected = extract_record(pdf_path)['data']
+        record = extract_record(pdf_path, input_mode=mode, count_reads=True)
+        assert record['data'] == expected
+        assert record['io']['bytes'] > 0
+        assert record['io']['parser_reads'] > record['io']['syscalls']
+
+
+def test_parse_buffer_counts_and_closes(pdfs):
+    buf = load_pdf(pdfs[0], 'mmap')
+    text, pages, info = parse_buffer(buf, count_reads=True)
+    assert text and pages == 1
+    assert buf.data.closed
+    stats = IOStats()
+    stats.add(info)
+    stats.add(info)
+    summary = stats.summary()
+    assert summary['files'] == 2
+    assert summary['bytes_read'] == 2 * buf.nbytes
+    assert summary['syscalls_saved'] == 2 * info['parser_reads']
+
+
+@pytest.mark.parametrize('depth', [0, 1, 3])
+def test_prefetcher_keeps_order_and_reports_errors(pdfs, tmp_path, depth):
+    files = pdfs[:3] + [str(tmp_path / 'missing.pdf')] + pdfs[3:]
+    results = list(Prefetcher(files, 'read', depth))
+    assert [r[0] for r in results] == files
+    missing = results[3]
+    assert missing[1] is None and isinstance(missing[2], OSError)
+    for pdf_path, buf, error, wait in results[:3] + results[4:]:
+        assert error is None and wait >= 0
+        with open(pdf_path, 'rb') as f:
+            assert buf.data == f.read()
+
+
+def test_counting_stream():
+    stream = CountingStream(io.BytesIO(b'abc\ndef'))
+    stream.readline()
+    stream.seek(0)
+    assert stream.read(2) == b'ab' and stream.tell() == 2
+    assert stream.calls == 3
@@ -0,0 +1,83 @@
+"""提取配置：往来单位登记表的扫描与CSV加载、按配置识别购方/销方"""
+import json
+
+import pytest
+
+from invoice_extraction import profiles
+from invoice_extraction.profiles import (BUYER, SELLER, ExtractionProfile, PartyRegistry,
+                                         load_profile)
+
+SELLER_NO = '91440300MA5H2BG470'
+OTHER_NO = '91430104MA4R8LTC6B'
+BUYER_NO = '91430100MA4TCG0Q2E'
+
+
+def write_csv(path, rows, bom=True):
+    text = 'tax_no,name,role\n' + ''.join(','.join(row) + '\n' for row in rows)
+    path.write_text(('\ufeff' if bom else '') + text, encoding='utf-8')
+    return str(path)
+
+
+def test_scan_finds_tax_numbers_in_order():
+    registry = PartyRegistry()
+    registry.add(SELLER_NO.lower(), ' 鼎越数科 ', SELLER)
+    text = (f"发票号码：26312000000012345678\n购买方 {BUYER_NO}\n"
+            f"销售方：{SELLER_NO}，X{OTHER_NO}9 不是识别号")
+    hits = registry.scan(text)
+    assert [h[0] for h in hits] == [BUYER_NO, SELLER_NO]
+    assert hits[0][3] is None
+    assert hits[1][3] == ('鼎越数科', SELLER)
+    no, start, end, _ = hits[1]
+    assert text[start:end] == no
+
+
+def test_load_csv(tmp_path):
+    registry = PartyRegistry()
+    path = write_csv(tmp_path / 'parties.csv', [
+        (SELLER_NO, '鼎越数科（深圳）信息技术有限公司', ''),
+        (BUYER_NO, '湖南新飞创不良资产处置有限公司', BUYER),
+        ('', '没有识别号', ''),
+    ])
+    assert registry.load_csv(path, role=SELLER) == 2
+    assert len(registry) == 2
+    assert registry.get(SELLER_NO) == ('鼎越数科（深圳）信息技术有限公司', SELLER)
+    assert registry.get(BUYER_NO)[1] == BUYER
+
+
+@pytest.fixture
+def restore_profile(monkeypatch):
+    monkeypatch.setattr(profiles, '_active', None)
+
+
+def test_profile_with_parties_csv(tmp_path, restore_profile):
+    write_csv(tmp_path / 'parties.csv', [(OTHER_NO, '长沙麓谷智算数据服务有限公司', SELLER)],
+              bom=False)
+    config = {'name': '测试', 'buyers': [{'name': '购方', 'tax_no': BUYER_NO}],
+              'parties_csv': 'parties.csv', 'item_patterns': [r'\*(\S+服务)\*']}
+    path = tmp_path / 'profile.json'
+    path.write_text(json.dumps(config, ensure_ascii=False), encoding='utf-8')
+
+    profile = load_profile(str(path))
+    assert len(profile.registry) == 2
+    assert profile.default_buyer == (BUYER_NO, '购方')
+    assert profile.default_seller == ('', '')
+    # 登记为销方的识别号即使先出现也识别为销方
+    buyer, seller = profile.match_parties(f"{OTHER_NO} 其他 {BUYER_NO}")
+    assert (buyer[0], seller[0]) == (BUYER_NO, OTHER_NO)
+    assert profile.item_name('*信息系统服务*技术服务费') == '信息系统服务'
+
+    # 登记表变化后配置指纹（缓存键的一部分）随之变化
+    fingerprint = profile.fingerprint
+    write_csv(tmp_path / 'parties.csv', [(OTHER_NO, '改名后的公司', SELLER)])
+    assert load_profile(str(path)).fingerprint != fingerprint
+    assert ExtractionProfile().fingerprint == 'default'
+
+    profiles.use_profile(str(path))
+    assert profiles.get_profile().name == '测试'
+
+
+def test_unregistered_parties_follow_layout():
+    profile = ExtractionProfile({'name': '空'})
+    buyer, seller = profile.match_parties(f"购方 {OTHER_NO} 销方 {SELLER_NO}")
+    assert (buyer[0], seller[0]) == (OTHER_NO, SELLER_NO)
+    assert profile.match_parties('没有识别号') == (None, None)
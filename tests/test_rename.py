@@ -0,0 +1,103 @@
+"""批量重命名：冲突后缀、不覆盖计划后出现的文件、按日志继续与回滚"""
+import os
+
+import pytest
+
+from invoice_extraction import rename
+from invoice_extraction.core import build_new_name
+from invoice_extraction.rename import (
+    RenameJournal, batch_rename, plan_renames, resume_renames, rollback_renames,
+)
+
+DATA = {'invoice_no': '12345678901234567890', 'date': '2026-03-10', 'total': '1060.00',
+        'remark': '3月技术服务费', 'month': '2026年3月份'}
+
+
+def make_files(directory, names):
+    paths = []
+    for name in names:
+        paths.append(os.path.join(directory, name))
+        with open(paths[-1], 'w') as f:
+            f.write(name)
+    return paths
+
+
+def test_conflicting_names_get_suffixes(tmp_path):
+    paths = make_files(tmp_path, ['a.pdf', 'b.pdf', 'c.pdf'])
+    results = batch_rename([(p, DATA) for p in paths], journal_path=str(tmp_path / 'j.jsonl'))
+    stem = os.path.splitext(build_new_name(DATA))[0]
+    names = sorted(os.path.basename(new) for new, error in results.values())
+    assert names == sorted([f"{stem}.pdf", f"{stem}_1.pdf", f"{stem}_2.pdf"])
+    assert all(error is None for _, error in results.values())
+
+
+def test_companion_xml_follows_pdf(tmp_path):
+    make_files(tmp_path, ['a.pdf', 'a.xml'])
+    plan = plan_renames([(str(tmp_path / 'a.pdf'), DATA)])
+    stem = os.path.splitext(build_new_name(DATA))[0]
+    assert [os.path.basename(dst) for _, dst in plan] == [f"{stem}.pdf", f"{stem}.xml"]
+
+
+def test_target_created_after_planning_is_not_overwritten(tmp_path, monkeypatch):
+    """计划时目录中还没有目标文件；执行前才出现的同名文件不能被覆盖"""
+    (src,) = make_files(tmp_path, ['a.pdf'])
+    target = tmp_path / build_new_name(DATA)
+    real_plan = rename.plan_renames
+
+    def plan_then_create(items):
+        plan = real_plan(items)
+        target.write_text('other')
+        return plan
+
+    monkeypatch.setattr(rename, 'plan_renames', plan_then_create)
+    results = batch_rename([(src, DATA)], journal_path=str(tmp_path / 'j.jsonl'))
+    new_path, error = results[src]
+    assert new_path is None and error
+    assert target.read_text() == 'other'
+    assert os.path.exists(src)
+
+
+def test_move_after_interrupted_link(tmp_path):
+    """在link与unlink之间中断后再执行：只删除原名"""
+    (src,) = make_files(tmp_path, ['a.pdf'])
+    dst = str(tmp_path / 'b.pdf')
+    os.link(src, dst)
+    rename._move(src, dst)
+    assert not os.path.exists(src) and os.path.exists(dst)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    """三个文件的改名计划，只执行了第一项就中断"""
+    paths = make_files(tmp_path, ['a.pdf', 'b.pdf', 'c.pdf'])
+    ops = [(p, os.path.join(tmp_path, f"new_{os.path.basename(p)}")) for p in paths]
+    j = RenameJournal.create(str(tmp_path / 'j.jsonl'), ops)
+    rename._move(*ops[0])
+    j.mark(0, 'done')
+    j.close()
+    return j.path, ops
+
+
+def test_resume_finishes_pending_ops(journal):
+    path, ops = journal
+    # 第二项已改名但中断在记录之前
+    rename._move(*ops[1])
+    assert resume_renames(path) == 0
+    assert all(not os.path.exists(src) and os.path.exists(dst) for src, dst in ops)
+    assert set(RenameJournal.load(path).status.values()) == {'done'}
+
+
+def test_rollback_restores_original_names(journal):
+    path, ops = journal
+    assert rollback_renames(path) == 0
+    assert all(os.path.exists(src) and not os.path.exists(dst) for src, dst in ops)
+    status = RenameJournal.load(path).status
+    assert status[0] == 'undone' and 1 not in status
+
+
+def test_rollback_keeps_reused_original_name(journal):
+    path, ops = journal
+    with open(ops[0][0], 'w') as f:
+        f.write('new file')
+    assert rollback_renames(path) == 1
+    assert os.path.exists(ops[0][1])
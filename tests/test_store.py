@@ -0,0 +1,92 @@
+"""列式存储：往返、整批校验（numpy向量化与逐行计算结果一致）与小计"""
+import io
+import random
+
+import pytest
+
+from invoice_extraction import store as store_mod
+from invoice_extraction.cli import print_check
+from invoice_extraction.store import InvoiceStore, from_cents, to_cents
+
+
+def record(no, amount, tax, total, date='2026-03-10', seller='甲公司'):
+    return {'invoice_no': no, 'date': date, 'seller_name': seller, 'seller_tax_no': '',
+            'buyer_name': '', 'buyer_tax_no': '', 'amount': amount, 'tax': tax, 'total': total,
+            'drawer': '张三', 'item_name': '', 'remark': '', 'month': ''}
+
+
+@pytest.fixture
+def records():
+    rng = random.Random(0)
+    rows = []
+    for i in range(500):
+        amount = rng.randint(100, 10_000_000)
+        tax = amount * rng.choice((6, 13)) // 100
+        total = amount + tax
+        rows.append(record(f"{10 ** 19 + i}", from_cents(amount), from_cents(tax),
+                           from_cents(total), date=f"2026-{rng.randint(1, 12):02d}-10",
+                           seller=rng.choice(('甲公司', '乙公司'))))
+    rows[3]['total'] = '1.00'                      # 合计不符
+    rows[7]['tax'] = ''                            # 缺失税额
+    amount = to_cents(rows[11]['amount'])                   # 税率不符（合计相符）
+    rows[11]['tax'], rows[11]['total'] = from_cents(amount // 4), from_cents(amount + amount // 4)
+    rows[20]['invoice_no'] = rows[40]['invoice_no'] = rows[90]['invoice_no']
+    rows[5]['invoice_no'] = rows[6]['invoice_no'] = ''
+    rows[60]['date'] = ''
+    rows[61]['date'] = '2025-12-31'
+    return rows
+
+
+def test_roundtrip(records):
+    store = InvoiceStore(records)
+    assert len(store) == len(records)
+    assert list(store) == records
+
+
+def test_validate(records):
+    issues = InvoiceStore(records).validate(start='2026-01-01', end='2026-12-31')
+    assert issues['totals'] == [3, 7]
+    assert issues['tax_rates'] == [11]
+    assert issues['duplicates'] == {records[20]['invoice_no']: [20, 40, 90]}
+    assert issues['dates'] == [60, 61]
+
+
+def test_vectorized_matches_fallback(records, monkeypatch):
+    pytest.importorskip('numpy')
+    store = InvoiceStore(records)
+    vectorized = store.validate(start='2026-02-01', end='2026-11-30')
+    monkeypatch.setattr(store_mod, '_numpy', lambda: None)
+    assert store.validate(start='2026-02-01', end='2026-11-30') == vectorized
+    assert list(store.duplicate_invoice_nos()) == list(vectorized['duplicates'])
+
+
+def test_empty_store():
+    assert InvoiceStore().validate() == {'totals': [], 'tax_rates': [], 'duplicates': {},
+                                         'dates': [], 'invoice_nos': []}
+
+
+def test_bad_invoice_no_is_reported(records, tmp_path):
+    """非ASCII或超长的号码不抛异常：校验中报告，导出时保留原文"""
+    records[3]['invoice_no'] = '２６３１２０００００００１２３４５６７８'
+    records[7]['invoice_no'] = '1' * 30
+    store = InvoiceStore(records)
+    assert store.validate()['invoice_nos'] == [3, 7]
+    assert store.row(3)['invoice_no'] == records[3]['invoice_no']
+    assert store.invoice_no_at(7) == '1' * 30
+    assert store.invoice_no_at(8) == records[8]['invoice_no']
+    path = store.to_csv(str(tmp_path / 'out.csv'))
+    with open(path, encoding='utf-8-sig') as f:
+        assert records[3]['invoice_no'] in f.read()
+
+    out = io.StringIO()
+    print_check(store, out=out)
+    assert '号码无效 2' in out.getvalue()
+    assert f"号码无效 第8张: {'1' * 30}" in out.getvalue()
+
+
+def test_subtotals(records):
+    store = InvoiceStore(records)
+    by_seller = store.subtotal_by_seller()
+    assert sum(g[0] for g in by_seller.values()) == len(records)
+    assert sum(g[3] for g in by_seller.values()) == sum(to_cents(r['total']) for r in records)
+    assert '' in store.subtotal_by_month()
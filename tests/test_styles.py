@@ -0,0 +1,50 @@
+"""共享行样式：与逐格调用apply_cell_style的结果相同，每种样式只计算一次"""
+from openpyxl import Workbook
+
+from helpers import sample_records
+from invoice_extraction.core import RowStyles, apply_cell_style, build_row_values, write_row_data
+from invoice_extraction.layout import default_layout
+
+
+def style_repr(cell):
+    return (repr(cell.border), repr(cell.alignment), cell.number_format, repr(cell.font))
+
+
+def legacy_row(ws, row, seq_no, data):
+    """改动前的写法：逐格赋值边框/对齐/格式"""
+    layout = default_layout()
+    for col, value in enumerate(layout.place(build_row_values(seq_no, data)), 1):
+        cell = ws.cell(row=row, column=col, value=value)
+        kind = layout.style_kind(col, value)
+        apply_cell_style(cell, is_number=(kind != 'text'), is_amount=(kind == 'amount'))
+
+
+def test_shared_styles_match_per_cell_styles():
+    records = sample_records(20, seed=3)
+    records[4]['amount'] = ''  # 金额为空的列按居中处理
+    wb = Workbook()
+    ws = wb.active
+    styles = RowStyles(ws)
+    for i, data in enumerate(records):
+        write_row_data(ws, i + 1, i + 1, data, styles)
+        legacy_row(ws, i + 101, i + 1, data)
+
+    for i in range(len(records)):
+        for col in range(1, 23):
+            new, old = ws.cell(row=i + 1, column=col), ws.cell(row=i + 101, column=col)
+            assert new.value == old.value
+            assert style_repr(new) == style_repr(old), (i, col)
+    # 所有行共用少数几个样式数组：每种类别（文本/居中/金额）只计算一次
+    assert len(styles._cache) == 3
+
+
+def test_style_arrays_are_copied():
+    wb = Workbook()
+    ws = wb.active
+    styles = RowStyles(ws)
+    first = styles.style_for(None, 'amount')
+    assert styles.style_for(None, 'amount') is first
+    cell = ws.cell(row=1, column=11, value=1.5)
+    styles.apply(cell, 11)
+    assert cell._style == first and cell._style is not first
+    assert cell.number_format == '#,##0.00'
@@ -0,0 +1,97 @@
+"""解析前分拣：扫描件、非发票与各种加密方式"""
+import io
+import random
+import re
+
+import pytest
+
+from corpus import encrypted_pdf_bytes, scanned_pdf_bytes, text_pdf_bytes
+from common import synthetic_invoice
+from invoice_extraction.parallel import extract_record
+from invoice_extraction.triage import (
+    ENCRYPTED, IMAGE_ONLY, NON_INVOICE, TEXT, UNVERIFIED_ENCRYPTION, _opens_with_empty_password,
+    classify_bytes,
+)
+
+pypdf = pytest.importorskip('pypdf')
+
+ALGORITHMS = ('RC4-40', 'RC4-128', 'AES-128')
+
+
+def invoice_pdf():
+    lines, _ = synthetic_invoice(random.Random(0))
+    return text_pdf_bytes(lines)
+
+
+def encrypt(data, algorithm, user_password=''):
+    writer = pypdf.PdfWriter(clone_from=pypdf.PdfReader(io.BytesIO(data)))
+    writer.encrypt(user_password=user_password, owner_password='owner', algorithm=algorithm)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def reorder_crypt_filter(data):
+    """把/CF子字典挪到顶层/Length之前（长度不变，交叉引用表仍然有效）"""
+    start = data.rfind(b'obj', 0, data.find(b'/Filter /Standard'))
+    match = re.compile(rb'(/Length \d+\n)((?:.|\n)*?)(/CF <<(?:.|\n)*?>>\n>>\n)').search(data, start)
+    length, middle, crypt_filter = match.groups()
+    return data[:match.start()] + crypt_filter + middle + length + data[match.end():]
+
+
+def encrypt_dict(data):
+    start = data.find(b'/Filter /Standard')
+    return data[data.rfind(b'obj', 0, start):data.find(b'endobj', start)]
+
+
+def file_id(data):
+    match = re.search(rb'/ID\s*\[\s*<([0-9a-fA-F]+)>', data)
+    return bytes.fromhex(match.group(1).decode())
+
+
+def test_text_invoice():
+    assert classify_bytes(invoice_pdf()) == (TEXT, '')
+
+
+def test_scanned_and_non_pdf():
+    assert classify_bytes(scanned_pdf_bytes(random.Random(0), 20, 20))[0] == IMAGE_ONLY
+    assert classify_bytes(b'hello')[0] == NON_INVOICE
+
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_owner_password_only_is_not_rejected(algorithm):
+    data = encrypt(invoice_pdf(), algorithm)
+    assert _opens_with_empty_password(encrypt_dict(data), file_id(data)) is True
+    assert classify_bytes(data) == (TEXT, '')
+
+
+def test_reordered_crypt_filter():
+    """/CF中加密过滤器的/Length（字节）排在顶层/Length（位）之前"""
+    data = reorder_crypt_filter(encrypt(invoice_pdf(), 'AES-128'))
+    assert encrypt_dict(data).index(b'/CF') < encrypt_dict(data).index(b'/Length 128')
+    reader = pypdf.PdfReader(io.BytesIO(data))
+    assert reader.decrypt('')
+    assert '发票' in reader.pages[0].extract_text()
+    assert _opens_with_empty_password(encrypt_dict(data), file_id(data)) is True
+    assert classify_bytes(data) == (TEXT, '')
+
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_user_password_left_to_parser(algorithm, tmp_path):
+    data = encrypt(invoice_pdf(), algorithm, user_password='secret')
+    assert _opens_with_empty_password(encrypt_dict(data), file_id(data)) is None
+    assert classify_bytes(data) == (TEXT, UNVERIFIED_ENCRYPTION)
+    path = tmp_path / 'locked.pdf'
+    path.write_bytes(data)
+    record = extract_record(str(path), triage=True)
+    assert record['error_type'] == 'Rejected'
+    assert record['triage']['kind'] == ENCRYPTED
+
+
+def test_unknown_password_rejected_after_parse(tmp_path):
+    path = tmp_path / 'locked.pdf'
+    path.write_bytes(encrypted_pdf_bytes(random.Random(0), ['发票号码：12345678901234567890']))
+    record = extract_record(str(path), triage=True)
+    assert record['error_type'] == 'Rejected' and record['triage']['kind'] == ENCRYPTED
+    # 不分拣时仍是普通的提取失败
+    assert extract_record(str(path))['error_type'] != 'Rejected'
@@ -0,0 +1,94 @@
+"""监视模式（定时扫描）：就绪文件按批入账、改名，台账不可写时退出不卡住"""
+import os
+import shutil
+import threading
+
+from helpers import check_output, count_rows
+from invoice_extraction.watch import WatchDaemon
+
+
+def make_daemon(directory, ledger, template, **options):
+    return WatchDaemon(str(directory), str(ledger), template=str(template), settle=0,
+                       batch_wait=0, polling=True, poll_interval=0.01, **options)
+
+
+def copy_pdfs(corpus, directory, count):
+    directory.mkdir(exist_ok=True)
+    names = sorted(name for name in os.listdir(corpus) if name.endswith('.pdf'))[:count]
+    for name in names:
+        shutil.copy(corpus / name, directory / name)
+    return names
+
+
+def test_step_appends_ready_files(make_corpus, tmp_path):
+    corpus, manifest = make_corpus(6, scanned=0)
+    inbox = tmp_path / 'inbox'
+    copy_pdfs(corpus, inbox, 4)
+    ledger = tmp_path / 'ledger.xlsx'
+    daemon = make_daemon(inbox, ledger, corpus / 'template.xlsx', batch_size=3)
+    try:
+        processed = 0
+        for _ in range(20):
+            processed += daemon.step(timeout=0.01)
+            if processed == 4:
+                break
+        assert processed == 4
+        assert count_rows(str(ledger)) == 4
+        # 改名后的文件不再作为新文件入账
+        for _ in range(5):
+            assert daemon.step(timeout=0.01) == 0
+        assert daemon.stats.summary()['ingested'] == 4
+        assert not [name for name in os.listdir(inbox) if name.startswith('inv_')]
+    finally:
+        daemon.close()
+    mismatches = check_output(str(ledger), manifest)
+    assert mismatches.pop('missing') == 2  # 语料中另外两张没有放入监视目录
+    assert not any(mismatches.values())
+
+
+def test_run_drains_queue_on_stop(make_corpus, tmp_path):
+    corpus, _ = make_corpus(3, scanned=0)
+    inbox = tmp_path / 'inbox'
+    copy_pdfs(corpus, inbox, 3)
+    ledger = tmp_path / 'ledger.xlsx'
+    # batch_wait很长：文件只排队，由退出时的drain入账
+    daemon = WatchDaemon(str(inbox), str(ledger), template=str(corpus / 'template.xlsx'),
+                         settle=0, batch_wait=3600, polling=True, poll_interval=0.01,
+                         rename=False)
+    stop = threading.Event()
+    summaries = []
+
+    def stop_when_queued(summary):
+        summaries.append(summary)
+        if summary['queue_depth'] == 3:
+            stop.set()
+
+    try:
+        daemon.run(stop, stats_interval=0, stats_callback=stop_when_queued)
+    finally:
+        daemon.close()
+    assert count_rows(str(ledger)) == 3
+    assert summaries[-1]['ingested'] == 3 and not daemon.queue
+
+
+def test_run_stops_when_ledger_is_not_writable(make_corpus, tmp_path):
+    corpus, _ = make_corpus(2, scanned=0)
+    inbox = tmp_path / 'inbox'
+    copy_pdfs(corpus, inbox, 2)
+    ledger = tmp_path / 'missing' / 'ledger.xlsx'
+    messages = []
+    daemon = make_daemon(inbox, ledger, corpus / 'template.xlsx', log=messages.append)
+    stop = threading.Event()
+    stop.set()
+    try:
+        daemon.step(timeout=0.01)
+        assert len(daemon.queue) == 2
+        runner = threading.Thread(target=daemon.run, args=(stop,), daemon=True)
+        runner.start()
+        runner.join(timeout=20)
+        assert not runner.is_alive()
+    finally:
+        daemon.close()
+    assert len(daemon.queue) == 2
+    assert any('未入账' in message for message in messages)
+    assert sorted(os.listdir(inbox)) == ['inv_000001.pdf', 'inv_000002.pdf']